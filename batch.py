@@ -0,0 +1,308 @@
+"""Пакетный анализ составов без Telegram: выгрузки каталога CSV/JSONL или папки с фото.
+
+Вход читается потоком, записи идут в пул процессов пачками по
+--chunk-size, результаты пишутся в том же порядке по мере готовности.
+В работе одновременно не больше 2 пачек на воркер, поэтому память не
+растёт с размером каталога.
+
+Каждые --checkpoint-every пачек рядом с результатом сохраняется
+<output>.checkpoint (сколько записей входа обработано и длина файла
+результата). --resume продолжает с этого места: хвост, записанный
+после чекпоинта, отбрасывается, уже обработанные записи пропускаются.
+Без чекпоинта --resume завершается ошибкой и результат не трогает.
+
+Вход:
+  CSV/JSONL — по записи на товар; поля задаются --id-field и
+  --ingredients-field, цель/категория/тип — полями goal, category,
+  subtype или значениями по умолчанию --goal/--category/--subtype;
+  --images DIR — фото этикеток (jpg/png/webp), текст распознаётся OCR
+  в воркерах (нужен tesseract).
+
+Результат — JSONL или CSV (по расширению): id, оценка, полезные,
+спорные, нежелательные и неизвестные компоненты.
+
+Примеры:
+  python batch.py catalogue.csv scores.jsonl --goal "увлажнить сухую кожу"
+  python batch.py --images labels/ scores.csv --workers 4
+  python batch.py catalogue.jsonl scores.jsonl --resume
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from config import OCR_BACKEND, OCR_TIMEOUT
+from utils.analysis import parse_ingredients, analyze_composition
+from utils.ocr_backends import init_backend
+from utils.orc import extract_text_from_photo
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+CSV_FIELDS = ("id", "score", "ingredients", "good", "risky", "bad", "unknown", "error")
+# Пачек в работе на один воркер: воркеры не простаивают, память ограничена
+CHUNKS_PER_WORKER = 2
+
+
+# --- чтение входа ---
+
+def read_records(path: Path, fmt: str) -> Iterator[dict]:
+    if fmt == "csv":
+        with path.open(newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    else:
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_images(folder: Path) -> Iterator[dict]:
+    for path in sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES):
+        yield {"id": str(path.relative_to(folder)), "image": str(path)}
+
+
+def make_jobs(records: Iterator[dict], args) -> Iterator[tuple]:
+    """Запись входа -> (id, текст или путь к фото, цель, категория, тип) — только то, что нужно воркеру."""
+    for number, record in enumerate(records):
+        yield (
+            str(record.get(args.id_field) or record.get("id") or number),
+            record.get("image") or record.get(args.ingredients_field) or "",
+            record.get("goal") or args.goal,
+            record.get("category") or args.category,
+            record.get("subtype") or args.subtype,
+        )
+
+
+def chunked(items: Iterator, size: int) -> Iterator[list]:
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- воркер ---
+
+def init_worker(ocr_backend: Optional[str]):
+    # Логи воркеров — только ошибки, иначе они перемешаются с прогрессом
+    logging.basicConfig(level=logging.ERROR)
+    if ocr_backend:
+        init_backend(ocr_backend)
+
+
+def analyse_one(job: tuple, images: bool) -> dict:
+    product_id, source, goal, category, subtype = job
+    if images:
+        text = extract_text_from_photo(Path(source).read_bytes(), OCR_TIMEOUT)
+    else:
+        text = source
+    ingredients = parse_ingredients(text) if text else []
+    if not ingredients:
+        return {"id": product_id, "error": "no ingredients"}
+
+    report = analyze_composition(ingredients, goal, category, subtype)
+    return {
+        "id": product_id,
+        "score": report["score"],
+        "ingredients": len(ingredients),
+        "good": [entry[0] for entry in report["good"]],
+        "risky": [entry[0] for entry in report["risky"]],
+        "bad": [entry[0] for entry in report["bad"]],
+        "unknown": [entry[0] for entry in report["unknown"]],
+    }
+
+
+def analyse_chunk(jobs: List[tuple], images: bool) -> List[dict]:
+    results = []
+    for job in jobs:
+        try:
+            results.append(analyse_one(job, images))
+        except Exception as e:
+            results.append({"id": job[0], "error": f"{type(e).__name__}: {e}"})
+    return results
+
+
+# --- запись результата ---
+
+def encode(results: List[dict], fmt: str) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction="ignore")
+        for result in results:
+            writer.writerow({key: ";".join(value) if isinstance(value, list) else value
+                             for key, value in result.items()})
+        return buffer.getvalue().encode()
+    return "".join(json.dumps(result, ensure_ascii=False) + "\n" for result in results).encode()
+
+
+def csv_header() -> bytes:
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, CSV_FIELDS).writeheader()
+    return buffer.getvalue().encode()
+
+
+class Checkpoint:
+    """Сколько записей входа обработано и сколько байт результата им соответствует."""
+
+    def __init__(self, output: Path):
+        self.path = output.with_name(output.name + ".checkpoint")
+        self.records = 0
+        self.output_bytes = 0
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        self.records, self.output_bytes = data["records"], data["output_bytes"]
+        return True
+
+    def save(self):
+        # Через временный файл: чекпоинт не окажется недописанным при падении
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"records": self.records, "output_bytes": self.output_bytes}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+
+def detect_format(path: Path, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    return "csv" if path.suffix.lower() == ".csv" else "jsonl"
+
+
+def run(args) -> dict:
+    images = args.images is not None
+    out_format = detect_format(args.output, args.output_format)
+    checkpoint = Checkpoint(args.output)
+
+    if args.resume and not checkpoint.load():
+        # Без чекпоинта неизвестно, что уже обработано: результат не трогаем
+        raise FileNotFoundError(f"Нет чекпоинта {checkpoint.path}, продолжать нечего")
+    out = args.output.open("r+b" if args.resume else "wb")
+    if args.resume:
+        # Всё, что записано после чекпоинта, будет посчитано заново
+        out.truncate(checkpoint.output_bytes)
+        out.seek(checkpoint.output_bytes)
+        logger.info(f"Resuming after {checkpoint.records} records")
+    elif out_format == "csv":
+        out.write(csv_header())
+    checkpoint.output_bytes = out.tell()
+
+    if images:
+        records = read_images(args.images)
+    else:
+        records = read_records(args.input, detect_format(args.input, args.input_format))
+    jobs = itertools.islice(make_jobs(records, args), checkpoint.records, None)
+    chunk_size = args.chunk_size or (4 if images else 500)
+
+    stats = {"records": 0, "errors": 0, "ingredients": 0}
+    started = time.perf_counter()
+    last_log = started
+    pending = deque()
+    chunks_done = 0
+
+    def write(results: List[dict]):
+        nonlocal chunks_done, last_log
+        out.write(encode(results, out_format))
+        stats["records"] += len(results)
+        stats["errors"] += sum(1 for r in results if "error" in r)
+        stats["ingredients"] += sum(r.get("ingredients", 0) for r in results)
+        checkpoint.records += len(results)
+        checkpoint.output_bytes = out.tell()
+        chunks_done += 1
+        if chunks_done % args.checkpoint_every == 0:
+            out.flush()
+            checkpoint.save()
+        now = time.perf_counter()
+        if now - last_log >= 5:
+            last_log = now
+            logger.info(f"{stats['records']} records, {stats['records'] / (now - started):.0f}/s")
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(args.ocr_backend if images else None,)) as executor:
+        try:
+            for chunk in chunked(jobs, chunk_size):
+                pending.append(executor.submit(analyse_chunk, chunk, images))
+                if len(pending) >= args.workers * CHUNKS_PER_WORKER:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+        finally:
+            out.flush()
+            checkpoint.save()
+            out.close()
+
+    if not args.keep_checkpoint:
+        checkpoint.remove()
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        "total_records": checkpoint.records,
+        "seconds": elapsed,
+        "records_per_s": stats["records"] / elapsed if elapsed else 0.0,
+        "ingredients_per_s": stats["ingredients"] / elapsed if elapsed else 0.0,
+        # ru_maxrss в Linux — килобайты
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "worker_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def print_summary(summary: dict):
+    print(
+        f"Обработано: {summary['records']} (всего с учётом прошлых запусков: {summary['total_records']}), "
+        f"ошибок: {summary['errors']}\n"
+        f"Время: {summary['seconds']:.1f} с, {summary['records_per_s']:.0f} записей/с, "
+        f"{summary['ingredients_per_s']:.0f} компонентов/с\n"
+        f"Пиковый RSS: {summary['peak_rss_mb']:.0f} МБ (воркер: {summary['worker_peak_rss_mb']:.0f} МБ)",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path, nargs="?", help="CSV или JSONL с составами")
+    parser.add_argument("output", type=Path, help="куда писать результат (.jsonl или .csv)")
+    parser.add_argument("--images", type=Path, help="папка с фото этикеток вместо input")
+    parser.add_argument("--input-format", choices=("csv", "jsonl"))
+    parser.add_argument("--output-format", choices=("csv", "jsonl"))
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--ingredients-field", default="ingredients")
+    parser.add_argument("--goal", default="", help="цель по умолчанию, если в записи нет поля goal")
+    parser.add_argument("--category", default="")
+    parser.add_argument("--subtype", default="")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, help="записей в пачке (по умолчанию 500, для фото 4)")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="сохранять чекпоинт каждые N пачек")
+    parser.add_argument("--resume", action="store_true", help="продолжить с чекпоинта")
+    parser.add_argument("--keep-checkpoint", action="store_true", help="не удалять чекпоинт после завершения")
+    parser.add_argument("--ocr-backend", default=OCR_BACKEND)
+    args = parser.parse_args()
+    if (args.input is None) == (args.images is None):
+        parser.error("нужен либо input, либо --images")
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    try:
+        summary = run(args)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; checkpoint saved, continue with --resume")
+        sys.exit(130)
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Сравнение движков OCR: subprocess (pytesseract) и tesserocr (постоянный API).
+
+Для каждого доступного движка:
+  * холодный старт — первый вызов (для tesserocr включает загрузку traineddata);
+  * последовательные вызовы в одном процессе — p50/p95/среднее на фото;
+  * OCRPool с этим движком — пропускная способность при параллельной нагрузке.
+Качество — доля ингредиентов исходного состава, узнанных в распознанном тексте.
+
+Запуск из корня репозитория:
+  python -m benchmarks.bench_ocr_backends --images 20 --workers 2
+"""
+import argparse
+import asyncio
+import io
+import statistics
+import time
+
+from PIL import Image
+
+from benchmarks.labels import label_set
+from utils.analysis import parse_ingredients, resolve_key
+from utils.ocr_backends import BACKENDS, create_backend
+from utils.ocr_pool import OCRPool
+from utils.orc import preprocess_image
+
+
+def recall(expected: str, recognised: str) -> float:
+    want = {resolve_key(i) for i in parse_ingredients(expected)} - {None}
+    got = {resolve_key(i) for i in parse_ingredients(recognised)} - {None}
+    return len(want & got) / len(want) if want else 0.0
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_in_process(name: str, labels: list) -> dict:
+    images = [preprocess_image(Image.open(io.BytesIO(data))) for _, data in labels]
+
+    started = time.perf_counter()
+    backend = create_backend(name)
+    if backend.name != name:
+        return {}
+    first = backend.image_to_string(images[0])
+    cold = time.perf_counter() - started
+
+    timings, recalls = [], [recall(labels[0][0], first)]
+    for (text, _), image in zip(labels[1:], images[1:]):
+        started = time.perf_counter()
+        result = backend.image_to_string(image)
+        timings.append(time.perf_counter() - started)
+        recalls.append(recall(text, result))
+    backend.close()
+    return {
+        "cold_ms": cold * 1000,
+        "p50_ms": percentile(timings, 0.5) * 1000 if timings else 0,
+        "p95_ms": percentile(timings, 0.95) * 1000 if timings else 0,
+        "mean_ms": statistics.mean(timings) * 1000 if timings else 0,
+        "recall": statistics.mean(recalls),
+    }
+
+
+async def bench_pool(name: str, labels: list, workers: int) -> dict:
+    pool = OCRPool(workers=workers, queue_limit=len(labels), backend=name)
+    try:
+        # Прогрев: воркеры поднимаются и инициализируют движок
+        await asyncio.gather(*(pool.extract_text(labels[0][1]) for _ in range(workers)))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(pool.extract_text(data) for _, data in labels))
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+    return {
+        "photos_per_s": len(labels) / elapsed,
+        "recall": statistics.mean(recall(text, result) for (text, _), result in zip(labels, results)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), action="append",
+                        help="какие движки сравнивать (по умолчанию все доступные)")
+    args = parser.parse_args()
+
+    labels = label_set(args.images)
+    for name in args.backend or sorted(BACKENDS):
+        try:
+            single = bench_in_process(name, labels)
+        except Exception as e:
+            print(f"{name}: недоступен ({e})")
+            continue
+        if not single:
+            print(f"{name}: недоступен (откат на другой движок)")
+            continue
+        pooled = asyncio.run(bench_pool(name, labels, args.workers))
+        print(
+            f"{name:>10}: холодный старт {single['cold_ms']:.0f} мс | "
+            f"на фото p50 {single['p50_ms']:.0f} / p95 {single['p95_ms']:.0f} / "
+            f"среднее {single['mean_ms']:.0f} мс | recall {single['recall']:.2f} | "
+            f"пул x{args.workers}: {pooled['photos_per_s']:.2f} фото/с, recall {pooled['recall']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Корпус составов для бенчмарков.
+
+corpus/inci.txt — составы с упаковок, как их вводят текстом.
+ocr_noise() портит текст так, как это делает распознавание фото:
+пропущенные запятые, переносы строк, цифры вместо похожих букв.
+synthetic_inci_names() и misspell() — база в десятки тысяч названий и
+запросы к ней с опечатками, для нечёткого поиска на вырост.
+"""
+import random
+from pathlib import Path
+
+CORPUS_PATH = Path(__file__).parent / "corpus" / "inci.txt"
+
+_LOOKALIKES = {"O": "0", "I": "1", "l": "1", "S": "5", "B": "8", "o": "0"}
+
+
+def load_corpus(path: Path = CORPUS_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def ocr_noise(text: str, rate: float = 0.05, seed: int = 0) -> str:
+    """Типичные ошибки OCR с вероятностью rate на символ."""
+    rng = random.Random(seed)
+    out = []
+    for ch in text:
+        roll = rng.random()
+        if ch == "," and roll < rate * 4:
+            continue                                  # потерянная запятая
+        if ch == " " and roll < rate * 2:
+            out.append("\n")                          # перенос строки на этикетке
+            continue
+        if ch in _LOOKALIKES and roll < rate:
+            out.append(_LOOKALIKES[ch])
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def noisy_corpus(rate: float = 0.05, seed: int = 0) -> list:
+    """Корпус плюс по одной «распознанной» версии каждого состава."""
+    clean = load_corpus()
+    return clean + [ocr_noise(text, rate, seed + i) for i, text in enumerate(clean)]
+
+
+# Синтетическая база INCI: как в CosIng, заметная часть названий начинается
+# с одной из частых основ (PEG-n, SODIUM, HYDROLYZED...), остальное — слоги
+_STEMS = {
+    "PEG": 0.05, "PPG": 0.03, "SODIUM": 0.03, "HYDROLYZED": 0.025, "POLYGLYCERYL": 0.015,
+    "POTASSIUM": 0.01, "DISODIUM": 0.01, "GLYCERYL": 0.01, "ACRYLATES": 0.01,
+    "CITRUS": 0.005, "CALCIUM": 0.005, "METHYL": 0.005,
+}
+_NUMBERED = ("PEG", "PPG", "POLYGLYCERYL")
+_SYLLABLES = (
+    "AL", "AN", "AR", "BA", "BU", "CA", "CE", "CO", "CYL", "DI", "EL", "ET", "FU", "GLY", "GO", "HY", "KI",
+    "LA", "LAU", "LI", "MA", "ME", "MU", "MYR", "NA", "NO", "NU", "OL", "PA", "PE", "PHY", "PI", "QUI",
+    "RA", "RE", "RO", "SA", "SI", "STE", "SU", "TA", "TE", "TO", "TRI", "VA", "VI", "WO", "XY", "ZE", "ZO",
+)
+_ENDINGS = (
+    "EXTRACT", "OIL", "ACID", "ESTER", "GLUCOSIDE", "SULFATE", "CHLORIDE", "STEARATE",
+    "LEAF_EXTRACT", "SEED_OIL", "ROOT_EXTRACT", "COPOLYMER", "", "", "", "",
+)
+
+
+def synthetic_inci_names(count: int, seed: int = 0, base=()) -> list:
+    """count уникальных ключей в стиле базы (SODIUM_LAURETH_SULFATE), включая base."""
+    rng = random.Random(seed)
+    stems, weights = list(_STEMS), list(_STEMS.values())
+    stem_share = sum(weights)
+    names = set(base)
+
+    def word():
+        return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+    while len(names) < count:
+        parts = [word()]
+        if rng.random() < 0.3:
+            parts.append(word())
+        if rng.random() < stem_share:
+            stem = rng.choices(stems, weights)[0]
+            parts.insert(0, f"{stem}_{rng.randint(2, 150)}" if stem in _NUMBERED else stem)
+        ending = rng.choice(_ENDINGS)
+        if ending:
+            parts.append(ending)
+        names.add("_".join(parts))
+    return sorted(names)
+
+
+def misspell(name: str, edits: int, rng: random.Random) -> str:
+    """Название, как его вводят или распознают: пробелы вместо _, edits пропусков/перестановок/замен."""
+    chars = list(name.replace("_", " "))
+    for _ in range(edits):
+        i = rng.randrange(len(chars) - 1)
+        roll = rng.random()
+        if roll < 1 / 3:
+            del chars[i]
+        elif roll < 2 / 3:
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        else:
+            chars[i] = rng.choice("ABCDEFGHIKLMNOPRSTUY")
+    return "".join(chars)
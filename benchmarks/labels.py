@@ -0,0 +1,72 @@
+"""Синтетические фото этикеток для бенчмарков OCR.
+
+Текст состава рисуется шрифтом на сером фоне, затем кадр поворачивается,
+зашумляется и сохраняется в JPEG — примерно как фото флакона с телефона.
+"""
+import io
+import random
+import textwrap
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from benchmarks.corpus import load_corpus
+
+
+def _font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_label(text: str, size=(2560, 1920), font_size: int = 34, angle: float = 0.0,
+                 noise: float = 0.0, seed: int = 0, quality: int = 85) -> bytes:
+    """JPEG с составом: текст в центре кадра, поворот на angle градусов, шум до noise (0..1)."""
+    rng = random.Random(seed)
+    image = Image.new("L", size, 190 + rng.randint(-20, 20))
+    draw = ImageDraw.Draw(image)
+    font = _font(font_size)
+    chars_per_line = max(20, int(size[0] * 0.6 / (font_size * 0.55)))
+    lines = textwrap.wrap(text, chars_per_line)
+    x = size[0] // 5
+    y = size[1] // 2 - len(lines) * font_size * 3 // 4
+    for line in lines:
+        draw.text((x, y), line, fill=rng.randint(10, 50), font=font)
+        y += int(font_size * 1.5)
+
+    if angle:
+        image = image.rotate(angle, resample=Image.BICUBIC, fillcolor=190)
+    if noise:
+        speckle = Image.effect_noise(size, 255 * noise)
+        image = Image.blend(image, speckle, noise / 2)
+        image = image.filter(ImageFilter.GaussianBlur(0.6))
+
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def render_photo_sizes(text: str, sides=(320, 800, 1280, 2560), **kwargs) -> dict:
+    """Один кадр в размерах, как их отдаёт Telegram в message.photo: {длинная сторона: JPEG}."""
+    full = Image.open(io.BytesIO(render_label(text, **kwargs)))
+    result = {}
+    for side in sides:
+        scale = side / max(full.size)
+        resized = full.resize((round(full.width * scale), round(full.height * scale)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, "JPEG", quality=85)
+        result[side] = buffer.getvalue()
+    return result
+
+
+def label_set(count: int, seed: int = 0, **kwargs) -> list:
+    """count пар (текст, JPEG) со случайным составом, наклоном и шумом."""
+    rng = random.Random(seed)
+    corpus = load_corpus()
+    labels = []
+    for i in range(count):
+        text = rng.choice(corpus)
+        params = {"angle": rng.uniform(-3, 3), "noise": rng.uniform(0, 0.3), "seed": seed + i}
+        params.update(kwargs)
+        labels.append((text, render_label(text, **params)))
+    return labels
@@ -0,0 +1,363 @@
+"""Бенчмарки бота: микробенчмарки функций и сквозная нагрузка на диалог.
+
+Микробенчмарки — разбор состава, нечёткий поиск, анализ, отчёт,
+подготовка фото и (если есть tesseract) OCR на корпусе
+benchmarks/corpus/inci.txt и синтетических этикетках. Нечёткий поиск
+гоняется ещё и на синтетической базе из RESOLVER_DB_SIZE названий:
+медиана и среднее должны укладываться в RESOLVE_TARGET_US, иначе
+прогон завершается с кодом 1.
+
+Сквозной прогон поднимает фейковый Bot API (scripts/fake_bot_api.py) и
+приложение из main.build_application() в этом же процессе. Затем
+--chats чатов одновременно проходят диалог /start -> категория -> тип ->
+цель -> состав, часть из них (--photo-share) присылает фото этикетки.
+
+Отчёт содержит пропускную способность, p50/p99 и пиковый RSS. В
+пропускную способность и задержки входят только диалоги, закончившиеся
+отчётом; ответы с ошибкой и диалоги без ответа считаются отдельно.
+--save сохраняет его в JSON, --compare сравнивает с сохранённым и
+завершается с кодом 1, если что-то стало хуже больше чем на --tolerance
+или провалов стало больше.
+
+Базовый отчёт в репозитории не хранится: цифры зависят от машины и от
+того, установлен ли tesseract (без него все диалоги с фото — провалы).
+Сохраните его на своей машине до изменений и сравнивайте с ним после.
+
+Запуск из корня репозитория:
+  python -m benchmarks.run --save benchmarks/baseline.json
+  python -m benchmarks.run --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import platform
+import resource
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import config
+
+FAKE_API_HOST = "127.0.0.1"
+FAKE_API_PORT = 8091
+
+# Метрики, для которых больше — лучше; у остальных (задержки, память) лучше меньше
+HIGHER_IS_BETTER = ("ops_per_s", "dialogs_per_s", "completed")
+# Счётчики провалов: любой рост — регрессия, без допуска
+FAILURES = ("e2e.failed_text", "e2e.failed_photo", "e2e.no_reply")
+# По этой строке последний ответ диалога отличается от сообщения об ошибке
+REPORT_MARK = "Общая оценка"
+# Нечёткий поиск на вырост: база в десятки тысяч названий, поиск быстрее миллисекунды
+RESOLVER_DB_SIZE = 30_000
+RESOLVER_QUERIES = 2_000
+RESOLVE_TARGET_US = 1000
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss в Linux — килобайты; children — самый «тяжёлый» из завершённых дочерних (воркеры OCR)
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+# --- микробенчмарки ---
+
+def bench(fn, inputs: list, min_time: float = 0.5, max_calls: int = 100_000) -> dict:
+    """Вызывает fn по кругу на inputs не меньше min_time секунд; задержка каждого вызова."""
+    fn(inputs[0])  # прогрев: ленивые индексы, кэши модулей
+    timings = []
+    started = time.perf_counter()
+    i = 0
+    while (time.perf_counter() - started < min_time or i < len(inputs)) and i < max_calls:
+        arg = inputs[i % len(inputs)]
+        t = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - t)
+        i += 1
+    total = sum(timings)
+    return {
+        "calls": len(timings),
+        "ops_per_s": len(timings) / total if total else 0.0,
+        "mean_us": total / len(timings) * 1e6,
+        "p50_us": percentile(timings, 0.5) * 1e6,
+        "p99_us": percentile(timings, 0.99) * 1e6,
+    }
+
+
+def bench_large_resolver(min_time: float) -> dict:
+    """Поиск с опечатками (0-2 на название) по синтетической базе из RESOLVER_DB_SIZE названий."""
+    import random
+
+    from benchmarks.corpus import misspell, synthetic_inci_names
+    from utils.ingredients_store import INGREDIENTS_DB
+    from utils.resolver import IngredientResolver, load_aliases
+
+    names = synthetic_inci_names(RESOLVER_DB_SIZE, base=INGREDIENTS_DB.snapshot.keys())
+    started = time.perf_counter()
+    resolver = IngredientResolver(names, load_aliases())
+    build_s = time.perf_counter() - started
+    rng = random.Random(0)
+    queries = [misspell(rng.choice(names), rng.choice((0, 1, 2)), rng) for _ in range(RESOLVER_QUERIES)]
+    return {**bench(resolver.resolve, queries, min_time), "build_s": build_s}
+
+
+def run_micro(min_time: float, images: int) -> dict:
+    from PIL import Image
+
+    from benchmarks.corpus import load_corpus, noisy_corpus
+    from benchmarks.labels import label_set
+    from utils.analysis import parse_ingredients, analyze_composition
+    from utils.report import format_report
+    from utils.report_cache import composition_fingerprint
+    from utils.resolver import get_resolver
+    from utils.orc import preprocess_image, extract_text_from_photo
+    from utils.ocr_backends import tesserocr
+
+    clean = load_corpus()
+    noisy = noisy_corpus()[len(clean):]
+    parsed = [parse_ingredients(text) for text in clean]
+    goal = "увлажнить сухие кончики"
+    reports = [analyze_composition(ings, goal, "hair", "Шампунь") for ings in parsed]
+    names = sorted({name for ings in (parse_ingredients(t) for t in noisy) for name in ings})
+    resolver = get_resolver()
+
+    results = {
+        "parse_clean": bench(parse_ingredients, clean, min_time),
+        "parse_ocr_noisy": bench(parse_ingredients, noisy, min_time),
+        # Без lru_cache resolve_ingredient — стоимость промаха кэша
+        "resolve_uncached": bench(resolver.resolve, names, min_time),
+        "resolve_large_db": bench_large_resolver(min_time),
+        "analyze_composition": bench(lambda ings: analyze_composition(ings, goal, "hair", "Шампунь"), parsed, min_time),
+        "format_report": bench(lambda report: format_report(report, "Шампунь"), reports, min_time),
+        "fingerprint": bench(lambda ings: composition_fingerprint(ings, "hair", "Шампунь", goal), parsed, min_time),
+    }
+
+    labels = [data for _, data in label_set(images)]
+    results["preprocess_image"] = bench(
+        lambda data: preprocess_image(Image.open(io.BytesIO(data))), labels, min_time, max_calls=len(labels) * 3
+    )
+    if shutil.which("tesseract") or tesserocr is not None:
+        results["extract_text_from_photo"] = bench(
+            extract_text_from_photo, labels, min_time, max_calls=len(labels)
+        )
+    else:
+        print("tesseract не найден — extract_text_from_photo пропущен", file=sys.stderr)
+    return results
+
+
+# --- сквозной прогон ---
+
+def configure_for_e2e():
+    """Бот ходит в фейковый Bot API и не трогает внешнюю сеть. Вызывать до импорта main."""
+    base = f"http://{FAKE_API_HOST}:{FAKE_API_PORT}"
+    config.BOT_API_URL = f"{base}/bot"
+    config.BOT_API_FILE_URL = f"{base}/file/bot"
+    config.EXTERNAL_LOOKUP_URL = f"{base}/ingredient/{{slug}}"
+    config.METRICS_PORT = 0
+
+
+async def run_e2e(chats: int, photo_share: float, timeout: float) -> dict:
+    from aiohttp import web
+    from telegram import Update
+
+    from benchmarks.corpus import noisy_corpus
+    from benchmarks.labels import render_photo_sizes
+    from scripts.fake_bot_api import FakeBotAPI
+    from main import build_application
+    from utils import metrics
+
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, FAKE_API_HOST, FAKE_API_PORT).start()
+
+    corpus = noisy_corpus()
+    photo_chats = int(chats * photo_share)
+    photos = {}
+    for i in range(photo_chats):
+        text = corpus[i % len(corpus)]
+        photos[i] = api.add_photo(f"label{i}", await asyncio.to_thread(render_photo_sizes, text, seed=i))
+
+    application = build_application(with_updater=False)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    async def deliver(data: dict):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    metrics.stages.clear()
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            api.run_dialog(deliver, 20_000 + i, corpus[i % len(corpus)], photos.get(i), timeout)
+            for i in range(chats)
+        ))
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await runner.cleanup()
+
+    # Завершённый диалог — тот, что закончился отчётом; ответ с ошибкой (фото не распознано,
+    # «занято») — провал, иначе сломанный путь выглядел бы в сравнении как ускорение
+    completed, failed_text, failed_photo, no_reply = [], 0, 0, 0
+    for i, r in enumerate(results):
+        if len(r) < 5 or None in r:
+            no_reply += 1
+        elif REPORT_MARK in api.replies[20_000 + i][-1]:
+            completed.append(r)
+        elif i in photos:
+            failed_photo += 1
+        else:
+            failed_text += 1
+    steps = [t for r in completed for t in r]
+    final = [r[-1] for r in completed]
+    return {
+        "dialogs": chats,
+        "completed": len(completed),
+        "failed_text": failed_text,
+        "failed_photo": failed_photo,
+        "no_reply": no_reply,
+        "dialogs_per_s": len(completed) / elapsed if elapsed else 0.0,
+        "step_p50_ms": percentile(steps, 0.5) * 1000,
+        "step_p99_ms": percentile(steps, 0.99) * 1000,
+        "ingredients_p50_ms": percentile(final, 0.5) * 1000,
+        "ingredients_p99_ms": percentile(final, 0.99) * 1000,
+        "stages": {
+            stage: {"count": hist.count, "p50_ms": hist.quantile(0.5) * 1000, "p99_ms": hist.quantile(0.99) * 1000}
+            for stage, hist in sorted(metrics.stages.items())
+        },
+        "bot_api_calls": dict(api.calls),
+    }
+
+
+# --- отчёт и сравнение ---
+
+def flatten(report: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Список регрессий: (метрика, было, стало, изменение)."""
+    current, previous = flatten(report), flatten(baseline)
+    regressions = []
+    for name in FAILURES:
+        old, new = previous.get(name, 0), current.get(name, 0)
+        if new > old:
+            regressions.append((name, old, new, (new - old) / max(old, 1)))
+    for name, old in previous.items():
+        # Счётчики стадий и вызовов зависят от нагрузки, а не от скорости
+        if name not in current or name in FAILURES or name == "e2e.dialogs" \
+                or name.startswith(("env.", "e2e.bot_api_calls")) \
+                or name.endswith((".calls", ".count")) or old == 0:
+            continue
+        new = current[name]
+        change = (new - old) / old
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        if worse > tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def check_targets(report: dict) -> list:
+    """Абсолютные цели, не зависящие от базового отчёта: (метрика, значение, цель)."""
+    misses = []
+    large = report.get("micro", {}).get("resolve_large_db")
+    if large:
+        for name in ("p50_us", "mean_us"):
+            if large[name] > RESOLVE_TARGET_US:
+                misses.append((f"micro.resolve_large_db.{name}", large[name], RESOLVE_TARGET_US))
+    return misses
+
+
+def print_report(report: dict):
+    print(f"Python {report['env']['python']} на {report['env']['machine']}")
+    if "micro" in report:
+        print(f"\n{'функция':<26}{'вызовов':>9}{'оп/с':>12}{'p50, мкс':>12}{'p99, мкс':>12}")
+        for name, r in report["micro"].items():
+            print(f"{name:<26}{r['calls']:>9}{r['ops_per_s']:>12.0f}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}")
+        large = report["micro"].get("resolve_large_db")
+        if large:
+            print(f"\nПоиск по базе из {RESOLVER_DB_SIZE} названий: среднее {large['mean_us']:.0f} мкс "
+                  f"(цель {RESOLVE_TARGET_US}), индекс строится {large['build_s']:.1f} с")
+    if "e2e" in report:
+        e = report["e2e"]
+        print(
+            f"\nДиалогов с отчётом: {e['completed']}/{e['dialogs']}, {e['dialogs_per_s']:.1f} в секунду\n"
+            f"Ответ с ошибкой: {e['failed_text']} с текстом, {e['failed_photo']} с фото; без ответа: {e['no_reply']}\n"
+            f"Шаг диалога: p50 {e['step_p50_ms']:.0f} мс, p99 {e['step_p99_ms']:.0f} мс\n"
+            f"Анализ состава: p50 {e['ingredients_p50_ms']:.0f} мс, p99 {e['ingredients_p99_ms']:.0f} мс"
+        )
+        for stage, s in e["stages"].items():
+            print(f"  {stage:<22}{s['count']:>6}  p50 {s['p50_ms']:>7.1f}  p99 {s['p99_ms']:>7.1f} мс")
+    rss = report["peak_rss_mb"]
+    print(f"\nПиковый RSS: {rss['self']:.0f} МБ (дочерние процессы: {rss['children']:.0f} МБ)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--e2e-only", action="store_true")
+    parser.add_argument("--min-time", type=float, default=0.5, help="секунд на каждый микробенчмарк")
+    parser.add_argument("--images", type=int, default=6, help="синтетических этикеток для OCR")
+    parser.add_argument("--chats", type=int, default=50, help="одновременных диалогов в сквозном прогоне")
+    parser.add_argument("--photo-share", type=float, default=0.2, help="доля диалогов с фото вместо текста")
+    parser.add_argument("--timeout", type=float, default=60, help="секунд на ответ бота")
+    parser.add_argument("--save", type=Path, help="сохранить отчёт в JSON")
+    parser.add_argument("--compare", type=Path, help="сравнить с сохранённым отчётом")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    configure_for_e2e()
+    report = {"env": {"python": platform.python_version(), "machine": platform.machine()}}
+    if not args.e2e_only:
+        report["micro"] = run_micro(args.min_time, args.images)
+    if not args.micro_only:
+        report["e2e"] = asyncio.run(run_e2e(args.chats, args.photo_share, args.timeout))
+    report["peak_rss_mb"] = peak_rss_mb()
+    print_report(report)
+
+    if args.save:
+        args.save.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nОтчёт сохранён: {args.save}")
+
+    misses = check_targets(report)
+    if misses:
+        print("\nЦели не выполнены:")
+        for name, value, target in misses:
+            print(f"  {name}: {value:.0f} > {target}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nРегрессии (хуже чем на {args.tolerance:.0%}):")
+            for name, old, new, change in regressions:
+                print(f"  {name}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+            sys.exit(1)
+        print(f"\nРегрессий относительно {args.compare} нет")
+    if misses:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,82 @@ BOT_TOKEN = "8482039207:AAEOxj7vjwO_0L9IWZF80PvAWqky5RRj8zc"  # от @BotFather
 REDIS_HOST = "localhost"
 REDIS_PORT = 6379
 REDIS_DB = 0
+REDIS_MAX_CONNECTIONS = 20   # общий пул соединений на процесс
+REDIS_TIMEOUT = 0.5          # секунд на операцию, дальше считаем Redis недоступным
+REDIS_RETRY_INTERVAL = 30    # через сколько секунд снова пробовать Redis после сбоя
 
 # Админ-аккаунт студии (username БЕЗ @)
 ADMIN_USERNAME = "vivi_hairADM"
 
 # Список ID админов для команды /lift
-ADMINS = ["vivi_hairADM"]  # Добавьте сюда user_id админов, например [123456789]
\ No newline at end of file
+ADMINS = ["vivi_hairADM"]  # Добавьте сюда user_id админов, например [123456789]
+
+# OCR: пул процессов для распознавания фото
+OCR_WORKERS = 2          # число процессов tesseract
+OCR_QUEUE_LIMIT = 8      # сколько фото может ждать в очереди сверх занятых воркеров
+OCR_TIMEOUT = 20         # секунд на одно фото
+OCR_BACKEND = "auto"     # "tesserocr" — движок живёт в воркере, "subprocess" — pytesseract, "auto" — что доступно
+OCR_TESSDATA_PATH = None # каталог с traineddata для tesserocr; None — путь по умолчанию
+
+# Поиск неизвестных ингредиентов во внешнем источнике
+EXTERNAL_LOOKUP_URL = "https://incidecoder.com/ingredient/{slug}"
+EXTERNAL_LOOKUP_TIMEOUT = 5             # секунд на запрос
+EXTERNAL_LOOKUP_CONCURRENCY = 4         # одновременных запросов на процесс
+EXTERNAL_LOOKUP_TTL = 30 * 86400        # найденные ингредиенты храним 30 дней
+EXTERNAL_LOOKUP_NEGATIVE_TTL = 86400    # «не найдено» — сутки
+EXTERNAL_LOOKUP_MAX_PER_REQUEST = 3     # сколько неизвестных ищем за один анализ
+
+# Кэш готовых отчётов по отпечатку состава
+REPORT_CACHE_TTL = 7 * 86400
+REPORT_CACHE_LOCAL_SIZE = 512
+
+# Отчёты файлом (HTML/PNG, utils/report_render.py)
+REPORT_FILE_LOCAL_SIZE = 64       # готовых файлов в памяти процесса (PNG — сотни КБ)
+REPORT_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+REPORT_FONT_BOLD_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+
+# Кэш распознанного текста по file_unique_id и перцептивному хэшу фото
+OCR_CACHE_TTL = 30 * 86400
+
+# Telegram Bot API (можно направить на локальный фейковый сервер, см. scripts/fake_bot_api.py)
+BOT_API_URL = "https://api.telegram.org/bot"
+BOT_API_FILE_URL = "https://api.telegram.org/file/bot"
+CONCURRENT_UPDATES = 64            # сколько апдейтов процесс обрабатывает одновременно (один чат — по очереди)
+PERSISTENCE_UPDATE_INTERVAL = 5    # секунд между сбросами состояния диалогов в Redis
+
+# Webhook-режим: python main.py --webhook
+WEBHOOK_URL = ""                   # публичный адрес, например https://bot.example.com (пусто — не вызывать setWebhook)
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_SECRET = ""                # X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_WORKERS = 4                # процессов-обработчиков; апдейты шардируются по chat_id
+
+# Метрики Prometheus: http://METRICS_HOST:METRICS_PORT/metrics (0 — выключено).
+# В webhook-режиме воркер N слушает METRICS_PORT + N.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9100
+
+# Подготовка фото к OCR и выбор размера
+OCR_MAX_SIDE = 2000           # больше — уменьшаем: tesseract медленнее, а точнее не становится
+OCR_MIN_SIDE = 1000           # меньше — увеличиваем, мелкий текст распознаётся хуже
+OCR_START_SIDE = 800          # с какого размера из photo[] начинать
+OCR_MIN_RECOGNISED = 3        # меньше известных ингредиентов — пробуем фото крупнее
+
+# Сессии диалогов (context.user_data)
+SESSION_IDLE_TTL = 86400          # секунд без апдейтов, после которых сессия и состояние диалога удаляются
+SESSION_EVICT_INTERVAL = 300      # как часто искать простаивающие сессии в памяти
+
+# Допуск к анализу (OCR, внешний поиск, разбор) при всплесках нагрузки
+ADMISSION_MAX_ACTIVE = 16         # анализов одновременно на процесс
+ADMISSION_PER_USER = 1            # одновременно у одного пользователя
+ADMISSION_MAX_QUEUE = 200         # длиннее — новые запросы сразу получают «занято»
+ADMISSION_DEADLINE = 10           # секунд ожидания в очереди, дальше — «занято, пришлите текстом»
+
+# Промежуточные ответы во время анализа
+PROGRESS_MIN_INTERVAL = 1.0       # секунд между правками сообщения «⏳ …» (лимиты Telegram на edit)
+
+# Альбомы (несколько фото одной этикетки)
+MEDIA_GROUP_WINDOW = 1.0          # секунд тишины после последнего фото альбома — альбом собран
+MEDIA_GROUP_MAX_WAIT = 5.0        # дольше не ждём, даже если фото ещё приходят
+MEDIA_GROUP_MAX_PHOTOS = 10       # больше фото Telegram в альбом не кладёт
@@ -1,4 +1,25 @@
+"""Сборка базы ингредиентов из part*.json.
+
+Проверяет части, объединяет их (при дублях берётся первое вхождение) и
+сохраняет:
+  * ingredients_db.json   — читаемая копия, как раньше;
+  * ingredients_db.sqlite — версионированный снапшот, который бот читает
+    через mmap без загрузки всей базы в память каждого процесса.
+
+Снапшот пишется во временный файл и подменяется атомарно (os.replace),
+запущенный бот сам подхватывает новую версию.
+
+Запуск: python data/buid_db.py
+"""
+import hashlib
 import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent
 
 # Имена файлов частей (сохраните каждую часть как .json)
 PARTS = [
@@ -10,20 +31,103 @@ PARTS = [
     "part6.json"
 ]
 
-full_db = {}
+JSON_PATH = DATA_DIR / "ingredients_db.json"
+SNAPSHOT_PATH = DATA_DIR / "ingredients_db.sqlite"
+SCHEMA_VERSION = 1
+
+RISK_LEVELS = {"low", "medium", "high"}
+STR_FIELDS = ("name_ru", "function", "notes")
+LIST_FIELDS = ("good_for", "bad_for")
 
-for part_file in PARTS:
-    with open(part_file, "r", encoding="utf-8") as f:
-        part_data = json.load(f)
-        # Убираем дубли (если были для надёжности)
+
+def validate_entry(key: str, value) -> list:
+    """Список ошибок для одной записи (пустой — запись корректна)."""
+    if not isinstance(value, dict):
+        return [f"{key}: запись должна быть объектом"]
+    errors = []
+    for field in STR_FIELDS:
+        if not isinstance(value.get(field), str):
+            errors.append(f"{key}: поле {field} должно быть строкой")
+    for field in LIST_FIELDS:
+        items = value.get(field)
+        if not isinstance(items, list) or not all(isinstance(i, str) for i in items):
+            errors.append(f"{key}: поле {field} должно быть списком строк")
+    if value.get("risk_level") not in RISK_LEVELS:
+        errors.append(f"{key}: risk_level должен быть одним из {sorted(RISK_LEVELS)}")
+    return errors
+
+
+def merge_parts(parts=PARTS) -> tuple:
+    """Объединяет части. Возвращает (база, ошибки)."""
+    full_db = {}
+    errors = []
+    for part_file in parts:
+        with open(DATA_DIR / part_file, "r", encoding="utf-8") as f:
+            part_data = json.load(f)
         for key, value in part_data.items():
+            errors.extend(f"{part_file}: {e}" for e in validate_entry(key, value))
+            # Убираем дубли (если были для надёжности)
             if key not in full_db:  # берём первое вхождение
                 full_db[key] = value
+    return full_db, errors
+
+
+def db_version(db: dict) -> str:
+    """Версия = хэш содержимого: одинаковые данные дают одинаковую версию."""
+    canonical = json.dumps(db, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def write_snapshot(db: dict, path: Path = SNAPSHOT_PATH) -> str:
+    """Пишет SQLite-снапшот атомарно. Возвращает версию."""
+    version = db_version(db)
+    tmp_path = path.with_suffix(".sqlite.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE ingredients (key TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("version", version),
+            ("schema", str(SCHEMA_VERSION)),
+            ("built_at", str(int(time.time()))),
+            ("count", str(len(db))),
+        ])
+        conn.executemany(
+            "INSERT INTO ingredients VALUES (?, ?)",
+            ((key, json.dumps(value, ensure_ascii=False, separators=(",", ":"))) for key, value in db.items()),
+        )
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return version
+
+
+def main() -> int:
+    full_db, errors = merge_parts()
+    if errors:
+        print("❌ Ошибки в исходных частях:")
+        for e in errors:
+            print(f"  • {e}")
+        return 1
+
+    print(f"✅ Собрано {len(full_db)} уникальных ингредиентов.")
+
+    # Сохраняем
+    with open(JSON_PATH, "w", encoding="utf-8") as f:
+        json.dump(full_db, f, ensure_ascii=False, indent=2)
+    print(f"📁 Файл сохранён: {JSON_PATH.name}")
 
-print(f"✅ Собрано {len(full_db)} уникальных ингредиентов.")
+    version = write_snapshot(full_db)
+    print(f"📦 Снапшот сохранён: {SNAPSHOT_PATH.name} (версия {version})")
+    return 0
 
-# Сохраняем
-with open("ingredients_db.json", "w", encoding="utf-8") as f:
-    json.dump(full_db, f, ensure_ascii=False, indent=2)
 
-print("📁 Файл сохранён: ingredients_db.json")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,22 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
+import asyncio
 import logging
-from utils.limits import is_limit_exceeded, increment_count, grant_subscription
-from utils.orc import extract_text_from_photo
-from utils.analysis import parse_ingredients, analyze_composition
-from config import ADMIN_USERNAME, ADMINS
+from utils.limits import is_limit_exceeded, increment_count, grant_subscription, has_subscription
+from utils.admission import admission, AdmissionRejected, PRIORITY_SUBSCRIBER, PRIORITY_REGULAR, PRIORITY_PHOTO
+from utils.ocr_pool import OCRQueueFull, OCRTimeout
+from utils.ocr_cache import extract_text_adaptive
+from utils.analysis import parse_ingredients, analyze_composition, count_recognised, merge_ingredient_lists
+from utils.lookup import enrich_unknown_ingredients
+from utils.report import format_report, fill_goal
+from utils.report_cache import composition_fingerprint, get_cached_report, cache_report
+from utils.report_render import get_report_file
+from utils.metrics import timed, timed_handler, format_stats
+from utils.inflight import analyses, Preempted
+from utils.media_group import media_groups
+from handlers.progress import ProgressMessage
+from config import ADMIN_USERNAME, ADMINS, EXTERNAL_LOOKUP_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -21,22 +32,44 @@ def make_contact_button(text: str) -> InlineKeyboardButton:
     url = f"tg://resolve?domain={ADMIN_USERNAME}&text={text.replace(' ', '%20')}"
     return InlineKeyboardButton(text, url=url)
 
+def is_admin(user) -> bool:
+    # В ADMINS могут быть и user_id, и username
+    return user.id in ADMINS or user.username in ADMINS
+
+LIMIT_TEXT = (
+    "🚫 Вы использовали все 5 бесплатных запросов на сегодня.\n\n"
+    "💡 Хотите безлимитный доступ и персональные рекомендации?"
+)
+
+def limit_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[make_contact_button("Купить подписку на бот")]])
+
+async def reply_limit_exceeded(message):
+    await message.reply_text(LIMIT_TEXT, reply_markup=limit_keyboard())
+
+def busy_text(message) -> str:
+    if message.photo:
+        return ("🚦 Сейчас очень много запросов.\n\n"
+                "Пожалуйста, отправьте состав текстом — так быстрее — или попробуйте фото через пару минут.")
+    return "🚦 Сейчас очень много запросов. Попробуйте, пожалуйста, через пару минут."
+
+def end_session(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> int:
+    """Завершает диалог: сессия больше не нужна ни в памяти, ни в Redis."""
+    context.application.drop_user_data(user_id)
+    return ConversationHandler.END
+
+@timed_handler("step_start")
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    if is_limit_exceeded(user_id):
-        await update.message.reply_text(
-            "🚫 Вы использовали все 5 бесплатных запросов на сегодня.\n\n"
-            "💡 Хотите безлимитный доступ и персональные рекомендации?",
-            reply_markup=InlineKeyboardMarkup([[
-                make_contact_button("Купить подписку на бот")
-            ]])
-        )
-        return ConversationHandler.END
+    if await is_limit_exceeded(user_id):
+        await reply_limit_exceeded(update.effective_message)
+        return end_session(context, user_id)
 
     keyboard = [
         [InlineKeyboardButton("💇 Уход за волосами", callback_data="cat:hair")],
     ]
-    await update.message.reply_text(
+    # update.message пуст, если пришли из кнопки «Заново» (callback_query)
+    await update.effective_message.reply_text(
         "✨ Привет! Я — бот-косметолог 🧪\n"
         "Я помогу разобрать состав любого средства и сказать: подходит ли оно вам.\n\n"
         "👉 Сначала выберите категорию:",
@@ -44,11 +77,12 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return SELECT_CATEGORY
 
+@timed_handler("step_category")
 async def category_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     category = query.data.split(":")[1]
-    context.user_data["category"] = category
+    context.user_data.category = category
 
     if category == "skin":
         subtypes = ["Лицо", "Тело", "Руки/Ноги"]
@@ -66,11 +100,12 @@ async def category_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return SELECT_SUBTYPE
 
+@timed_handler("step_subtype")
 async def subtype_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     subtype = query.data.split(":")[1]
-    context.user_data["subtype"] = subtype
+    context.user_data.subtype = subtype
 
     examples = {
         "Шампунь": "очистить жирную кожу головы, уменьшить зуд",
@@ -88,13 +123,14 @@ async def subtype_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return SELECT_GOAL
 
+@timed_handler("step_goal")
 async def goal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     goal = update.message.text.strip()
     if not goal:
         await update.message.reply_text("❌ Пожалуйста, опишите цель (например: *«увлажнить сухую кожу лица»*).", parse_mode=ParseMode.MARKDOWN)
         return SELECT_GOAL
 
-    context.user_data["goal"] = goal
+    context.user_data.goal = goal
 
     await update.message.reply_text(
         "📸 Теперь отправьте:\n"
@@ -105,93 +141,177 @@ async def goal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return UPLOAD_INGREDIENTS
 
+async def recognise_photo(message) -> str:
+    """OCR одного фото; начинаем с небольшого размера, крупнее — только если узнано мало ингредиентов."""
+    try:
+        return await extract_text_adaptive(message.photo, lambda text: count_recognised(parse_ingredients(text)))
+    except OCRTimeout:
+        return ""
+
+async def analyse_ingredients(message, photos: list, session, user_id: int, progress: ProgressMessage):
+    """Тяжёлая часть: OCR, разбор, внешний поиск, анализ. Выполняется отменяемой задачей.
+
+    photos — сообщения с фото (несколько, если прислали альбом), для текста пусто.
+    Возвращает (текст отчёта, отпечаток состава) или None, если итог (ошибку) уже показали пользователю.
+    """
+    async def priority() -> int:
+        base = PRIORITY_SUBSCRIBER if await has_subscription(user_id) else PRIORITY_REGULAR
+        return base + (PRIORITY_PHOTO if photos else 0)
+
+    # Тяжёлые этапы — только после допуска: ограничение параллельности и очередь с дедлайном
+    async with admission.admit(user_id, priority):
+        # Получаем текст или фото
+        if photos:
+            # Фото альбома распознаются параллельно, пул OCR сам ограничивает нагрузку
+            try:
+                texts = await asyncio.gather(*(recognise_photo(photo) for photo in photos))
+            except OCRQueueFull:
+                await progress.finish(
+                    "🚦 Сейчас много фото в обработке.\n\n"
+                    "Пожалуйста, отправьте состав текстом или попробуйте фото чуть позже."
+                )
+                return None
+            texts = [text for text in texts if text]
+            if not texts:
+                await progress.finish(
+                    "❌ Не удалось распознать текст на фото.\n\n"
+                    "Пожалуйста, отправьте состав текстом (латиницей, через запятую или точку с запятой)."
+                )
+                return None
+            raw_ingredients = "\n\n".join(texts)
+        else:
+            texts = [message.text.strip()]
+            raw_ingredients = texts[0]
+
+        # Парсим состав; части с разных фото склеиваем по порядку без повторов
+        with timed("parse"):
+            if len(texts) > 1:
+                ingredients = merge_ingredient_lists([parse_ingredients(text) for text in texts])
+            else:
+                ingredients = parse_ingredients(raw_ingredients)
+        if not ingredients:
+            await progress.finish(
+                "❌ Не удалось распознать компоненты. Убедитесь, что текст на латинице и содержит названия вроде *Glycerin*, *Panthenol*.\n\n"
+                "Попробуйте ещё раз:",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return None
+
+        # Сохраняем
+        session.ingredients_raw = raw_ingredients
+        session.ingredients_parsed = ingredients
+
+        # Неизвестные компоненты пробуем найти во внешнем источнике (с кэшем)
+        await progress.update(f"Нашёл компонентов: {len(ingredients)}. Уточняю незнакомые…")
+        try:
+            with timed("external_lookup"):
+                await asyncio.wait_for(enrich_unknown_ingredients(ingredients, user_id), timeout=EXTERNAL_LOOKUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("External lookup timed out, analysing with local DB only")
+
+        # Повторяющиеся составы отдаём из кэша готовых отчётов
+        await progress.update(f"Нашёл компонентов: {len(ingredients)}. Оцениваю состав…")
+        fingerprint = composition_fingerprint(ingredients, session.category, session.subtype, session.goal)
+        text = await get_cached_report(fingerprint)
+        if text is None:
+            with timed("analyze"):
+                report = analyze_composition(ingredients, session.goal, session.category, session.subtype)
+                text = format_report(report, session.subtype)
+            # Вместе с текстом — данные для отчёта файлом (рисуется, только если попросят)
+            await cache_report(fingerprint, text, report, session.subtype, session.goal)
+        return text, fingerprint
+
+@timed_handler("step_ingredients")
 async def ingredients_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    raw_ingredients = ""
-
-    # Получаем текст или фото
-    if update.message.photo:
-        photo = update.message.photo[-1]  # самый большой
-        file = await photo.get_file()
-        photo_bytes = await file.download_as_bytearray()
-        raw_ingredients = extract_text_from_photo(bytes(photo_bytes))
-        if not raw_ingredients:
-            await update.message.reply_text(
-                "❌ Не удалось распознать текст на фото.\n\n"
-                "Пожалуйста, отправьте состав текстом (латиницей, через запятую или точку с запятой)."
-            )
-            return UPLOAD_INGREDIENTS
-    elif update.message.text:
-        raw_ingredients = update.message.text.strip()
-    else:
-        await update.message.reply_text("❗ Отправьте фото или текст.")
-        return UPLOAD_INGREDIENTS
+    message = update.message
 
-    # Парсим состав
-    ingredients = parse_ingredients(raw_ingredients)
-    if not ingredients:
-        await update.message.reply_text(
-            "❌ Не удалось распознать компоненты. Убедитесь, что текст на латинице и содержит названия вроде *Glycerin*, *Panthenol*.\n\n"
-            "Попробуйте ещё раз:"
-        )
+    session = context.user_data
+    if not session.is_complete():
+        # Сессия истекла (SESSION_IDLE_TTL) или потерялась, а диалог остался в этом шаге
+        await message.reply_text("⌛ Сессия устарела. Начните заново: /start")
+        return end_session(context, user_id)
+
+    if not message.photo and not message.text:
+        await message.reply_text("❗ Отправьте фото или текст.")
         return UPLOAD_INGREDIENTS
 
-    # Сохраняем
-    context.user_data["ingredients_raw"] = raw_ingredients
-    context.user_data["ingredients_parsed"] = ingredients
+    # Фото альбома приходят отдельными апдейтами; разбирает их тот, кто пришёл первым
+    if message.photo and not media_groups.claim(message):
+        return UPLOAD_INGREDIENTS
 
-    # Анализ
-    category = context.user_data["category"]
-    subtype = context.user_data["subtype"]
-    goal = context.user_data["goal"]
+    # Сразу показываем, что работа началась, и дальше правим это сообщение
+    progress = ProgressMessage(message)
+    await progress.start("Распознаю текст на фото…" if message.photo else "Разбираю состав…")
 
-    report = analyze_composition(ingredients, goal, category, subtype)
+    # «Заново» или новое фото в этом чате отменяют анализ (см. on_chat_busy)
+    try:
+        photos = []
+        if message.photo:
+            photos = await media_groups.collect(message)
+            if len(photos) > 1:
+                await progress.update(f"Распознаю текст на {len(photos)} фото…")
+        result = await analyses.run(update.effective_chat.id, analyse_ingredients(message, photos, session, user_id, progress))
+    except Preempted:
+        await progress.finish("⏹ Анализ отменён.")
+        return UPLOAD_INGREDIENTS
+    except AdmissionRejected:
+        await progress.finish(busy_text(message))
+        return UPLOAD_INGREDIENTS
+    if result is None:
+        return UPLOAD_INGREDIENTS
+    text, fingerprint = result
+
+    # Запрос списываем, когда отчёт готов: отменённый анализ лимит не тратит.
+    # Проверка лимита и инкремент — один атомарный вызов Redis
+    if not await increment_count(user_id):
+        await progress.finish(LIMIT_TEXT, reply_markup=limit_keyboard())
+        return end_session(context, user_id)
+
+    with timed("reply"):
+        await progress.finish(
+            fill_goal(text, session.goal),
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Заново", callback_data="restart"), make_contact_button("Хочу разбор ухода")],
+                [InlineKeyboardButton("📄 Отчёт HTML", callback_data=f"file:html:{fingerprint}"),
+                 InlineKeyboardButton("🖼 Отчёт картинкой", callback_data=f"file:png:{fingerprint}")],
+            ])
+        )
 
-    # Формируем ответ
-    lines = [
-        f"🧴 *Анализ состава: {subtype}*\n",
-        f"🎯 *Ваша цель:* {goal}\n",
-    ]
+    return end_session(context, user_id)
 
-    if report["good"]:
-        lines.append("✅ *Подходящие компоненты:*")
-        for key, name, note in report["good"][:5]:
-            lines.append(f"• *{name}* — {note}")
-        if len(report["good"]) > 5:
-            lines.append(f"... и ещё {len(report['good']) - 5}")
-
-    if report["risky"]:
-        lines.append("\n⚠️ *Спорные / требуют осторожности:*")
-        for key, name, note in report["risky"][:5]:
-            lines.append(f"• *{name}* — {note}")
-
-    if report["bad"]:
-        lines.append("\n❌ *Нежелательные для вашей цели:*")
-        for key, name, note in report["bad"][:5]:
-            lines.append(f"• *{name}* — {note}")
-
-    lines.append(f"\n📊 *Общая оценка:* {report['score']}/10")
-    lines.append("\n💡 *Рекомендации:*")
-    for rec in report["recommendations"]:
-        lines.append(f"• {rec}")
-
-    lines.append(
-        "\n⚠️ *Важно:* Бот не заменяет консультацию дерматолога или трихолога.\n\n"
-        "Хотите *персональный разбор ухода за волосами* от профессионалов?"
-    )
+@timed_handler("report_file")
+async def report_file_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки под отчётом: полный отчёт (без сокращения до 5 пунктов) файлом HTML или PNG."""
+    query = update.callback_query
+    await query.answer()
+    _, fmt, fingerprint = query.data.split(":", 2)
 
-    await update.message.reply_text(
-        "\n".join(lines),
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔄 Заново", callback_data="restart"), make_contact_button("Хочу разбор ухода")],
-        ])
-    )
+    content = await get_report_file(fingerprint, fmt)
+    if content is None:
+        await query.message.reply_text("⌛ Этот отчёт устарел. Проверьте состав заново: /start")
+        return
+    # PNG — тоже документом: sendPhoto пережимает длинную картинку до 2560 px, и текст не читается
+    await query.message.reply_document(content, filename=f"report_{fingerprint[:8]}.{fmt}")
 
-    # Увеличиваем счётчик
-    increment_count(user_id)
+def on_chat_busy(update: object):
+    """Вызывается PerChatUpdateProcessor, если чат занят предыдущим апдейтом.
 
-    return ConversationHandler.END
+    Фото альбома присоединяются к собираемому альбому; «Заново», /start
+    и новое фото (не из того же альбома) отменяют текущий анализ.
+    """
+    if not isinstance(update, Update) or update.effective_chat is None:
+        return
+    query = update.callback_query
+    message = update.message
+    if message and message.photo and message.media_group_id is not None:
+        same_album = message in media_groups
+        media_groups.add(message)
+        if same_album:
+            return
+    if (query and query.data == "restart") or (message and (message.photo or message.text == "/start")):
+        analyses.cancel(update.effective_chat.id)
 
 async def cancel_or_restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -202,7 +322,7 @@ async def cancel_or_restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # Обработчик для снятия лимита (для админов)
 async def lift_limit_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id not in ADMINS:
+    if not is_admin(update.effective_user):
         await update.message.reply_text("У вас нет прав для этой команды.")
         return
     # Извлекаем user_id из сообщения, например: /lift 123456789
@@ -213,9 +333,16 @@ async def lift_limit_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         target_user_id = int(args[0])
         # Предоставляем подписку
-        if grant_subscription(target_user_id):
+        if await grant_subscription(target_user_id):
             await update.message.reply_text(f"Подписка для пользователя {target_user_id} активирована.")
         else:
             await update.message.reply_text("Не удалось активировать подписку (Redis недоступен).")
     except ValueError:
-        await update.message.reply_text("Неверный user_id.")
\ No newline at end of file
+        await update.message.reply_text("Неверный user_id.")
+
+# Статистика задержек и очередей (для админов)
+async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user):
+        await update.message.reply_text("У вас нет прав для этой команды.")
+        return
+    await update.message.reply_text(format_stats())
@@ -0,0 +1,61 @@
+import logging
+import time
+
+from telegram.error import BadRequest, TelegramError
+
+from config import PROGRESS_MIN_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Все промежуточные тексты начинаются с него — так их отличает и scripts/fake_bot_api.py
+PROGRESS_MARK = "⏳"
+
+
+class ProgressMessage:
+    """Сообщение-заглушка, которое редактируется по мере анализа.
+
+    start() сразу отвечает пользователю, update() меняет текст не чаще
+    раза в PROGRESS_MIN_INTERVAL секунд (промежуточные этапы можно
+    пропустить — Telegram ограничивает частоту правок), finish()
+    ставит итоговый текст всегда.
+    """
+
+    def __init__(self, reply_to, min_interval: float = PROGRESS_MIN_INTERVAL):
+        self.reply_to = reply_to
+        self.min_interval = min_interval
+        self.message = None
+        self._text = None
+        self._edited_at = 0.0
+
+    async def start(self, text: str):
+        self.message = await self.reply_to.reply_text(f"{PROGRESS_MARK} {text}")
+        self._text = self.message.text
+        self._edited_at = time.monotonic()
+
+    async def update(self, text: str):
+        text = f"{PROGRESS_MARK} {text}"
+        if self.message is None or text == self._text:
+            return
+        if time.monotonic() - self._edited_at < self.min_interval:
+            return
+        await self._edit(text)
+
+    async def finish(self, text: str, **kwargs):
+        if self.message is None or not await self._edit(text, **kwargs):
+            # Заглушку не отправили или её нельзя изменить — итог отдельным сообщением
+            self.message = await self.reply_to.reply_text(text, **kwargs)
+
+    async def _edit(self, text: str, **kwargs) -> bool:
+        try:
+            await self.message.edit_text(text, **kwargs)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return True
+            logger.warning(f"Progress edit failed: {e}")
+            return False
+        except TelegramError as e:
+            logger.warning(f"Progress edit failed: {e}")
+            return False
+        self._text = text
+        self._edited_at = time.monotonic()
+        return True
@@ -1,20 +1,75 @@
+import argparse
+import asyncio
 import logging
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from config import BOT_TOKEN
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
+from config import (
+    BOT_TOKEN, BOT_API_URL, BOT_API_FILE_URL, CONCURRENT_UPDATES, PERSISTENCE_UPDATE_INTERVAL,
+    METRICS_HOST, METRICS_PORT,
+)
 from handlers.conversation import (
     start_handler, category_handler, subtype_handler,
-    goal_handler, ingredients_handler, cancel_or_restart, lift_limit_handler,
+    goal_handler, ingredients_handler, cancel_or_restart, lift_limit_handler, stats_handler, on_chat_busy, report_file_handler,
     SELECT_CATEGORY, SELECT_SUBTYPE, SELECT_GOAL, UPLOAD_INGREDIENTS
 )
 from telegram.ext import ConversationHandler
+from utils.ocr_pool import ocr_pool
+from utils.redis_client import close_redis
+from utils.lookup import close_lookup_client
+from utils.resolver import get_resolver
+from utils.ingredients_store import watch_ingredients_db
+from utils.persistence import RedisPersistence
+from utils.session import Session, evict_idle_sessions
+from utils.update_processor import PerChatUpdateProcessor
+from utils import metrics
 
 # Логгирование
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
 
-def main():
-    application = Application.builder().token(BOT_TOKEN).build()
+# Фоновые задачи и серверы процесса, останавливаются при выключении
+background_tasks = []
+runners = []
+
+# Номер процесса в webhook-режиме: воркер N отдаёт метрики на METRICS_PORT + N
+metrics_port_offset = 0
+
+async def post_init(application: Application):
+    # Следим за новыми снапшотами базы ингредиентов (data/buid_db.py)
+    background_tasks.append(asyncio.create_task(watch_ingredients_db()))
+    background_tasks.append(asyncio.create_task(evict_idle_sessions(application)))
+    if METRICS_PORT:
+        runners.append(await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT + metrics_port_offset))
+
+async def post_shutdown(application: Application):
+    for task in background_tasks:
+        task.cancel()
+    for runner in runners:
+        await runner.cleanup()
+    ocr_pool.shutdown()
+    await close_lookup_client()
+    await close_redis()
+
+def build_application(with_updater: bool = True) -> Application:
+    """Собирает приложение со всеми обработчиками.
+
+    with_updater=False — для webhook-воркеров: апдейты им передаёт
+    процесс-приёмник (webhook.py), а не встроенный Updater.
+    """
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_URL)
+        .base_file_url(BOT_API_FILE_URL)
+        .concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES, on_busy=on_chat_busy))
+        .persistence(RedisPersistence(update_interval=PERSISTENCE_UPDATE_INTERVAL))
+        .context_types(ContextTypes(user_data=Session))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    application = builder.build()
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start_handler)],
@@ -29,13 +84,18 @@ def main():
         fallbacks=[
             CallbackQueryHandler(cancel_or_restart, pattern=r"^restart$")
         ],
-        per_message=True,
+        # /start в любом шаге начинает заново (он же отменяет идущий анализ, см. on_chat_busy)
+        allow_reentry=True,
+        per_message=False,
         per_chat=True,
-        per_user=True
+        per_user=True,
+        name="main",
+        persistent=True
     )
 
     application.add_handler(conv_handler)
     application.add_handler(CallbackQueryHandler(cancel_or_restart, pattern=r"^restart$"))
+    application.add_handler(CallbackQueryHandler(report_file_handler, pattern=r"^file:(html|png):[0-9a-f]{40}$"))
     application.add_handler(CommandHandler("help", lambda u, c: u.message.reply_text(
         "📌 Как пользоваться:\n"
         "1. Нажмите /start\n"
@@ -46,7 +106,23 @@ def main():
         "Лимит: 5 бесплатных запросов в сутки."
     )))
     application.add_handler(CommandHandler("lift", lift_limit_handler))
+    application.add_handler(CommandHandler("stats", stats_handler))
+    return application
+
+def main():
+    parser = argparse.ArgumentParser(description="Бот-косметолог")
+    parser.add_argument("--webhook", action="store_true", help="webhook-режим с несколькими процессами (см. config.WEBHOOK_*)")
+    args = parser.parse_args()
+
+    # Индекс нечёткого поиска строим заранее, а не на первом запросе пользователя
+    get_resolver()
+
+    if args.webhook:
+        import webhook
+        webhook.run()
+        return
 
+    application = build_application()
     print("Бот запущен!")
     application.run_polling()
 
@@ -0,0 +1,256 @@
+"""Фейковый Telegram Bot API для локальной проверки webhook-режима.
+
+Сервер отвечает на вызовы бота (getMe, sendMessage, editMessageText,
+answerCallbackQuery, getFile, ...) правдоподобными ответами, а клиент
+шлёт в webhook синтетические апдейты — полный сценарий диалога для
+множества чатов — и ждёт ответы бота.
+
+Использование:
+  1. В config.py: BOT_API_URL = "http://127.0.0.1:8081/bot",
+     BOT_API_FILE_URL = "http://127.0.0.1:8081/file/bot"
+     (по желанию) EXTERNAL_LOOKUP_URL = "http://127.0.0.1:8081/ingredient/{slug}" — без внешней сети
+  2. python scripts/fake_bot_api.py --chats 50 --wait 10
+  3. в течение 10 секунд: python main.py --webhook
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict
+
+import aiohttp
+from aiohttp import web
+
+# Так начинаются промежуточные сообщения бота (handlers/progress.py)
+PROGRESS_MARK = "⏳"
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+DEFAULT_INGREDIENTS = (
+    "Aqua, Sodium Laureth Sulfate, Cocamidopropyl Betaine, Glycerin, Panthenol, "
+    "Parfum, Sodium Chloride, Citric Acid, Sodium Benzoate, Dimethicone"
+)
+
+
+class FakeBotAPI:
+    """Состояние фейкового сервера: вызовы методов и ответы по чатам."""
+
+    def __init__(self):
+        self._message_ids = itertools.count(1000)
+        self._update_ids = itertools.count(1)
+        self.calls = defaultdict(int)
+        self.replies = defaultdict(list)      # chat_id -> тексты ответов бота
+        self.progress = defaultdict(list)     # chat_id -> промежуточные «⏳ …» (в ответы не входят)
+        self._reply_events = defaultdict(asyncio.Event)
+        self.files = {}                       # file_path -> bytes для getFile/скачивания
+
+    # --- сервер Bot API ---
+
+    def _message(self, chat_id: int, text: str = "", message_id=None) -> dict:
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        }
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls[method] += 1
+
+        result = True
+        if method == "getMe":
+            result = BOT_USER
+        elif method in ("sendMessage", "editMessageText", "sendDocument", "sendPhoto"):
+            chat_id = int(params.get("chat_id", 0))
+            text = params.get("text") or params.get("caption") or ""
+            result = self._message(chat_id, text, params.get("message_id"))
+            if text.startswith(PROGRESS_MARK):
+                # Заглушка «идёт анализ» — шаг ещё не закончен
+                self.progress[chat_id].append(text)
+            else:
+                self.replies[chat_id].append(text)
+                self._reply_events[chat_id].set()
+        elif method == "getFile":
+            file_id = params.get("file_id")
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_path": f"photos/{file_id}.jpg",
+                      "file_size": len(self.files.get(file_id, b""))}
+        elif method == "getWebhookInfo":
+            result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["path"].rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        return web.Response(body=self.files.get(file_id, b""))
+
+    async def handle_ingredient_page(self, request: web.Request) -> web.Response:
+        # Подмена EXTERNAL_LOOKUP_URL: внешний справочник ничего не знает
+        self.calls["ingredient_page"] += 1
+        return web.Response(status=404)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/ingredient/{slug}", self.handle_ingredient_page)
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.handle_file)
+        return app
+
+    # --- синтетические апдейты ---
+
+    def message_update(self, chat_id: int, text: str = None, photo_id: str = None, media_group_id: str = None,
+                       photo_sizes: list = None) -> dict:
+        """photo_sizes — [(file_id, width, height), ...] от меньшего к большему, как в Telegram."""
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+        }
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        if photo_id is not None:
+            photo_sizes = [(photo_id, 1280, 960)]
+        if photo_sizes:
+            message["photo"] = [
+                {"file_id": file_id, "file_unique_id": file_id, "width": width, "height": height}
+                for file_id, width, height in photo_sizes
+            ]
+        if media_group_id is not None:
+            message["media_group_id"] = media_group_id
+        return {"update_id": next(self._update_ids), "message": message}
+
+    def callback_update(self, chat_id: int, data: str) -> dict:
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._message_ids)),
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+                "message": self._message(chat_id, "..."),
+                "chat_instance": str(chat_id),
+                "data": data,
+            },
+        }
+
+    def add_photo(self, file_id: str, sizes: dict) -> list:
+        """Регистрирует фото в нескольких размерах {длинная сторона: JPEG}; возвращает photo_sizes."""
+        photo_sizes = []
+        for side, data in sorted(sizes.items()):
+            size_id = f"{file_id}_{side}"
+            self.files[size_id] = data
+            photo_sizes.append((size_id, side, side * 3 // 4))
+        return photo_sizes
+
+    def album_updates(self, chat_id: int, album: list) -> list:
+        """Апдейты альбома: по одному на фото с общим media_group_id."""
+        media_group_id = f"album{next(self._message_ids)}"
+        return [self.message_update(chat_id, photo_sizes=photo_sizes, media_group_id=media_group_id)
+                for photo_sizes in album]
+
+    def conversation(self, chat_id: int, ingredients: str = DEFAULT_INGREDIENTS, photo_sizes: list = None,
+                     album: list = None) -> list:
+        """Полный сценарий: /start -> категория -> тип -> цель -> состав (текстом, фото или альбомом).
+
+        album — список photo_sizes; его фото уходят подряд, ответ на них ожидается один.
+        """
+        if album:
+            last = lambda: self.album_updates(chat_id, album)
+        elif photo_sizes:
+            last = lambda: self.message_update(chat_id, photo_sizes=photo_sizes)
+        else:
+            last = lambda: self.message_update(chat_id, ingredients)
+        return [
+            lambda: self.message_update(chat_id, "/start"),
+            lambda: self.callback_update(chat_id, "cat:hair"),
+            lambda: self.callback_update(chat_id, "sub:Шампунь"),
+            lambda: self.message_update(chat_id, "увлажнить сухие кончики"),
+            last,
+        ]
+
+    async def wait_reply(self, chat_id: int, count: int, timeout: float) -> bool:
+        """Ждёт, пока у чата наберётся count ответов бота."""
+        deadline = time.monotonic() + timeout
+        while len(self.replies[chat_id]) < count:
+            event = self._reply_events[chat_id]
+            event.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def run_dialog(self, deliver, chat_id: int, ingredients: str = DEFAULT_INGREDIENTS,
+                         photo_sizes: list = None, timeout: float = 30, album: list = None) -> list:
+        """Прогоняет сценарий для одного чата; deliver(update) передаёт апдейт боту.
+
+        Возвращает задержки шагов (секунды, None — нет ответа).
+        """
+        latencies = []
+        for make_update in self.conversation(chat_id, ingredients, photo_sizes, album):
+            expected = len(self.replies[chat_id]) + 1
+            started = time.perf_counter()
+            updates = make_update()
+            for update in updates if isinstance(updates, list) else [updates]:
+                await deliver(update)
+            ok = await self.wait_reply(chat_id, expected, timeout)
+            latencies.append(time.perf_counter() - started if ok else None)
+            if not ok:
+                break
+        return latencies
+
+    async def run_conversation(self, session: aiohttp.ClientSession, webhook_url: str, chat_id: int,
+                               ingredients: str = DEFAULT_INGREDIENTS, timeout: float = 30) -> list:
+        """run_dialog через webhook бота."""
+        async def deliver(update: dict):
+            async with session.post(webhook_url, json=update) as response:
+                response.raise_for_status()
+
+        return await self.run_dialog(deliver, chat_id, ingredients, timeout=timeout)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--webhook", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--chats", type=int, default=10, help="сколько чатов одновременно")
+    parser.add_argument("--wait", type=float, default=0, help="секунд подождать запуска бота перед апдейтами")
+    parser.add_argument("--serve-only", action="store_true", help="только сервер Bot API, без апдейтов")
+    args = parser.parse_args()
+
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fake Bot API: http://{args.host}:{args.port}/bot")
+
+    try:
+        if args.serve_only:
+            await asyncio.Event().wait()
+        await asyncio.sleep(args.wait)
+        async with aiohttp.ClientSession() as session:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                api.run_conversation(session, args.webhook, 10_000 + i) for i in range(args.chats)
+            ))
+            elapsed = time.perf_counter() - started
+        completed = sum(1 for r in results if len(r) == 5 and None not in r)
+        print(f"Диалогов завершено: {completed}/{args.chats} за {elapsed:.2f} с")
+        print("Вызовы Bot API:", json.dumps(dict(api.calls), ensure_ascii=False))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
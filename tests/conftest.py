@@ -0,0 +1,32 @@
+"""Общие фикстуры тестов: Redis подменяется на fakeredis (Lua-скрипты — через lupa)."""
+import fakeredis
+import pytest
+
+from utils import cache, limits, persistence, redis_client
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch, redis_server):
+    """Клиент fakeredis вместо общего пула во всех модулях, которые ходят в Redis.
+
+    redis_server.connected = False имитирует падение Redis.
+    """
+    client = fakeredis.FakeAsyncRedis(server=redis_server)
+    for module in (cache, limits, persistence):
+        monkeypatch.setattr(module, "get_redis", lambda: client)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def reset_redis_state(monkeypatch):
+    monkeypatch.setattr(redis_client, "_down_until", 0.0)
+    # Зарегистрированный скрипт и запасные счётчики — глобальные на процесс
+    monkeypatch.setattr(limits, "_quota_script", None)
+    monkeypatch.setattr(limits, "_local_day", None)
+    monkeypatch.setattr(limits, "_local_counts", {})
+    monkeypatch.setattr(limits, "_local_subscribers", set())
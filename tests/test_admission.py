@@ -0,0 +1,164 @@
+"""AdmissionController: порядок очереди по приоритету, лимит на пользователя, дедлайны."""
+import asyncio
+
+import pytest
+
+from utils.admission import (
+    PRIORITY_PHOTO, PRIORITY_REGULAR, PRIORITY_SUBSCRIBER, AdmissionController, AdmissionRejected,
+)
+
+
+def fixed(priority: int):
+    async def compute() -> int:
+        return priority
+    return compute
+
+
+async def not_expected() -> int:
+    raise AssertionError("приоритет не нужен, если место свободно")
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class Runner:
+    """Запускает анализы, которые держат место, пока тест их не отпустит."""
+
+    def __init__(self, admission: AdmissionController):
+        self.admission = admission
+        self.order = []
+        self.release = {}
+
+    def start(self, name: str, user_id: int, priority: int, deadline: float = None) -> asyncio.Task:
+        self.release[name] = asyncio.Event()
+
+        async def run():
+            async with self.admission.admit(user_id, fixed(priority), deadline):
+                self.order.append(name)
+                await self.release[name].wait()
+
+        return asyncio.create_task(run())
+
+
+def test_free_slot_skips_priority():
+    async def scenario():
+        admission = AdmissionController(max_active=2, per_user=1)
+        async with admission.admit(1, not_expected):
+            assert admission.active == 1
+        assert admission.active == 0
+        assert admission.stats["admitted"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_queue_order_by_priority_then_arrival():
+    async def scenario():
+        admission = AdmissionController(max_active=1, per_user=1, deadline=5)
+        runner = Runner(admission)
+        tasks = [runner.start("first", 1, PRIORITY_REGULAR)]
+        await settle()
+        tasks.append(runner.start("photo", 2, PRIORITY_REGULAR + PRIORITY_PHOTO))
+        tasks.append(runner.start("text", 3, PRIORITY_REGULAR))
+        tasks.append(runner.start("subscriber", 4, PRIORITY_SUBSCRIBER))
+        tasks.append(runner.start("text2", 5, PRIORITY_REGULAR))
+        await settle()
+        assert admission.queued == 4
+        for name in ("first", "subscriber", "text", "text2", "photo"):
+            await settle()
+            assert runner.order[-1] == name
+            runner.release[name].set()
+        await asyncio.gather(*tasks)
+        assert admission.active == 0 and admission.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_user_limit_lets_other_users_pass():
+    async def scenario():
+        admission = AdmissionController(max_active=2, per_user=1, deadline=5)
+        runner = Runner(admission)
+        tasks = [runner.start("a1", 1, PRIORITY_SUBSCRIBER)]
+        await settle()
+        # Второй запрос того же пользователя ждёт, хотя место есть; другой пользователь проходит
+        tasks.append(runner.start("a2", 1, PRIORITY_SUBSCRIBER))
+        tasks.append(runner.start("b1", 2, PRIORITY_REGULAR))
+        await settle()
+        assert runner.order == ["a1", "b1"]
+        assert admission.queued == 1
+        runner.release["a1"].set()
+        await settle()
+        assert runner.order == ["a1", "b1", "a2"]
+        runner.release["b1"].set()
+        runner.release["a2"].set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+
+def test_deadline_rejects_and_leaves_queue():
+    async def scenario():
+        admission = AdmissionController(max_active=1, per_user=1, deadline=5)
+        runner = Runner(admission)
+        holder = runner.start("holder", 1, PRIORITY_REGULAR)
+        await settle()
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(2, fixed(PRIORITY_REGULAR), deadline=0.01)
+        assert admission.queued == 0
+        assert admission.stats["rejected"] == 1
+        runner.release["holder"].set()
+        await holder
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        admission = AdmissionController(max_active=1, per_user=1, max_queue=1, deadline=5)
+        runner = Runner(admission)
+        tasks = [runner.start("holder", 1, PRIORITY_REGULAR), runner.start("queued", 2, PRIORITY_REGULAR)]
+        await settle()
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(3, not_expected)
+        runner.release["holder"].set()
+        runner.release["queued"].set()
+        await asyncio.gather(*tasks)
+        assert runner.order == ["holder", "queued"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_passes_slot_on():
+    async def scenario():
+        admission = AdmissionController(max_active=1, per_user=1, deadline=5)
+        runner = Runner(admission)
+        holder = runner.start("holder", 1, PRIORITY_REGULAR)
+        await settle()
+        gone = runner.start("gone", 2, PRIORITY_SUBSCRIBER)
+        waiting = runner.start("waiting", 3, PRIORITY_REGULAR)
+        await settle()
+        gone.cancel()
+        await settle()
+        assert admission.queued == 1
+        runner.release["holder"].set()
+        await settle()
+        assert runner.order == ["holder", "waiting"]
+        runner.release["waiting"].set()
+        await asyncio.gather(holder, waiting)
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_released_on_error():
+    async def scenario():
+        admission = AdmissionController(max_active=1, per_user=1)
+        with pytest.raises(RuntimeError):
+            async with admission.admit(1, not_expected):
+                raise RuntimeError("OCR упал")
+        assert admission.active == 0
+        assert admission._per_user == {}
+
+    asyncio.run(scenario())
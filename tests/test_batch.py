@@ -0,0 +1,87 @@
+"""batch.py: прерванный прогон продолжается с чекпоинта с тем же результатом."""
+import csv
+import sys
+
+import pytest
+
+import batch
+
+COMPOSITIONS = [
+    "Aqua, Glycerin, Niacinamide",
+    "Aqua, Alcohol Denat., Parfum",
+    "Aqua, Sodium Laureth Sulfate, Cocamidopropyl Betaine",
+    "",
+    "Aqua, Urea, Panthenol, Xyzzyl Foo",
+    "Glycerin, Dimethicone",
+    "Aqua, Salicylic Acid",
+    "Aqua, Panthenol",
+    "Aqua, Glycerin, Ceramide NP",
+    "Aqua, Niacinamide, Zinc PCA",
+]
+INTERRUPT_AFTER = 5
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    path = tmp_path / "catalogue.csv"
+    with path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "ingredients"])
+        for number, ingredients in enumerate(COMPOSITIONS):
+            writer.writerow([f"sku-{number}", ingredients])
+    return path
+
+
+def run_batch(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["batch.py", *map(str, argv), "--workers", "1", "--chunk-size", "2",
+                                      "--checkpoint-every", "1", "--goal", "сухая кожа"])
+    batch.main()
+
+
+def interrupting(read_records):
+    """Как Ctrl+C посреди чтения входа."""
+    def read(path, fmt):
+        for number, record in enumerate(read_records(path, fmt)):
+            if number == INTERRUPT_AFTER:
+                raise KeyboardInterrupt()
+            yield record
+    return read
+
+
+def test_interrupt_then_resume(monkeypatch, catalogue, tmp_path):
+    expected = tmp_path / "expected.csv"
+    run_batch(monkeypatch, catalogue, expected)
+
+    output = tmp_path / "scores.csv"
+    with monkeypatch.context() as patch:
+        patch.setattr(batch, "read_records", interrupting(batch.read_records))
+        with pytest.raises(SystemExit) as exit_info:
+            run_batch(monkeypatch, catalogue, output)
+    assert exit_info.value.code == 130
+    checkpoint = batch.Checkpoint(output)
+    assert checkpoint.load()
+    assert 0 < checkpoint.records < len(COMPOSITIONS)
+    assert output.stat().st_size == checkpoint.output_bytes
+
+    # Хвост, записанный после чекпоинта (процесс убили между записью и сохранением), отбрасывается
+    with output.open("ab") as f:
+        f.write(b"sku-x,1,,,,,,\n")
+    run_batch(monkeypatch, catalogue, output, "--resume")
+
+    assert output.read_text(encoding="utf-8") == expected.read_text(encoding="utf-8")
+    assert not checkpoint.path.exists()
+    rows = list(csv.DictReader(output.open(encoding="utf-8")))
+    assert [row["id"] for row in rows] == [f"sku-{number}" for number in range(len(COMPOSITIONS))]
+    assert rows[3]["error"] == "no ingredients"
+    # Неизвестный компонент — только в своём столбце, не среди спорных
+    assert rows[4]["unknown"] == "XYZZYL_FOO"
+    assert "XYZZYL_FOO" not in rows[4]["risky"]
+
+
+def test_resume_without_checkpoint_keeps_output(monkeypatch, catalogue, tmp_path):
+    output = tmp_path / "scores.jsonl"
+    output.write_text('{"id": "done"}\n', encoding="utf-8")
+    with pytest.raises(SystemExit) as exit_info:
+        run_batch(monkeypatch, catalogue, output, "--resume")
+    assert exit_info.value.code == 2
+    assert output.read_text(encoding="utf-8") == '{"id": "done"}\n'
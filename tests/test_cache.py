@@ -0,0 +1,83 @@
+"""LocalTTLCache и TieredCache: LRU, истечение записей, уровни кэша, работа без Redis."""
+import asyncio
+
+import pytest
+
+from utils import cache
+from utils.cache import LocalTTLCache, TieredCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def test_local_cache_expires(clock):
+    local = LocalTTLCache(maxsize=4, ttl=10)
+    local.set("a", 1)
+    local.set("b", 2, ttl=30)
+    clock.now += 11
+    assert local.get("a") is None
+    assert local.get("b") == 2
+    assert len(local) == 1
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalTTLCache(maxsize=2, ttl=60)
+    local.set("a", 1)
+    local.set("b", 2)
+    local.get("a")
+    local.set("c", 3)
+    assert local.get("b") is None
+    assert local.get("a") == 1
+    assert local.get("c") == 3
+
+
+def test_tiered_cache_levels(fake_redis):
+    tiered = TieredCache("test_levels", ttl=100)
+
+    async def scenario():
+        await tiered.set("k", {"v": 1})
+        assert await tiered.get("k") == {"v": 1}
+        # Другой процесс: локальный уровень пуст, значение берётся из Redis
+        tiered.local.clear()
+        assert await tiered.get("k") == {"v": 1}
+        assert await tiered.get("k") == {"v": 1}
+        assert await tiered.get("absent") is None
+        return await fake_redis.ttl("test_levels:k")
+
+    ttl = asyncio.run(scenario())
+    assert 0 < ttl <= 100
+    assert tiered.stats == {"local_hits": 2, "redis_hits": 1, "misses": 1}
+    assert tiered.hit_ratio() == 0.75
+
+
+def test_tiered_cache_per_key_ttl(fake_redis):
+    tiered = TieredCache("test_ttl", ttl=100)
+
+    async def scenario():
+        await tiered.set("short", 1, ttl=5)
+        return await fake_redis.ttl("test_ttl:short")
+
+    assert 0 < asyncio.run(scenario()) <= 5
+
+
+def test_tiered_cache_works_without_redis(fake_redis, redis_server):
+    redis_server.connected = False
+    tiered = TieredCache("test_down", ttl=100)
+
+    async def scenario():
+        await tiered.set("k", [1, 2])
+        return await tiered.get("k"), await tiered.get("absent")
+
+    assert asyncio.run(scenario()) == ([1, 2], None)
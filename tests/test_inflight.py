@@ -0,0 +1,98 @@
+"""InFlight: одна отменяемая задача на чат, Preempted против отмены самого обработчика."""
+import asyncio
+
+import pytest
+
+from utils.inflight import InFlight, Preempted
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def work(started: list, name: str, done: asyncio.Event = None):
+    started.append(name)
+    if done is not None:
+        await done.wait()
+    return name
+
+
+def test_run_returns_result_and_forgets_key():
+    async def scenario():
+        inflight = InFlight()
+        assert await inflight.run(1, work([], "report")) == "report"
+        assert len(inflight) == 0
+        assert not inflight.cancel(1)
+
+    asyncio.run(scenario())
+
+
+def test_cancel_raises_preempted_in_runner():
+    async def scenario():
+        inflight = InFlight()
+        started = []
+        runner = asyncio.create_task(inflight.run(1, work(started, "slow", asyncio.Event())))
+        await settle()
+        assert started == ["slow"] and len(inflight) == 1
+        assert inflight.cancel(1)
+        with pytest.raises(Preempted):
+            await runner
+        assert len(inflight) == 0
+        assert not inflight._preempted
+
+    asyncio.run(scenario())
+
+
+def test_new_run_preempts_previous_for_same_key():
+    async def scenario():
+        inflight = InFlight()
+        started = []
+        old = asyncio.create_task(inflight.run(1, work(started, "old", asyncio.Event())))
+        other_chat = asyncio.create_task(inflight.run(2, work(started, "other", asyncio.Event())))
+        await settle()
+        new_done = asyncio.Event()
+        new = asyncio.create_task(inflight.run(1, work(started, "new", new_done)))
+        with pytest.raises(Preempted):
+            await old
+        await settle()
+        # Завершение старого run() не снимает с учёта новую задачу того же чата
+        assert len(inflight) == 2
+        new_done.set()
+        assert await new == "new"
+        assert not other_chat.done()
+        other_chat.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await other_chat
+
+    asyncio.run(scenario())
+
+
+def test_handler_cancellation_is_not_preemption():
+    async def scenario():
+        inflight = InFlight()
+        started = []
+        runner = asyncio.create_task(inflight.run(1, work(started, "slow", asyncio.Event())))
+        await settle()
+        task = inflight._tasks[1]
+        # Остановка бота отменяет сам обработчик: это CancelledError, а не Preempted
+        runner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+        assert task.cancelled()
+        assert len(inflight) == 0
+
+    asyncio.run(scenario())
+
+
+def test_errors_propagate():
+    async def failing():
+        raise ValueError("OCR")
+
+    async def scenario():
+        inflight = InFlight()
+        with pytest.raises(ValueError):
+            await inflight.run(1, failing())
+        assert len(inflight) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,132 @@
+"""IngredientStore: ленивое открытие снапшота, горячая подмена версии и слой overlay."""
+import json
+import os
+
+import pytest
+
+from data.buid_db import db_version, write_snapshot
+from utils.ingredients_store import IngredientStore, JsonSnapshot, SqliteSnapshot
+
+WATER = {"name_ru": "Вода", "function": "растворитель", "notes": "", "good_for": [], "bad_for": [], "risk_level": "low"}
+UREA = {"name_ru": "Мочевина", "function": "увлажнитель", "notes": "", "good_for": ["сухая кожа"], "bad_for": [], "risk_level": "low"}
+ALCOHOL = {"name_ru": "Спирт", "function": "растворитель", "notes": "", "good_for": [], "bad_for": ["сухая кожа"], "risk_level": "medium"}
+
+
+def rewrite(path, db: dict):
+    """Новый снапшот с гарантированно другим mtime: os.stat может не заметить подмену в ту же наносекунду."""
+    write_snapshot(db, path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = tmp_path / "ingredients_db.sqlite"
+    write_snapshot({"AQUA": WATER, "UREA": UREA}, path)
+    return path
+
+
+@pytest.fixture
+def store(snapshot_path, tmp_path):
+    store = IngredientStore(snapshot_path, tmp_path / "missing.json")
+    yield store
+    store.snapshot.close()
+
+
+def test_snapshot_opens_lazily(store):
+    assert store._snapshot is None
+    assert "AQUA" in store
+    assert isinstance(store._snapshot, SqliteSnapshot)
+
+
+def test_snapshot_reads_rows(snapshot_path):
+    snapshot = SqliteSnapshot(snapshot_path)
+    try:
+        assert snapshot.version == db_version({"AQUA": WATER, "UREA": UREA})
+        assert snapshot["UREA"] == UREA
+        assert "UREA" in snapshot and "ALCOHOL" not in snapshot
+        assert sorted(snapshot) == ["AQUA", "UREA"]
+        with pytest.raises(KeyError):
+            snapshot["ALCOHOL"]
+    finally:
+        snapshot.close()
+
+
+def test_json_fallback_without_snapshot(tmp_path):
+    json_path = tmp_path / "ingredients_db.json"
+    json_path.write_text(json.dumps({"AQUA": WATER}), encoding="utf-8")
+    store = IngredientStore(tmp_path / "missing.sqlite", json_path)
+    assert isinstance(store.snapshot, JsonSnapshot)
+    assert store["AQUA"] == WATER
+    assert store.version.startswith("json-")
+    # Снапшота нет — подменять нечего
+    assert not store.reload_if_changed()
+
+
+def test_reload_before_first_use_is_noop(store, snapshot_path):
+    rewrite(snapshot_path, {"AQUA": WATER})
+    assert not store.reload_if_changed()
+    assert store._snapshot is None
+
+
+def test_reload_swaps_snapshot_and_notifies(store, snapshot_path):
+    calls = []
+    store.on_reload(lambda: calls.append(store.version))
+    old = store.snapshot
+    assert not store.reload_if_changed()
+
+    rewrite(snapshot_path, {"AQUA": WATER, "ALCOHOL": ALCOHOL})
+    assert store.reload_if_changed()
+    assert store.snapshot is not old
+    assert "ALCOHOL" in store and "UREA" not in store
+    assert calls == [db_version({"AQUA": WATER, "ALCOHOL": ALCOHOL})]
+    # Файл не менялся — повторная проверка ничего не делает
+    assert not store.reload_if_changed()
+    assert calls == [store.version]
+
+
+def test_same_version_is_not_reloaded(store, snapshot_path):
+    calls = []
+    store.on_reload(lambda: calls.append(1))
+    old = store.snapshot
+    rewrite(snapshot_path, {"AQUA": WATER, "UREA": UREA})
+    assert not store.reload_if_changed()
+    assert store.snapshot is old
+    assert calls == []
+
+
+def test_broken_snapshot_keeps_old_one(store, snapshot_path):
+    old = store.snapshot
+    # Как и buid_db.py, подменяем файл целиком: старое соединение держит прежний inode
+    broken = snapshot_path.with_name("broken.sqlite")
+    broken.write_bytes(b"not a database")
+    os.replace(broken, snapshot_path)
+    assert not store.reload_if_changed()
+    assert store.snapshot is old
+    assert store["UREA"] == UREA
+
+
+def test_overlay_adds_missing_entries(store):
+    assert store.setdefault("AQUA", ALCOHOL) == WATER
+    assert store.setdefault("ALCOHOL", ALCOHOL) == ALCOHOL
+    assert store["ALCOHOL"] == ALCOHOL
+    assert sorted(store) == ["ALCOHOL", "AQUA", "UREA"]
+    assert len(store) == 3
+
+
+def test_overlay_survives_reload(store, snapshot_path):
+    store.setdefault("CUSTOM", ALCOHOL)
+    rewrite(snapshot_path, {"AQUA": WATER})
+    assert store.reload_if_changed()
+    assert store["CUSTOM"] == ALCOHOL
+    assert sorted(store) == ["AQUA", "CUSTOM"]
+
+
+def test_snapshot_wins_over_overlay_after_reload(store, snapshot_path):
+    # Запись из внешнего источника, которая потом попала в саму базу
+    store.setdefault("ALCOHOL", {**ALCOHOL, "notes": "из внешнего источника"})
+    rewrite(snapshot_path, {"AQUA": WATER, "ALCOHOL": ALCOHOL})
+    assert store.reload_if_changed()
+    assert store["ALCOHOL"] == ALCOHOL
+    assert list(store).count("ALCOHOL") == 1
+    assert len(store) == 2
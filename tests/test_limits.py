@@ -0,0 +1,85 @@
+"""Квоты: атомарный Lua-скрипт в Redis и запасные счётчики процесса при его недоступности."""
+import asyncio
+from datetime import date
+
+from utils import limits
+from utils.limits import DAILY_LIMIT, QUOTA_TTL
+
+USER = 42
+
+
+def test_limit_is_charged_up_to_daily_limit(fake_redis):
+    async def scenario():
+        results = [await limits.increment_count(USER) for _ in range(DAILY_LIMIT + 2)]
+        return results, await limits.get_daily_count(USER), await limits.is_limit_exceeded(USER)
+
+    results, count, exceeded = asyncio.run(scenario())
+    assert results == [True] * DAILY_LIMIT + [False, False]
+    # Отказ не трогает счётчик
+    assert count == DAILY_LIMIT
+    assert exceeded
+
+
+def test_check_does_not_consume(fake_redis):
+    async def scenario():
+        for _ in range(3):
+            assert not await limits.is_limit_exceeded(USER)
+        return await limits.get_daily_count(USER)
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_counter_expires(fake_redis):
+    async def scenario():
+        await limits.increment_count(USER)
+        return await fake_redis.ttl(f"limit:{USER}:{date.today()}")
+
+    assert 0 < asyncio.run(scenario()) <= QUOTA_TTL
+
+
+def test_concurrent_increments_do_not_overshoot(fake_redis):
+    async def scenario():
+        return await asyncio.gather(*(limits.increment_count(USER) for _ in range(20)))
+
+    assert sum(asyncio.run(scenario())) == DAILY_LIMIT
+
+
+def test_subscriber_is_not_limited(fake_redis):
+    async def scenario():
+        await limits.grant_subscription(USER)
+        results = [await limits.increment_count(USER) for _ in range(DAILY_LIMIT + 3)]
+        return results, await limits.get_daily_count(USER)
+
+    results, count = asyncio.run(scenario())
+    assert all(results)
+    assert count == 0
+
+
+def test_external_quota_is_separate(fake_redis):
+    async def scenario():
+        for _ in range(DAILY_LIMIT):
+            await limits.increment_count(USER)
+        return await limits.increment_external_lookup_count(USER), await limits.get_external_lookup_count(USER)
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+def test_fallback_keeps_limiting_when_redis_is_down(fake_redis, redis_server):
+    redis_server.connected = False
+
+    async def scenario():
+        return [await limits.increment_count(USER) for _ in range(DAILY_LIMIT + 1)]
+
+    assert asyncio.run(scenario()) == [True] * DAILY_LIMIT + [False]
+
+
+def test_fallback_remembers_subscribers(fake_redis, redis_server):
+    async def scenario():
+        await limits.grant_subscription(USER)
+        assert await limits.has_subscription(USER)
+        redis_server.connected = False
+        return [await limits.increment_count(USER) for _ in range(DAILY_LIMIT + 1)], await limits.has_subscription(USER)
+
+    results, subscribed = asyncio.run(scenario())
+    assert all(results)
+    assert subscribed
@@ -0,0 +1,170 @@
+"""Внешний поиск ингредиентов против локального сервера-заглушки: single-flight,
+отрицательный кэш, ограничение параллельности и списание квоты."""
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from config import EXTERNAL_LOOKUP_CONCURRENCY, EXTERNAL_LOOKUP_NEGATIVE_TTL, EXTERNAL_LOOKUP_TTL
+from utils import limits, lookup
+
+USER = 7
+
+PAGE = '<h1>{name}</h1><div class="description">A humectant.</div>'
+
+
+class StubINCI:
+    """Страницы ингредиентов: missing-* — 404, broken-* — 500, остальные — 200 после delay."""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.hits = Counter()
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        slug = request.match_info["slug"]
+        self.hits[slug] += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if slug.startswith("missing"):
+            return web.Response(status=404)
+        if slug.startswith("broken"):
+            return web.Response(status=500)
+        return web.Response(text=PAGE.format(name=slug), content_type="text/html")
+
+
+@asynccontextmanager
+async def stub_server(stub: StubINCI):
+    app = web.Application()
+    app.router.add_get("/ingredient/{slug}", stub.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    lookup.EXTERNAL_LOOKUP_URL = f"http://127.0.0.1:{port}/ingredient/{{slug}}"
+    try:
+        yield stub
+    finally:
+        await lookup.close_lookup_client()
+        await runner.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def isolated_lookup(monkeypatch, fake_redis):
+    monkeypatch.setattr(lookup, "EXTERNAL_LOOKUP_URL", lookup.EXTERNAL_LOOKUP_URL)
+    monkeypatch.setattr(lookup, "_client", None)
+    monkeypatch.setattr(lookup, "_semaphore", None)
+    monkeypatch.setattr(lookup, "_inflight", {})
+    lookup.lookup_cache.local.clear()
+    yield
+    lookup.lookup_cache.local.clear()
+
+
+def run(scenario):
+    stub = StubINCI()
+
+    async def main():
+        async with stub_server(stub):
+            return await scenario()
+
+    return stub, asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_fetch():
+    async def scenario():
+        results = await asyncio.gather(*(lookup.fetch_ingredient_from_external("niacinamide", USER) for _ in range(10)))
+        return results, await limits.get_external_lookup_count(USER)
+
+    stub, (results, charged) = run(scenario)
+    assert stub.hits["niacinamide"] == 1
+    assert all(result == results[0] for result in results)
+    assert results[0]["name_ru"] == "niacinamide"
+    assert charged == 1
+
+
+def test_found_result_is_cached(fake_redis):
+    async def scenario():
+        first = await lookup.fetch_ingredient_from_external("panthenol", USER)
+        second = await lookup.fetch_ingredient_from_external("panthenol", USER)
+        return first, second, await fake_redis.ttl("inci:panthenol")
+
+    stub, (first, second, ttl) = run(scenario)
+    assert first == second
+    assert stub.hits["panthenol"] == 1
+    assert EXTERNAL_LOOKUP_NEGATIVE_TTL < ttl <= EXTERNAL_LOOKUP_TTL
+
+
+def test_not_found_is_cached_for_negative_ttl(fake_redis):
+    async def scenario():
+        results = [await lookup.fetch_ingredient_from_external("missing-x", USER) for _ in range(3)]
+        return results, await fake_redis.ttl("inci:missing-x")
+
+    stub, (results, ttl) = run(scenario)
+    assert results == [None, None, None]
+    assert stub.hits["missing-x"] == 1
+    assert 0 < ttl <= EXTERNAL_LOOKUP_NEGATIVE_TTL
+
+
+def test_not_found_is_asked_again_after_negative_ttl(monkeypatch):
+    monkeypatch.setattr(lookup, "EXTERNAL_LOOKUP_NEGATIVE_TTL", 1)
+
+    async def scenario():
+        await lookup.fetch_ingredient_from_external("missing-y", USER)
+        await lookup.fetch_ingredient_from_external("missing-y", USER)
+        await asyncio.sleep(1.1)
+        await lookup.fetch_ingredient_from_external("missing-y", USER)
+
+    stub, _ = run(scenario)
+    assert stub.hits["missing-y"] == 2
+
+
+def test_server_error_is_not_cached():
+    async def scenario():
+        return [await lookup.fetch_ingredient_from_external("broken-x", USER) for _ in range(2)]
+
+    stub, results = run(scenario)
+    assert results == [None, None]
+    assert stub.hits["broken-x"] == 2
+
+
+def test_concurrency_is_bounded():
+    names = [f"ingredient-{i}" for i in range(EXTERNAL_LOOKUP_CONCURRENCY * 3)]
+
+    async def scenario():
+        return await asyncio.gather(*(lookup.fetch_ingredient_from_external(name, i) for i, name in enumerate(names)))
+
+    stub, results = run(scenario)
+    assert all(results)
+    assert stub.max_active == EXTERNAL_LOOKUP_CONCURRENCY
+
+
+def test_quota_is_charged_only_for_parsed_pages():
+    async def scenario():
+        await lookup.fetch_ingredient_from_external("broken-z", USER)
+        await lookup.fetch_ingredient_from_external("missing-z", USER)
+        failed = await limits.get_external_lookup_count(USER)
+        await lookup.fetch_ingredient_from_external("glycerin", USER)
+        return failed, await limits.get_external_lookup_count(USER)
+
+    _, (failed, succeeded) = run(scenario)
+    assert failed == 0
+    assert succeeded == 1
+
+
+def test_exhausted_quota_skips_the_request():
+    async def scenario():
+        for _ in range(limits.EXTERNAL_LOOKUP_LIMIT):
+            await limits.increment_external_lookup_count(USER)
+        return await lookup.fetch_ingredient_from_external("squalane", USER)
+
+    stub, result = run(scenario)
+    assert result is None
+    assert stub.hits["squalane"] == 0
@@ -0,0 +1,116 @@
+"""MediaGroupCollector: один анализ на альбом, окно тишины, лимит фото и память об альбоме."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils import media_group
+from utils.media_group import MediaGroupCollector
+
+
+def photo(message_id: int, group: str = "album", chat_id: int = 1):
+    return SimpleNamespace(chat_id=chat_id, message_id=message_id, media_group_id=group)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(media_group.time, "monotonic", clock)
+    return clock
+
+
+def test_single_photo_is_its_own_group():
+    collector = MediaGroupCollector()
+    message = photo(1, group=None)
+    assert collector.claim(message)
+    assert collector.claim(message)
+    assert message not in collector
+    assert asyncio.run(collector.collect(message)) == [message]
+    assert len(collector) == 0
+
+
+def test_first_update_claims_album():
+    collector = MediaGroupCollector()
+    first, second, third = photo(1), photo(2), photo(3)
+    collector.add(second)
+    assert collector.claim(first)
+    assert not collector.claim(second)
+    assert not collector.claim(third)
+    assert third in collector
+    # Другой чат с тем же media_group_id — отдельный альбом
+    assert collector.claim(photo(1, chat_id=2))
+
+
+def test_collect_waits_for_quiet_window_and_sorts():
+    async def scenario():
+        collector = MediaGroupCollector(window=0.05, max_wait=2)
+        first = photo(10)
+        collector.claim(first)
+        collecting = asyncio.create_task(collector.collect(first))
+        for message_id in (12, 11):
+            await asyncio.sleep(0.03)
+            # Фото продолжают приходить — окно тишины сдвигается
+            assert not collecting.done()
+            collector.add(photo(message_id))
+        return [m.message_id for m in await collecting]
+
+    assert asyncio.run(scenario()) == [10, 11, 12]
+
+
+def test_collect_stops_at_max_wait():
+    async def scenario():
+        collector = MediaGroupCollector(window=0.05, max_wait=0.12)
+        first = photo(1)
+        collector.claim(first)
+
+        async def keep_sending():
+            # Фото приходят чаще окна тишины — дольше max_wait
+            for message_id in range(2, 30):
+                collector.add(photo(message_id))
+                await asyncio.sleep(0.02)
+
+        sender = asyncio.create_task(keep_sending())
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        collected = await collector.collect(first)
+        elapsed = loop.time() - started
+        still_sending = not sender.done()
+        sender.cancel()
+        return elapsed, still_sending, len(collected)
+
+    elapsed, still_sending, collected = asyncio.run(scenario())
+    assert 0.11 <= elapsed < 0.3
+    assert still_sending
+    assert 1 < collected <= 10
+
+
+def test_collect_returns_as_soon_as_album_is_full():
+    async def scenario():
+        collector = MediaGroupCollector(window=5, max_wait=5, max_photos=3)
+        messages = [photo(i) for i in (1, 2, 3, 4)]
+        collector.claim(messages[0])
+        for message in messages[1:]:
+            collector.add(message)
+        return await asyncio.wait_for(collector.collect(messages[0]), 1)
+
+    assert [m.message_id for m in asyncio.run(scenario())] == [1, 2, 3]
+
+
+def test_late_photo_does_not_start_second_analysis(clock):
+    collector = MediaGroupCollector()
+    assert collector.claim(photo(1))
+    clock.now += media_group.GROUP_TTL - 1
+    assert not collector.claim(photo(2))
+    # Альбом забыт по GROUP_TTL от первого фото
+    clock.now += 2
+    collector.add(photo(3, group="other"))
+    assert photo(1) not in collector
+    assert collector.claim(photo(4))
@@ -0,0 +1,138 @@
+"""OCRPool: очередь считается до конца работы воркера; таймаут tesserocr."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import ocr_pool
+from utils.ocr_backends import TesserocrBackend
+from utils.ocr_pool import OCRPool, OCRQueueFull, OCRTimeout
+
+
+class StuckOCR:
+    """Вместо extract_text_from_photo: висит, пока тест не отпустит."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def __call__(self, photo_bytes: bytes, timeout: float = 0) -> str:
+        self.release.wait(5)
+        return photo_bytes.decode()
+
+
+@pytest.fixture
+def stuck(monkeypatch):
+    stuck = StuckOCR()
+    monkeypatch.setattr(ocr_pool, "extract_text_from_photo", stuck)
+    yield stuck
+    stuck.release.set()
+
+
+def make_pool(workers: int = 1, queue_limit: int = 0, timeout: float = 0.05) -> OCRPool:
+    pool = OCRPool(workers=workers, queue_limit=queue_limit, timeout=timeout, backend="subprocess")
+    # Потоки вместо процессов: подменённая функция видна воркеру
+    pool._executor = ThreadPoolExecutor(max_workers=workers)
+    return pool
+
+
+async def wait_depth(pool: OCRPool, depth: int):
+    for _ in range(200):
+        if pool.depth == depth:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"depth {pool.depth} != {depth}")
+
+
+def test_completed_request_frees_slot(stuck):
+    async def scenario():
+        pool = make_pool(timeout=1)
+        task = asyncio.create_task(pool.extract_text(b"AQUA"))
+        await wait_depth(pool, 1)
+        stuck.release.set()
+        assert await task == "AQUA"
+        await wait_depth(pool, 0)
+        pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_request_keeps_slot_until_worker_finishes(stuck):
+    async def scenario():
+        pool = make_pool()
+        with pytest.raises(OCRTimeout):
+            await pool.extract_text(b"AQUA")
+        # Ответ уже отдан, но воркер всё ещё занят этим фото
+        assert pool.depth == 1
+        with pytest.raises(OCRQueueFull):
+            await pool.extract_text(b"UREA")
+
+        stuck.release.set()
+        await wait_depth(pool, 0)
+        stuck.release.clear()
+        with pytest.raises(OCRTimeout):
+            await pool.extract_text(b"UREA")
+        stuck.release.set()
+        await wait_depth(pool, 0)
+        pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_queued_request_frees_slot(stuck):
+    async def scenario():
+        pool = make_pool(queue_limit=1, timeout=1)
+        running = asyncio.create_task(pool.extract_text(b"AQUA"))
+        queued = asyncio.create_task(pool.extract_text(b"UREA"))
+        await wait_depth(pool, 2)
+        # Задача ещё в очереди пула: отмена снимает её и сразу освобождает место
+        queued.cancel()
+        await wait_depth(pool, 1)
+        stuck.release.set()
+        assert await running == "AQUA"
+        await wait_depth(pool, 0)
+        pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+class FakeTessAPI:
+    def __init__(self, finished: bool):
+        self.finished = finished
+        self.timeouts = []
+        self.cleared = 0
+
+    def SetImage(self, image):
+        pass
+
+    def Recognize(self, timeout: int = 0) -> bool:
+        self.timeouts.append(timeout)
+        return self.finished
+
+    def GetUTF8Text(self) -> str:
+        return "AQUA, UREA"
+
+    def Clear(self):
+        self.cleared += 1
+
+
+def make_backend(api: FakeTessAPI) -> TesserocrBackend:
+    # Без tesserocr: конструктор обходим, движок — заглушка
+    backend = TesserocrBackend.__new__(TesserocrBackend)
+    backend._api = api
+    backend._lock = threading.Lock()
+    return backend
+
+
+def test_tesserocr_passes_timeout_in_ms():
+    api = FakeTessAPI(finished=True)
+    assert make_backend(api).image_to_string(None, timeout=2.5) == "AQUA, UREA"
+    assert api.timeouts == [2500]
+    assert api.cleared == 1
+
+
+def test_tesserocr_timeout_raises():
+    api = FakeTessAPI(finished=False)
+    with pytest.raises(RuntimeError):
+        make_backend(api).image_to_string(None, timeout=1)
+    assert api.cleared == 1
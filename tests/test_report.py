@@ -0,0 +1,38 @@
+"""format_report: разделы отчёта, неизвестные компоненты и отчёты из старого кэша."""
+from utils.analysis import analyze_composition
+from utils.report import SECTION_LIMIT, fill_goal, format_report
+
+
+def test_unknown_section_and_score():
+    report = analyze_composition(["Aqua", "Glycerin", "Xyzzyl Foo", "Xyzzyl Bar"], "сухая кожа", "", "Крем")
+    assert [entry[0] for entry in report["unknown"]] == ["Xyzzyl Foo", "Xyzzyl Bar"]
+    assert not any(entry[0].startswith("Xyzzyl") for entry in report["risky"])
+    # Неизвестные снижают оценку как спорные: два — минус балл
+    assert report["score"] == 10 - (len(report["risky"]) + 2) // 2 - 2 * len(report["bad"])
+
+    text = format_report(report, "Крем")
+    assert "Неизвестные компоненты" in text
+    assert "• *Xyzzyl Foo* — Нет данных в базе" in text
+
+
+def test_report_without_unknown_key():
+    # Запись кэша до появления раздела unknown: неизвестные лежат среди спорных
+    report = {
+        "good": [["AQUA", "Вода", "Растворитель"]],
+        "risky": [["Xyzzyl Foo", "Xyzzyl Foo (неизвестно)", "Нет данных в базе"]],
+        "bad": [],
+        "score": 10,
+        "recommendations": ["Проверьте первые 5 компонентов."],
+    }
+    text = format_report(report, "Крем")
+    assert "Xyzzyl Foo (неизвестно)" in text
+    assert "Неизвестные компоненты" not in text
+
+
+def test_long_sections_are_cut():
+    entries = [[f"KEY_{i}", f"Компонент {i}", "заметка"] for i in range(SECTION_LIMIT + 3)]
+    report = {"good": entries, "risky": [], "bad": [], "unknown": [], "score": 9, "recommendations": []}
+    text = fill_goal(format_report(report, "Крем"), "сухая кожа")
+    assert "Компонент 4" in text and "Компонент 5" not in text
+    assert "и ещё 3" in text
+    assert "*Ваша цель:* сухая кожа" in text
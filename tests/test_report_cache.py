@@ -0,0 +1,102 @@
+"""Кэш отчётов: отпечаток состава и общая запись текста и данных анализа."""
+import asyncio
+
+import pytest
+
+from utils import report_cache
+from utils.analysis import analyze_composition
+from utils.ingredients_store import INGREDIENTS_DB
+from utils.report_cache import cache_report, composition_fingerprint, get_cached_report, get_report_data
+from utils.scoring import classify_goal
+
+COMPOSITION = ["Aqua", "Glycerin", "Niacinamide", "Alcohol Denat."]
+GOAL = "сухая кожа лица"
+
+
+def fingerprint(ingredients=COMPOSITION, category="Уход за кожей", subtype="Крем", goal=GOAL) -> str:
+    return composition_fingerprint(ingredients, category, subtype, goal)
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    report_cache.report_cache.local.clear()
+    yield
+    report_cache.report_cache.local.clear()
+
+
+def test_spellings_of_same_keys_share_fingerprint():
+    # OCR-опечатка и синоним дают те же ключи базы
+    assert fingerprint(["Eau", "GLYCREIN", "Niacinamide", "Alcohol Denat."]) == fingerprint()
+
+
+def test_fingerprint_depends_on_order_and_product():
+    base = fingerprint()
+    assert fingerprint(COMPOSITION[::-1]) != base
+    assert fingerprint(subtype="Шампунь") != base
+    assert fingerprint(category="Уход за волосами") != base
+
+
+def test_fingerprint_uses_goal_class_not_text():
+    assert classify_goal("сухая кожа, шелушится") == classify_goal(GOAL)
+    assert fingerprint(goal="сухая кожа, шелушится") == fingerprint()
+    assert fingerprint(goal="чувствительная кожа") != fingerprint()
+    assert fingerprint(goal="просто увлажнить") == fingerprint(goal="матовый эффект")
+
+
+def test_unknown_ingredients_enter_as_is():
+    assert fingerprint(COMPOSITION + ["Xyzzyl Foo"]) != fingerprint(COMPOSITION + ["Xyzzyl Bar"])
+
+
+def test_db_version_changes_fingerprint(monkeypatch):
+    base = fingerprint()
+    monkeypatch.setattr(type(INGREDIENTS_DB), "version", property(lambda self: "next"))
+    assert fingerprint() != base
+
+
+def test_text_and_data_stored_together(fake_redis):
+    report = analyze_composition(COMPOSITION, GOAL, "Уход за кожей", "Крем")
+    key = fingerprint()
+
+    async def scenario():
+        assert await get_cached_report(key) is None
+        await cache_report(key, "отчёт", report, "Крем", GOAL)
+        # Второй процесс: локального уровня нет, запись приходит из Redis
+        report_cache.report_cache.local.clear()
+        text, data = await get_cached_report(key), await get_report_data(key)
+        ttl = await fake_redis.ttl(f"report:{key}")
+        return text, data, ttl
+
+    text, data, ttl = asyncio.run(scenario())
+    assert text == "отчёт"
+    assert data["subtype"] == "Крем"
+    assert data["goal_mask"] == classify_goal(GOAL)
+    # Через JSON кортежи становятся списками
+    assert data["report"]["score"] == report["score"]
+    assert data["report"]["good"] == [list(entry) for entry in report["good"]]
+    assert 0 < ttl <= report_cache.REPORT_CACHE_TTL
+
+
+def test_old_text_only_entries_are_a_miss(fake_redis):
+    key = fingerprint()
+
+    async def scenario():
+        await report_cache.report_cache.set(key, "отчёт старого формата")
+        return await get_cached_report(key), await get_report_data(key)
+
+    assert asyncio.run(scenario()) == (None, None)
+
+
+def test_stats_count_hits(fake_redis):
+    key = fingerprint()
+    before = dict(report_cache.report_cache.stats)
+
+    async def scenario():
+        await get_cached_report(key)
+        await cache_report(key, "отчёт", {"good": [], "risky": [], "bad": [], "score": 10, "recommendations": []}, "Крем", GOAL)
+        await get_cached_report(key)
+
+    asyncio.run(scenario())
+    stats = report_cache.report_cache_stats()
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["local_hits"] - before["local_hits"] == 1
+    assert stats["local_size"] == 1
@@ -0,0 +1,135 @@
+"""Отчёт файлом: разобранный шаблон, HTML и PNG, кэш готовых файлов и одна отрисовка на отпечаток."""
+import asyncio
+import io
+import string
+
+import pytest
+from PIL import Image
+
+from utils import report_cache, report_render
+from utils.report_cache import cache_report
+from utils.report_render import CompiledTemplate, get_report_file, render_html, render_png
+from utils.scoring import GOAL_BITS
+
+REPORT = {
+    "good": [["AQUA", "Вода", "Растворитель"], ["GLYCERIN", "Глицерин", "Увлажнитель"]],
+    "risky": [["PARFUM", "Отдушка", "Может <раздражать> & сушить"]],
+    "bad": [],
+    "unknown": [["Xyzzyl Foo", "Xyzzyl Foo", "Нет данных в базе"]],
+    "score": 8,
+    "recommendations": ["Обращайте внимание на первые 5 компонентов."],
+}
+DATA = {"subtype": "Крем", "goal_mask": GOAL_BITS["сухая"], "report": REPORT}
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    for cache in (report_render.report_files, report_cache.report_cache):
+        cache.local.clear()
+    report_render._inflight.clear()
+    yield
+    for cache in (report_render.report_files, report_cache.report_cache):
+        cache.local.clear()
+
+
+def test_compiled_template_matches_string_template():
+    source = "Цена: $$5, ${name} и $name, конец $tail"
+    values = {"name": "глицерин", "tail": "."}
+    template = CompiledTemplate(source)
+    assert template.fields == ["name", "name", "tail"]
+    assert template.render(values) == string.Template(source).substitute(values)
+
+
+def test_compiled_template_rejects_bad_placeholder():
+    with pytest.raises(ValueError):
+        CompiledTemplate("оценка $ из 10")
+
+
+def test_html_escapes_and_lists_sections():
+    page = render_html(DATA).decode("utf-8")
+    assert "Может &lt;раздражать&gt; &amp; сушить" in page
+    assert "Подходящие компоненты (2)" in page
+    assert "Неизвестные компоненты (1)" in page
+    # Пустой раздел не выводится
+    assert "Нежелательные" not in page
+    assert "С учётом особенностей: сухая" in page
+    assert 'class="score score-high"' in page
+    assert "$" not in page
+
+
+def test_html_renders_data_cached_before_unknown_section():
+    old = {**DATA, "report": {k: v for k, v in REPORT.items() if k != "unknown"}}
+    page = render_html(old).decode("utf-8")
+    assert "Неизвестные компоненты" not in page
+    assert "Подходящие компоненты (2)" in page
+
+
+def test_png_grows_with_report():
+    short = Image.open(io.BytesIO(render_png(DATA)))
+    longer = {**DATA, "report": {**REPORT, "bad": [["ALCOHOL_DENAT", "Спирт", "Сушит кожу " * 20]] * 5}}
+    long = Image.open(io.BytesIO(render_png(longer)))
+    assert short.format == long.format == "PNG"
+    assert short.width == long.width == report_render.PNG_WIDTH
+    assert long.height > short.height
+
+
+@pytest.fixture
+def render_calls(monkeypatch):
+    calls = []
+
+    def fake_html(data: dict) -> bytes:
+        calls.append("html")
+        return f"<p>{data['subtype']}</p>".encode()
+
+    def fake_png(data: dict) -> bytes:
+        calls.append("png")
+        return b"\x89PNG\r\n\x1a\n\x00\xff"
+
+    monkeypatch.setitem(report_render.RENDERERS, "html", fake_html)
+    monkeypatch.setitem(report_render.RENDERERS, "png", fake_png)
+    return calls
+
+
+def test_missing_data_gives_none(fake_redis, render_calls):
+    assert asyncio.run(get_report_file("expired", "html")) is None
+    assert render_calls == []
+
+
+def test_concurrent_requests_share_one_render(fake_redis, render_calls):
+    async def scenario():
+        await cache_report("fp", "отчёт", REPORT, "Крем", "сухая кожа")
+        pages = await asyncio.gather(*(get_report_file("fp", "html") for _ in range(5)))
+        assert report_render._inflight == {}
+        return pages
+
+    assert asyncio.run(scenario()) == ["<p>Крем</p>".encode()] * 5
+    assert render_calls == ["html"]
+
+
+def test_rendered_file_comes_from_cache(fake_redis, render_calls):
+    async def scenario():
+        await cache_report("fp", "отчёт", REPORT, "Крем", "сухая кожа")
+        first = await get_report_file("fp", "png")
+        # Другой процесс: локального уровня нет, PNG приходит из Redis в base64
+        report_render.report_files.local.clear()
+        second = await get_report_file("fp", "png")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == b"\x89PNG\r\n\x1a\n\x00\xff"
+    assert render_calls == ["png"]
+
+
+def test_render_error_reaches_all_waiters(fake_redis, monkeypatch):
+    def broken(data: dict) -> bytes:
+        raise OSError("нет шрифта")
+
+    monkeypatch.setitem(report_render.RENDERERS, "png", broken)
+
+    async def scenario():
+        await cache_report("fp", "отчёт", REPORT, "Крем", "сухая кожа")
+        return await asyncio.gather(*(get_report_file("fp", "png") for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, OSError) for result in results)
+    assert report_render._inflight == {}
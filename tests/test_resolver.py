@@ -0,0 +1,112 @@
+"""Нечёткий поиск ингредиентов: ошибки OCR, опечатки, граница префикса и синонимы."""
+import pytest
+
+from utils.ingredients_store import INGREDIENTS_DB
+from utils.resolver import (
+    IngredientResolver, MAX_DISTANCE, MIN_CONFIDENCE, PREFIX_LENGTH, compact, get_resolver, load_aliases,
+)
+
+KEYS = [
+    "GLYCERIN", "NIACINAMIDE", "PANTHENOL", "PHENOXYETHANOL", "UREA",
+    "SODIUM_LAURETH_SULFATE", "SODIUM_LAURYL_SULFATE", "SODIUM_CHLORIDE",
+]
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return IngredientResolver(KEYS, {"GLYCEROL": "GLYCERIN"})
+
+
+@pytest.mark.parametrize("name, key", [
+    ("Glycerin", "GLYCERIN"),
+    ("Sodium Laureth-Sulfate", "SODIUM_LAURETH_SULFATE"),
+    ("SODIUMLAURETHSULFATE", "SODIUM_LAURETH_SULFATE"),
+    ("glycerol", "GLYCERIN"),
+])
+def test_exact_forms(resolver, name, key):
+    assert resolver.resolve(name) == (key, 1.0)
+
+
+@pytest.mark.parametrize("name, key", [
+    ("GLYCER1N", "GLYCERIN"),
+    ("S0DIUM CHL0RIDE", "SODIUM_CHLORIDE"),
+    ("Sodium Lauryl Sulphate", "SODIUM_LAURYL_SULFATE"),
+])
+def test_ocr_digits_and_spelling(resolver, name, key):
+    assert resolver.resolve(name) == (key, 0.95)
+
+
+@pytest.mark.parametrize("name, key", [
+    ("GLYCREIN", "GLYCERIN"),                   # перестановка соседних букв — одна ошибка
+    ("NIACINMAIDE", "NIACINAMIDE"),
+    ("PHENOXYETHANL", "PHENOXYETHANOL"),        # пропуск
+    ("NIACNAMDE", "NIACINAMIDE"),               # два пропуска
+    ("PHENOXYEHTANLO", "PHENOXYETHANOL"),        # две перестановки
+])
+def test_typos_within_distance(resolver, name, key):
+    match = resolver.resolve(name)
+    assert match is not None and match.key == key
+    assert MIN_CONFIDENCE <= match.confidence < 1.0
+
+
+@pytest.mark.parametrize("name", [
+    "NACNAMDE",      # три ошибки
+    "UREX",          # короткое название: опечатки не допускаются
+    "LACTOSE",
+])
+def test_too_far_is_unknown(resolver, name):
+    assert resolver.resolve(name) is None
+
+
+def test_transposition_is_one_edit_but_not_two_substitutions():
+    # Без учёта перестановок GLYCREIN был бы на расстоянии 2 и для 8 букв не прошёл бы порог
+    resolver = IngredientResolver(["GLYCERIN"])
+    assert resolver.resolve("GLYCREIN").confidence == 1 - 1 / 8
+
+
+@pytest.mark.parametrize("name", [
+    "SODIUM LAURETH SULFTAE",       # опечатка за префиксом: кандидат находится по целому префиксу
+    "SDIUM LAURETH SULFATE",        # опечатка в префиксе: кандидат находится по удалениям
+    "SOIDUM LAURETH SULFATE",
+])
+def test_typos_on_both_sides_of_prefix(resolver, name):
+    assert resolver.resolve(name).key == "SODIUM_LAURETH_SULFATE"
+
+
+def test_prefix_and_tail_errors_add_up(resolver):
+    # Две ошибки в префиксе и одна за ним — всего три, больше MAX_DISTANCE
+    assert resolver.resolve("SDIMU LAURETH SULFATE").key == "SODIUM_LAURETH_SULFATE"
+    assert resolver.resolve("SODIUM LAURETX SULFATE").key == "SODIUM_LAURETH_SULFATE"
+    assert resolver.resolve("SDIMU LAURETX SULFATE") is None
+
+
+def test_index_covers_only_prefix():
+    long_name = "CAPRYLIC_CAPRIC_TRIGLYCERIDE"
+    resolver = IngredientResolver([long_name])
+    window = compact(long_name)[:PREFIX_LENGTH + MAX_DISTANCE]
+    assert all(len(term) == PREFIX_LENGTH for term in resolver.deletes)
+    assert resolver.deletes.keys() == IngredientResolver([window]).deletes.keys()
+
+
+def test_shared_stem_does_not_share_buckets():
+    # Ключ из одной основы SODIUM собрал бы все названия на SODIUM в одну корзину
+    names = [f"SODIUM_{suffix}" for suffix in ("CHLORIDE", "CITRATE", "BENZOATE", "HYALURONATE", "LACTATE", "PCA")]
+    resolver = IngredientResolver(names)
+    assert "SODIUM" not in resolver.deletes
+    assert max(map(len, resolver.deletes.values())) < len(names)
+    assert resolver.resolve("SODUIM BENZAOTE").key == "SODIUM_BENZOATE"
+
+
+def test_run_on_duplicate_names(resolver):
+    assert resolver.resolve("GLYCERIN GLYCEROL") == ("GLYCERIN", 0.9)
+
+
+def test_aliases_file_resolves_to_db_keys():
+    aliases = load_aliases()
+    assert aliases
+    resolver = get_resolver()
+    for alias, key in aliases.items():
+        assert key in INGREDIENTS_DB.snapshot, alias
+        if compact(alias) in map(compact, INGREDIENTS_DB.snapshot):
+            continue  # синоним, который сам есть в базе, остаётся своим ключом
+        assert resolver.resolve(alias.replace("_", " ")) == (key, 1.0), alias
@@ -0,0 +1,169 @@
+"""Session, вытеснение простаивающих сессий и RedisPersistence: TTL и пакетная запись."""
+import asyncio
+import copy
+import json
+
+import pytest
+
+from utils import session as session_module
+from utils.persistence import RedisPersistence
+from utils.session import Session, evict_idle
+
+
+def make_session(**fields) -> Session:
+    session = Session()
+    for field, value in fields.items():
+        setattr(session, field, value)
+    return session
+
+
+class FakeApplication:
+    def __init__(self, sessions: dict):
+        self.user_data = sessions
+
+    def drop_user_data(self, user_id: int):
+        del self.user_data[user_id]
+
+
+def test_session_roundtrip():
+    session = make_session(category="Уход за кожей", subtype="Крем", goal="сухая кожа", ingredients_parsed=["AQUA"])
+    assert session.to_dict() == {"category": "Уход за кожей", "subtype": "Крем", "goal": "сухая кожа",
+                                 "ingredients_parsed": ["AQUA"]}
+    restored = Session.from_dict(session.to_dict())
+    assert restored.to_dict() == session.to_dict()
+    assert restored.loaded and restored.is_complete()
+    assert not Session().is_complete()
+
+
+def test_deepcopy_detaches_ingredients():
+    session = make_session(goal="сухая кожа", ingredients_parsed=["AQUA"])
+    copied = copy.deepcopy(session)
+    session.ingredients_parsed.append("UREA")
+    assert copied.ingredients_parsed == ["AQUA"]
+    assert copied.touched == session.touched
+
+
+def test_evict_idle(monkeypatch):
+    now = 10_000.0
+    monkeypatch.setattr(session_module.time, "time", lambda: now)
+    fresh, idle = Session(), Session()
+    idle.touched = now - 3601
+    fresh.touched = now - 10
+    app = FakeApplication({1: fresh, 2: idle})
+    assert evict_idle(app, ttl=3600) == 1
+    assert list(app.user_data) == [1]
+    assert evict_idle(app, ttl=3600) == 0
+
+
+@pytest.fixture
+def pipelines(fake_redis, monkeypatch):
+    """Сколько pipeline отправлено в Redis."""
+    sent = []
+    pipeline = fake_redis.pipeline
+
+    def counting_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def counting_execute(*a, **kw):
+            sent.append(len(pipe.command_stack))
+            return await execute(*a, **kw)
+
+        pipe.execute = counting_execute
+        return pipe
+
+    monkeypatch.setattr(fake_redis, "pipeline", counting_pipeline)
+    return sent
+
+
+def test_updates_of_one_cycle_share_pipeline(fake_redis, pipelines):
+    async def scenario():
+        persistence = RedisPersistence(ttl=600)
+        await persistence.update_user_data(1, make_session(goal="сухая кожа"))
+        await persistence.update_user_data(2, make_session(goal="жирная кожа"))
+        await persistence.update_conversation("main", (-100, 1), 3)
+        await persistence.flush()
+        return await fake_redis.get("ptb:session:1"), await fake_redis.ttl("ptb:session:2"), \
+            await fake_redis.ttl("ptb:conv:main:-100:1")
+
+    session_raw, session_ttl, conv_ttl = asyncio.run(scenario())
+    assert pipelines == [3]
+    assert json.loads(session_raw) == {"goal": "сухая кожа"}
+    assert 0 < session_ttl <= 600
+    assert 0 < conv_ttl <= 600
+
+
+def test_unchanged_session_is_not_rewritten(fake_redis, pipelines):
+    async def scenario():
+        persistence = RedisPersistence()
+        session = make_session(goal="сухая кожа")
+        await persistence.update_user_data(1, session)
+        await persistence.flush()
+        await persistence.update_user_data(1, session)
+        await persistence.flush()
+        session.subtype = "Крем"
+        await persistence.update_user_data(1, session)
+        await persistence.flush()
+        return await fake_redis.get("ptb:session:1")
+
+    raw = asyncio.run(scenario())
+    assert pipelines == [1, 1]
+    assert json.loads(raw) == {"subtype": "Крем", "goal": "сухая кожа"}
+
+
+def test_session_loads_lazily_once(fake_redis):
+    async def scenario():
+        # Так сессию записал бы прошлый процесс
+        previous = RedisPersistence()
+        await previous.update_user_data(7, make_session(category="Уход за волосами", goal="объём"))
+        await previous.flush()
+        persistence = RedisPersistence()
+        assert await persistence.get_user_data() == {}
+        session = Session()
+        await persistence.refresh_user_data(7, session)
+        first = session.to_dict()
+        # Дальше сессия живёт в памяти: Redis больше не читается
+        await fake_redis.set("ptb:session:7", json.dumps({"goal": "другое"}))
+        await persistence.refresh_user_data(7, session)
+        # Загруженная и не изменённая сессия не пишется обратно
+        await persistence.update_user_data(7, session)
+        return first, session.to_dict(), persistence._pending
+
+    first, second, pending = asyncio.run(scenario())
+    assert first == second == {"category": "Уход за волосами", "goal": "объём"}
+    assert pending == {}
+
+
+def test_conversations_roundtrip_and_drop(fake_redis):
+    async def scenario():
+        persistence = RedisPersistence()
+        await persistence.update_conversation("main", (-100, 5), 2)
+        await persistence.update_conversation("main", (42, 42), 1)
+        await persistence.update_user_data(5, make_session(goal="сухая кожа"))
+        await persistence.flush()
+        await persistence.update_conversation("main", (42, 42), None)
+        await persistence.drop_user_data(5)
+        await persistence.flush()
+        return await persistence.get_conversations("main"), await fake_redis.exists("ptb:session:5")
+
+    conversations, session_exists = asyncio.run(scenario())
+    assert conversations == {(-100, 5): 2}
+    assert not session_exists
+
+
+def test_redis_outage_keeps_bot_running(fake_redis, redis_server):
+    async def scenario():
+        persistence = RedisPersistence()
+        session = make_session(goal="сухая кожа")
+        redis_server.connected = False
+        await persistence.update_user_data(1, session)
+        await persistence.flush()
+        await persistence.refresh_user_data(2, Session())
+        assert await persistence.get_conversations("main") == {}
+        redis_server.connected = True
+        # Запись не удалась — та же сессия уйдёт при следующем цикле
+        await persistence.update_user_data(1, session)
+        await persistence.flush()
+        return await fake_redis.get("ptb:session:1")
+
+    assert json.loads(asyncio.run(scenario())) == {"goal": "сухая кожа"}
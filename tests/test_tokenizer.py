@@ -0,0 +1,35 @@
+"""Потоковый разбор (iter_ingredients) должен давать то же, что разбор целиком (tokenize).
+
+Запуск из корня репозитория: python -m pytest tests
+"""
+import pytest
+
+from benchmarks.corpus import load_corpus, noisy_corpus
+from utils.tokenizer import iter_ingredients, tokenize
+
+CHUNK_SIZES = (1, 3, 7, 16, 64)
+
+EDGE_CASES = [
+    "Aqua, 1,2-Hexanediol, Glycerin",
+    "Aqua; 1,2-Hexanediol; Caprylyl Glycol",
+    "Water, Glycerin, 1,2-Hexanediol",
+    "Ingredients: Aqua (Water), Glycerin. May contain (+/-): CI 77891, CI 19140",
+    "Aqua, Sodium Laureth-\nSulfate, Glycerin",
+    "AQUA GLYCERIN PANTHENOL, Parfum",
+    "Aqua, Cetearyl Alcohol (and) Ceteareth-20, Niacinamide, Tocopherol (Vitamin E",
+    "Состав: Aqua, Glycerin, Sodium Hyaluronate, Phenoxyethanol.",
+]
+
+
+def chunks(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", EDGE_CASES + load_corpus() + noisy_corpus())
+def test_chunked_matches_one_shot(text, size):
+    assert list(iter_ingredients(chunks(text, size))) == tokenize(text)
+
+
+def test_locant_is_one_ingredient():
+    assert "12HEXANEDIOL" in tokenize("Aqua, 1,2-Hexanediol, Glycerin")
@@ -0,0 +1,145 @@
+import asyncio
+import bisect
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import ADMISSION_MAX_ACTIVE, ADMISSION_PER_USER, ADMISSION_MAX_QUEUE, ADMISSION_DEADLINE
+from utils.metrics import register_gauge, timed
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше — раньше
+PRIORITY_SUBSCRIBER = 0
+PRIORITY_REGULAR = 2
+# Поправка внутри класса: текст дешевле фото, его выгоднее обслужить первым
+PRIORITY_PHOTO = 1
+
+
+class AdmissionRejected(Exception):
+    """Места не нашлось: очередь переполнена или истёк дедлайн ожидания."""
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "user_id", "future")
+
+    def __init__(self, priority: int, seq: int, user_id: int, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.user_id = user_id
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Допуск к тяжёлым этапам анализа (OCR, внешний поиск, разбор).
+
+    * не больше max_active анализов одновременно на процесс;
+    * не больше per_user одновременно у одного пользователя;
+    * остальные ждут в очереди по приоритету (подписчики первыми),
+      но не дольше deadline секунд — дальше AdmissionRejected, и
+      пользователь сразу получает ответ «занято», а не ждёт минуту;
+    * при очереди длиннее max_queue новые запросы отклоняются сразу.
+    Приоритет вычисляется, только если сразу пропустить нельзя: в
+    обычном режиме лишнего запроса в Redis за подпиской нет.
+    """
+
+    def __init__(self, max_active: int = ADMISSION_MAX_ACTIVE, per_user: int = ADMISSION_PER_USER,
+                 max_queue: int = ADMISSION_MAX_QUEUE, deadline: float = ADMISSION_DEADLINE):
+        self.max_active = max_active
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.active = 0
+        self._per_user: Dict[int, int] = {}
+        self._queue: List[_Waiter] = []     # отсортирована по (priority, seq)
+        self._seq = itertools.count()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _can_run(self, user_id: int) -> bool:
+        return self.active < self.max_active and self._per_user.get(user_id, 0) < self.per_user
+
+    def _take(self, user_id: int):
+        self.active += 1
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self.stats["admitted"] += 1
+
+    def _release(self, user_id: int):
+        self.active -= 1
+        left = self._per_user[user_id] - 1
+        if left:
+            self._per_user[user_id] = left
+        else:
+            del self._per_user[user_id]
+        self._wake()
+
+    def _wake(self):
+        # Первый по приоритету, чей пользователь не упёрся в свой лимит
+        i = 0
+        while i < len(self._queue) and self.active < self.max_active:
+            waiter = self._queue[i]
+            if waiter.future.done():
+                del self._queue[i]
+                continue
+            if self._per_user.get(waiter.user_id, 0) < self.per_user:
+                del self._queue[i]
+                self._take(waiter.user_id)
+                waiter.future.set_result(None)
+                continue
+            i += 1
+
+    async def acquire(self, user_id: int, priority: Callable[[], Awaitable[int]],
+                      deadline: Optional[float] = None):
+        # Свободно и очередь пуста — без ожидания и без вычисления приоритета
+        if not self._queue and self._can_run(user_id):
+            self._take(user_id)
+            return
+        if len(self._queue) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected()
+
+        waiter = _Waiter(await priority(), next(self._seq), user_id, asyncio.get_running_loop().create_future())
+        bisect.insort(self._queue, waiter)
+        self.stats["queued"] += 1
+        # Пока считали приоритет, место могло освободиться
+        self._wake()
+        try:
+            with timed("admission_wait"):
+                await asyncio.wait_for(asyncio.shield(waiter.future), deadline or self.deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Место выдали в тот же момент — возвращаем его следующему
+                self._release(user_id)
+            else:
+                waiter.future.cancel()
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.stats["rejected"] += 1
+            logger.info(f"Admission deadline for user {user_id} (active={self.active}, queued={self.queued})")
+            raise AdmissionRejected()
+
+    @asynccontextmanager
+    async def admit(self, user_id: int, priority: Callable[[], Awaitable[int]],
+                    deadline: Optional[float] = None):
+        """async with admission.admit(user_id, priority): ... — тяжёлая часть анализа."""
+        await self.acquire(user_id, priority, deadline)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+
+admission = AdmissionController()
+register_gauge("bot_admission_active", "analysis", lambda: admission.active)
+register_gauge("bot_queue_depth", "admission", lambda: admission.queued)
+for _stat in admission.stats:
+    register_gauge(f"bot_admission_{_stat}", "analysis", lambda stat=_stat: admission.stats[stat])
@@ -0,0 +1,102 @@
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Optional
+
+from redis.exceptions import RedisError
+from utils.metrics import register_gauge
+from utils.redis_client import get_redis, mark_redis_down
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTTLCache:
+    """LRU в памяти процесса с истечением записей по времени."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """Двухуровневый кэш: локальный LRU перед общим Redis.
+
+    Значения хранятся в Redis как JSON под ключом "<namespace>:<key>" с TTL.
+    Если Redis недоступен, работает только локальный уровень.
+    None не кэшируется — отрицательные результаты вызывающий код
+    хранит явным маркером.
+    """
+
+    def __init__(self, namespace: str, ttl: int, local_size: int = 1024, local_ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LocalTTLCache(local_size, local_ttl or ttl)
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+        for stat in self.stats:
+            register_gauge(f"bot_cache_{stat}", namespace, lambda stat=stat: self.stats[stat])
+        register_gauge("bot_cache_local_size", namespace, lambda: len(self.local))
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["local_hits"] += 1
+            return value
+
+        client = get_redis()
+        if client is not None:
+            try:
+                raw = await client.get(self._redis_key(key))
+            except RedisError as e:
+                mark_redis_down(e)
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                self.stats["redis_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = ttl or self.ttl
+        self.local.set(key, value, min(ttl, self.local.ttl))
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            await client.set(self._redis_key(key), json.dumps(value, ensure_ascii=False), ex=ttl)
+        except RedisError as e:
+            mark_redis_down(e)
+
+    def hit_ratio(self) -> float:
+        total = sum(self.stats.values())
+        return (self.stats["local_hits"] + self.stats["redis_hits"]) / total if total else 0.0
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from typing import Awaitable, Dict, Hashable
+
+from utils.metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+
+class Preempted(Exception):
+    """Работу отменил более новый апдейт того же чата (кнопка «Заново», новое фото)."""
+
+
+class InFlight:
+    """Отменяемые задачи по ключу (чату): не больше одной на ключ.
+
+    run() выполняет корутину отдельной задачей; cancel() из другого
+    обработчика снимает её, и run() поднимает Preempted — вызывающий
+    отличает это от отмены самого обработчика (остановка бота).
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._preempted = set()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def cancel(self, key: Hashable) -> bool:
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            return False
+        self._preempted.add(task)
+        task.cancel()
+        return True
+
+    async def run(self, key: Hashable, coro: Awaitable):
+        self.cancel(key)
+        task = asyncio.ensure_future(coro)
+        self._tasks[key] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task in self._preempted:
+                logger.info(f"In-flight work for {key} preempted")
+                raise Preempted() from None
+            raise
+        finally:
+            self._preempted.discard(task)
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+
+# Текущие анализы составов по chat_id
+analyses = InFlight()
+register_gauge("bot_in_flight", "analysis", lambda: len(analyses))
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+INGREDIENTS_DB_PATH = DATA_DIR / "ingredients_db.json"
+SNAPSHOT_PATH = DATA_DIR / "ingredients_db.sqlite"
+
+RELOAD_INTERVAL = 30      # секунд между проверками нового снапшота
+ROW_CACHE_SIZE = 4096     # сколько разобранных записей держать в памяти процесса
+MMAP_SIZE = 64 * 1024 * 1024
+
+
+class SqliteSnapshot(Mapping):
+    """Снапшот базы из data/ingredients_db.sqlite (собирается data/buid_db.py).
+
+    Файл открывается только на чтение и отображается в память (mmap),
+    поэтому все процессы бота делят одни и те же страницы ОС. Записи
+    разбираются из JSON по требованию и кэшируются в небольшом LRU.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self.version = meta["version"]
+        self._keys = None
+        self._rows = OrderedDict()
+
+    def _key_index(self) -> dict:
+        if self._keys is None:
+            self._keys = dict.fromkeys(k for (k,) in self._conn.execute("SELECT key FROM ingredients"))
+        return self._keys
+
+    def __getitem__(self, key: str) -> dict:
+        row = self._rows.get(key)
+        if row is not None:
+            self._rows.move_to_end(key)
+            return row
+        found = self._conn.execute("SELECT data FROM ingredients WHERE key = ?", (key,)).fetchone()
+        if found is None:
+            raise KeyError(key)
+        row = json.loads(found[0])
+        self._rows[key] = row
+        if len(self._rows) > ROW_CACHE_SIZE:
+            self._rows.popitem(last=False)
+        return row
+
+    def __contains__(self, key) -> bool:
+        if key in self._rows:
+            return True
+        if self._keys is not None:
+            return key in self._keys
+        return self._conn.execute("SELECT 1 FROM ingredients WHERE key = ?", (key,)).fetchone() is not None
+
+    def __iter__(self):
+        return iter(self._key_index())
+
+    def __len__(self) -> int:
+        return len(self._key_index())
+
+    def close(self):
+        self._conn.close()
+
+
+class JsonSnapshot(dict):
+    """Запасной вариант, если снапшот ещё не собран: весь JSON в память, как раньше."""
+
+    def __init__(self, path: Path):
+        with open(path, encoding="utf-8") as f:
+            raw = f.read()
+        super().__init__(json.loads(raw))
+        self.version = "json-" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    def close(self):
+        pass
+
+
+def _file_id(path: Path) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class IngredientStore(Mapping):
+    """База ингредиентов с ленивой загрузкой и горячей подменой снапшота.
+
+    Снапшот открывается при первом обращении. reload_if_changed()
+    проверяет файл и, если там новая версия, подменяет ссылку на снапшот
+    одним присваиванием: анализ синхронный, поэтому в event loop он
+    всегда видит целиком старую или целиком новую базу.
+
+    Записи, найденные во внешнем источнике, лежат в отдельном слое
+    overlay и переживают подмену снапшота.
+    """
+
+    def __init__(self, snapshot_path: Path = SNAPSHOT_PATH, json_path: Path = INGREDIENTS_DB_PATH):
+        self.snapshot_path = snapshot_path
+        self.json_path = json_path
+        self._snapshot = None
+        self._file_id = None
+        self._overlay = {}
+        self._listeners = []
+
+    def _open(self):
+        file_id = _file_id(self.snapshot_path)
+        if file_id is not None:
+            return SqliteSnapshot(self.snapshot_path), file_id
+        logger.warning(f"{self.snapshot_path.name} not found, loading {self.json_path.name} (run data/buid_db.py)")
+        return JsonSnapshot(self.json_path), None
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot, self._file_id = self._open()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    def on_reload(self, callback: Callable[[], None]):
+        """Колбэк для сброса производных структур (индексы, кэши) при смене версии."""
+        self._listeners.append(callback)
+
+    def reload_if_changed(self) -> bool:
+        if self._snapshot is None:
+            return False
+        file_id = _file_id(self.snapshot_path)
+        if file_id is None or file_id == self._file_id:
+            return False
+        try:
+            new_snapshot = SqliteSnapshot(self.snapshot_path)
+        except (sqlite3.Error, KeyError) as e:
+            logger.error(f"Failed to open new ingredients snapshot: {e}")
+            return False
+
+        self._file_id = file_id
+        if new_snapshot.version == self._snapshot.version:
+            new_snapshot.close()
+            return False
+
+        old_snapshot, self._snapshot = self._snapshot, new_snapshot
+        logger.info(f"Ingredients DB reloaded: {old_snapshot.version} -> {new_snapshot.version} ({len(new_snapshot)} entries)")
+        for callback in self._listeners:
+            callback()
+        old_snapshot.close()
+        return True
+
+    def __getitem__(self, key: str) -> dict:
+        try:
+            return self.snapshot[key]
+        except KeyError:
+            return self._overlay[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.snapshot or key in self._overlay
+
+    def __iter__(self):
+        yield from self.snapshot
+        yield from (k for k in self._overlay if k not in self.snapshot)
+
+    def __len__(self) -> int:
+        return len(self.snapshot) + sum(1 for k in self._overlay if k not in self.snapshot)
+
+    def setdefault(self, key: str, value: dict) -> dict:
+        """Добавляет запись в overlay (например, из внешнего источника), если её ещё нет."""
+        if key in self:
+            return self[key]
+        self._overlay[key] = value
+        return value
+
+
+INGREDIENTS_DB = IngredientStore()
+
+
+async def watch_ingredients_db(interval: float = RELOAD_INTERVAL):
+    """Фоновая задача: периодически проверяет, не собран ли новый снапшот."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            INGREDIENTS_DB.reload_if_changed()
+        except Exception as e:
+            logger.error(f"Ingredients DB reload check failed: {e}")
@@ -1,74 +1,137 @@
-import redis
 from datetime import date
-from config import REDIS_HOST, REDIS_PORT, REDIS_DB
+from redis.exceptions import RedisError
+from utils.metrics import timed
+from utils.redis_client import get_redis, mark_redis_down
 
 DAILY_LIMIT = 5
 EXTERNAL_LOOKUP_LIMIT = 10
+QUOTA_TTL = 86400  # 24h
 
-try:
-    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-    r.ping()  # Проверяем соединение
-    REDIS_AVAILABLE = True
-except redis.ConnectionError:
-    REDIS_AVAILABLE = False
-    print("Redis unavailable. Limits disabled.")
+# Проверка подписки, лимита и инкремент за один вызов на стороне Redis.
+# KEYS[1] — ключ подписки, KEYS[2] — счётчик за день
+# ARGV[1] — лимит, ARGV[2] — TTL счётчика, ARGV[3] — "1" списать запрос, "0" только проверить
+# Возвращает {разрешено (1/0), текущее значение счётчика (-1 для подписчиков)}
+QUOTA_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {1, -1}
+end
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+if current >= tonumber(ARGV[1]) then
+    return {0, current}
+end
+if ARGV[3] == '1' then
+    current = redis.call('INCR', KEYS[2])
+    if current == 1 then
+        redis.call('EXPIRE', KEYS[2], ARGV[2])
+    end
+end
+return {1, current}
+"""
 
-def get_daily_count(user_id: int) -> int:
-    if not REDIS_AVAILABLE:
-        return 0  # Без Redis считаем, что лимит не превышен
-    key = f"limit:{user_id}:{date.today()}"
-    return int(r.get(key) or 0)
+_quota_script = None
 
+# Запасные счётчики на случай недоступности Redis: лимиты продолжают действовать
+# в пределах процесса. Подписчики, которых мы уже видели в Redis, запоминаются.
+_local_day = None
+_local_counts = {}
+_local_subscribers = set()
 
-def has_subscription(user_id: int) -> bool:
-    if not REDIS_AVAILABLE:
-        return False
-    key = f"subscription:{user_id}"
-    return r.exists(key)
 
-def grant_subscription(user_id: int) -> bool:
-    if not REDIS_AVAILABLE:
-        return False
-    key = f"subscription:{user_id}"
-    r.set(key, 1)
-    return True
+def _get_script(client):
+    global _quota_script
+    if _quota_script is None:
+        _quota_script = client.register_script(QUOTA_SCRIPT)
+    return _quota_script
 
-def is_limit_exceeded(user_id: int) -> bool:
-    if not REDIS_AVAILABLE:
-        return False  # Без Redis разрешаем
-    if has_subscription(user_id):
-        return False
-    return get_daily_count(user_id) >= DAILY_LIMIT
-
-def get_external_lookup_count(user_id: int) -> int:
-    if not REDIS_AVAILABLE:
-        return 0
-    key = f"external:{user_id}:{date.today()}"
-    return int(r.get(key) or 0)
-
-def increment_external_lookup_count(user_id: int):
-    if not REDIS_AVAILABLE:
-        return
-    key = f"external:{user_id}:{date.today()}"
-    r.incr(key)
-    r.expire(key, 86400)  # 24h
-
-def is_external_lookup_limit_exceeded(user_id: int) -> bool:
-    if not REDIS_AVAILABLE:
+
+def _local_quota(user_id: int, key: str, limit: int, consume: bool) -> tuple:
+    global _local_day
+    today = date.today()
+    if _local_day != today:
+        _local_day = today
+        _local_counts.clear()
+    if user_id in _local_subscribers:
+        return True, -1
+    current = _local_counts.get(key, 0)
+    if current >= limit:
+        return False, current
+    if consume:
+        current += 1
+        _local_counts[key] = current
+    return True, current
+
+
+async def _quota(user_id: int, prefix: str, limit: int, consume: bool) -> tuple:
+    """Один атомарный вызов: (разрешено, значение счётчика)."""
+    key = f"{prefix}:{user_id}:{date.today()}"
+    client = get_redis()
+    if client is not None:
+        try:
+            with timed("redis_quota"):
+                allowed, current = await _get_script(client)(
+                    keys=[f"subscription:{user_id}", key],
+                    args=[limit, QUOTA_TTL, "1" if consume else "0"],
+                )
+            if current == -1:
+                _local_subscribers.add(user_id)
+            return bool(allowed), int(current)
+        except RedisError as e:
+            mark_redis_down(e)
+    return _local_quota(user_id, key, limit, consume)
+
+
+async def get_daily_count(user_id: int) -> int:
+    _, current = await _quota(user_id, "limit", DAILY_LIMIT, consume=False)
+    return max(current, 0)
+
+
+async def has_subscription(user_id: int) -> bool:
+    client = get_redis()
+    if client is not None:
+        try:
+            if await client.exists(f"subscription:{user_id}"):
+                _local_subscribers.add(user_id)
+                return True
+            return False
+        except RedisError as e:
+            mark_redis_down(e)
+    return user_id in _local_subscribers
+
+
+async def grant_subscription(user_id: int) -> bool:
+    client = get_redis()
+    if client is None:
         return False
-    if has_subscription(user_id):
+    try:
+        await client.set(f"subscription:{user_id}", 1)
+    except RedisError as e:
+        mark_redis_down(e)
         return False
-    return get_external_lookup_count(user_id) >= EXTERNAL_LOOKUP_LIMIT
-
-def increment_count(user_id: int) -> bool:
-    if not REDIS_AVAILABLE:
-        return True  # Позволяем продолжать
-    if has_subscription(user_id):
-        return True
-    key = f"limit:{user_id}:{date.today()}"
-    pipe = r.pipeline()
-    current = pipe.get(key)
-    pipe.incr(key)
-    pipe.expire(key, 86400)  # 24h
-    pipe.execute()
-    return get_daily_count(user_id) <= 5
\ No newline at end of file
+    _local_subscribers.add(user_id)
+    return True
+
+
+async def is_limit_exceeded(user_id: int) -> bool:
+    allowed, _ = await _quota(user_id, "limit", DAILY_LIMIT, consume=False)
+    return not allowed
+
+
+async def increment_count(user_id: int) -> bool:
+    """Атомарно списывает запрос. False — лимит уже исчерпан, счётчик не тронут."""
+    allowed, _ = await _quota(user_id, "limit", DAILY_LIMIT, consume=True)
+    return allowed
+
+
+async def get_external_lookup_count(user_id: int) -> int:
+    _, current = await _quota(user_id, "external", EXTERNAL_LOOKUP_LIMIT, consume=False)
+    return max(current, 0)
+
+
+async def is_external_lookup_limit_exceeded(user_id: int) -> bool:
+    allowed, _ = await _quota(user_id, "external", EXTERNAL_LOOKUP_LIMIT, consume=False)
+    return not allowed
+
+
+async def increment_external_lookup_count(user_id: int) -> bool:
+    allowed, _ = await _quota(user_id, "external", EXTERNAL_LOOKUP_LIMIT, consume=True)
+    return allowed
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+from bs4 import BeautifulSoup
+
+from config import (
+    EXTERNAL_LOOKUP_URL, EXTERNAL_LOOKUP_TIMEOUT, EXTERNAL_LOOKUP_CONCURRENCY,
+    EXTERNAL_LOOKUP_TTL, EXTERNAL_LOOKUP_NEGATIVE_TTL, EXTERNAL_LOOKUP_MAX_PER_REQUEST,
+)
+from utils.analysis import INGREDIENTS_DB, resolve_key
+from utils.cache import TieredCache
+from utils.limits import increment_external_lookup_count, is_external_lookup_limit_exceeded
+from utils.metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Маркер «во внешнем источнике такого нет» — кэшируется на EXTERNAL_LOOKUP_NEGATIVE_TTL
+NOT_FOUND = {"not_found": True}
+
+lookup_cache = TieredCache("inci", ttl=EXTERNAL_LOOKUP_TTL)
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+# Single-flight: ключ -> future первого запроса, остальные ждут его результат
+_inflight = {}
+register_gauge("bot_queue_depth", "external_lookup", lambda: len(_inflight))
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Общий клиент с keep-alive пулом на весь процесс."""
+    global _client, _semaphore
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=EXTERNAL_LOOKUP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=EXTERNAL_LOOKUP_CONCURRENCY,
+                max_keepalive_connections=EXTERNAL_LOOKUP_CONCURRENCY,
+            ),
+            follow_redirects=True,
+        )
+        _semaphore = asyncio.Semaphore(EXTERNAL_LOOKUP_CONCURRENCY)
+    return _client
+
+
+def parse_ingredient_page(html: str, ingredient_name: str) -> dict:
+    """Простой парсинг страницы INCI decoder: название, описание, оценка риска."""
+    soup = BeautifulSoup(html, 'html.parser')
+    name = soup.find('h1').text.strip() if soup.find('h1') else ingredient_name
+    description = soup.find('div', class_='description').text if soup.find('div', class_='description') else "No description"
+    # Простая оценка риска на основе ключевых слов
+    risk_level = "low"
+    if any(word in description.lower() for word in ["irritant", "allergen", "toxic"]):
+        risk_level = "high"
+    return {
+        "name_ru": name,  # Assume English, but can add translation
+        "function": "",
+        "risk_level": risk_level,
+        "good_for": [],
+        "bad_for": ["чувствительная кожа"] if risk_level == "high" else [],
+        "notes": description.strip()[:200],  # Limit length
+    }
+
+
+async def _fetch(ingredient_name: str, user_id: int) -> dict:
+    """Один сетевой запрос. Возвращает данные или NOT_FOUND.
+
+    Квота списывается только за успешно разобранный ответ: таймауты,
+    ошибки сервера и «не найдено» пользователю ничего не стоят.
+    """
+    if await is_external_lookup_limit_exceeded(user_id):
+        raise LookupError("external lookup limit exceeded")
+
+    client = _get_client()
+    url = EXTERNAL_LOOKUP_URL.format(slug=ingredient_name.replace('_', '-').lower())
+    async with _semaphore:
+        response = await client.get(url)
+    if response.status_code == 404:
+        return NOT_FOUND
+    response.raise_for_status()
+    # bs4 — чистый Python, разбор большой страницы не должен держать event loop
+    data = await asyncio.to_thread(parse_ingredient_page, response.text, ingredient_name)
+    await increment_external_lookup_count(user_id)
+    return data
+
+
+async def _lookup(ingredient_name: str, user_id: int) -> Optional[dict]:
+    cached = await lookup_cache.get(ingredient_name)
+    if cached is not None:
+        return None if cached == NOT_FOUND else cached
+
+    try:
+        data = await _fetch(ingredient_name, user_id)
+    except LookupError:
+        return None  # лимит пользователя — не кэшируем, другой пользователь может спросить
+    except (httpx.HTTPError, AttributeError) as e:
+        logger.error(f"Error fetching ingredient {ingredient_name}: {e}")
+        return None  # временная ошибка — не кэшируем
+
+    ttl = EXTERNAL_LOOKUP_NEGATIVE_TTL if data == NOT_FOUND else EXTERNAL_LOOKUP_TTL
+    await lookup_cache.set(ingredient_name, data, ttl=ttl)
+    return None if data == NOT_FOUND else data
+
+
+async def fetch_ingredient_from_external(ingredient_name: str, user_id: int) -> Optional[dict]:
+    """Ищет ингредиент во внешнем источнике: кэш -> single-flight -> сеть.
+
+    Одновременные запросы одного и того же ингредиента от разных
+    пользователей превращаются в один HTTP-запрос.
+    """
+    future = _inflight.get(ingredient_name)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[ingredient_name] = future
+    try:
+        result = await _lookup(ingredient_name, user_id)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Исключение уже получил вызывающий; ждущие получат его сами
+        future.exception()
+        raise
+    finally:
+        del _inflight[ingredient_name]
+
+
+async def enrich_unknown_ingredients(ingredients: list, user_id: int) -> int:
+    """Подтягивает неизвестные ингредиенты из внешнего источника в INGREDIENTS_DB.
+
+    Найденные записи добавляются в память по одной, без перезаписи JSON-файла.
+    Возвращает число добавленных ингредиентов.
+    """
+    unknown = list(dict.fromkeys(ing for ing in ingredients if resolve_key(ing) is None))
+    unknown = unknown[:EXTERNAL_LOOKUP_MAX_PER_REQUEST]
+    if not unknown:
+        return 0
+
+    results = await asyncio.gather(
+        *(fetch_ingredient_from_external(ing, user_id) for ing in unknown),
+        return_exceptions=True,
+    )
+    added = 0
+    for ing, data in zip(unknown, results):
+        if isinstance(data, dict):
+            INGREDIENTS_DB.setdefault(ing, data)
+            added += 1
+    return added
+
+
+async def close_lookup_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
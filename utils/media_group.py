@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from config import MEDIA_GROUP_WINDOW, MEDIA_GROUP_MAX_WAIT, MEDIA_GROUP_MAX_PHOTOS
+from utils.metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Сколько помним альбом после первого фото: опоздавшие фото не запускают второй анализ
+GROUP_TTL = 60
+
+
+class _Group:
+    __slots__ = ("messages", "created", "updated", "claimed")
+
+    def __init__(self):
+        self.messages: Dict[int, object] = {}    # message_id -> Message
+        self.created = self.updated = time.monotonic()
+        self.claimed = False
+
+
+class MediaGroupCollector:
+    """Собирает фото одного альбома (media_group_id) в один запрос.
+
+    Telegram присылает каждое фото альбома отдельным апдейтом. add()
+    регистрирует фото сразу при получении апдейта — раньше, чем он
+    дождётся очереди своего чата (см. PerChatUpdateProcessor). Первый
+    дошедший до обработчика апдейт забирает альбом (claim), а collect()
+    ждёт, пока фото перестанут приходить (window секунд тишины, но не
+    дольше max_wait), и возвращает их по порядку.
+    """
+
+    def __init__(self, window: float = MEDIA_GROUP_WINDOW, max_wait: float = MEDIA_GROUP_MAX_WAIT,
+                 max_photos: int = MEDIA_GROUP_MAX_PHOTOS):
+        self.window = window
+        self.max_wait = max_wait
+        self.max_photos = max_photos
+        self._groups: Dict[tuple, _Group] = {}
+
+    def __len__(self):
+        return len(self._groups)
+
+    @staticmethod
+    def _key(message) -> tuple:
+        return message.chat_id, message.media_group_id
+
+    def _purge(self):
+        deadline = time.monotonic() - GROUP_TTL
+        for key in [key for key, group in self._groups.items() if group.created < deadline]:
+            del self._groups[key]
+
+    def __contains__(self, message) -> bool:
+        return message.media_group_id is not None and self._key(message) in self._groups
+
+    def add(self, message):
+        if message.media_group_id is None:
+            return
+        self._purge()
+        group = self._groups.get(self._key(message))
+        if group is None:
+            group = self._groups[self._key(message)] = _Group()
+        if len(group.messages) < self.max_photos:
+            group.messages[message.message_id] = message
+        group.updated = time.monotonic()
+
+    def claim(self, message) -> bool:
+        """True, если этот апдейт обрабатывает альбом (или это одиночное фото).
+
+        Первый дошедший до обработчика апдейт альбома забирает его,
+        остальным фото альбома — False: их разберут вместе с первым.
+        """
+        if message.media_group_id is None:
+            return True
+        self.add(message)
+        group = self._groups[self._key(message)]
+        if group.claimed:
+            return False
+        group.claimed = True
+        return True
+
+    async def collect(self, message) -> List[object]:
+        """Ждёт, пока фото альбома перестанут приходить, и отдаёт их по порядку."""
+        group = self._groups.get(self._key(message)) if message.media_group_id is not None else None
+        if group is None:
+            return [message]
+        started = time.monotonic()
+        while True:
+            now = time.monotonic()
+            quiet_left = group.updated + self.window - now
+            wait_left = started + self.max_wait - now
+            if quiet_left <= 0 or wait_left <= 0 or len(group.messages) >= self.max_photos:
+                break
+            await asyncio.sleep(min(quiet_left, wait_left))
+        return [group.messages[message_id] for message_id in sorted(group.messages)]
+
+
+media_groups = MediaGroupCollector()
+register_gauge("bot_media_groups", "collector", lambda: len(media_groups))
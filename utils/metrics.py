@@ -0,0 +1,149 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe — это bisect и два сложения."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+# stage -> гистограмма задержек
+stages: Dict[str, Histogram] = {}
+# (метрика, метка) -> функция, возвращающая текущее значение (глубины очередей, счётчики кэшей)
+gauges: Dict[tuple, Callable[[], float]] = {}
+
+
+def observe(stage: str, seconds: float):
+    hist = stages.get(stage)
+    if hist is None:
+        hist = stages[stage] = Histogram()
+    hist.observe(seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """with timed("ocr"): ... — записывает длительность блока в гистограмму этапа."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def timed_handler(stage: str):
+    """Декоратор для async-обработчиков: полное время шага диалога."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with timed(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_gauge(name: str, label: str, fn: Callable[[], float]):
+    gauges[(name, label)] = fn
+
+
+def _label(key: str, value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'{key}="{escaped}"'
+
+
+def render_prometheus() -> str:
+    """Текст в формате Prometheus exposition."""
+    lines = [
+        "# HELP bot_stage_seconds Latency of conversation steps and their stages",
+        "# TYPE bot_stage_seconds histogram",
+    ]
+    for stage, hist in sorted(stages.items()):
+        label = _label("stage", stage)
+        cumulative = 0
+        for bound, c in zip(BUCKETS, hist.counts):
+            cumulative += c
+            lines.append(f'bot_stage_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'bot_stage_seconds_bucket{{{label},le="+Inf"}} {hist.count}')
+        lines.append(f"bot_stage_seconds_sum{{{label}}} {hist.total:.6f}")
+        lines.append(f"bot_stage_seconds_count{{{label}}} {hist.count}")
+
+    names = sorted({name for name, _ in gauges})
+    for name in names:
+        lines.append(f"# TYPE {name} gauge")
+        for (metric, label), fn in sorted(gauges.items()):
+            if metric != name:
+                continue
+            try:
+                value = fn()
+            except Exception as e:
+                logger.error(f"Gauge {metric}/{label} failed: {e}")
+                continue
+            lines.append(f'{metric}{{{_label("name", label)}}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def format_stats() -> str:
+    """Краткая сводка для команды /stats."""
+    lines = ["📈 Задержки (count / p50 / p99 / avg):"]
+    for stage, hist in sorted(stages.items()):
+        avg = hist.total / hist.count if hist.count else 0
+        lines.append(
+            f"• {stage}: {hist.count} / {hist.quantile(0.5) * 1000:.0f} / "
+            f"{hist.quantile(0.99) * 1000:.0f} / {avg * 1000:.1f} мс"
+        )
+    if gauges:
+        lines.append("\n📊 Очереди и кэши:")
+        for (metric, label), fn in sorted(gauges.items()):
+            try:
+                lines.append(f"• {metric}[{label}]: {fn()}")
+            except Exception:
+                continue
+    return "\n".join(lines)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """HTTP /metrics для Prometheus. Возвращает runner для остановки."""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint: http://{host}:{port}/metrics")
+    return runner
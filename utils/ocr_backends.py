@@ -0,0 +1,106 @@
+import logging
+import threading
+from typing import Optional
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # необязательная зависимость: без неё работает только subprocess
+    tesserocr = None
+
+from config import OCR_BACKEND, OCR_TESSDATA_PATH
+
+logger = logging.getLogger(__name__)
+
+LANG = "eng"
+
+
+class SubprocessBackend:
+    """pytesseract: на каждый вызов новый процесс tesseract и повторная загрузка traineddata.
+
+    Медленнее, зато умеет убивать зависший tesseract по timeout.
+    """
+
+    name = "subprocess"
+
+    def image_to_string(self, image: Image.Image, timeout: float = 0) -> str:
+        return pytesseract.image_to_string(image, lang=LANG, config="--psm 6", timeout=timeout)
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend:
+    """Постоянный движок: PyTessBaseAPI с загруженным языком живёт всё время процесса.
+
+    timeout передаётся в Recognize(): tesseract сам прерывает
+    распознавание, и воркер освобождается для следующего фото.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, tessdata_path: Optional[str] = OCR_TESSDATA_PATH):
+        kwargs = {"lang": LANG, "psm": tesserocr.PSM.SINGLE_BLOCK}
+        if tessdata_path:
+            kwargs["path"] = tessdata_path
+        self._api = tesserocr.PyTessBaseAPI(**kwargs)
+        # API не потокобезопасен; в воркере пула вызовы и так идут по одному
+        self._lock = threading.Lock()
+
+    def image_to_string(self, image: Image.Image, timeout: float = 0) -> str:
+        with self._lock:
+            self._api.SetImage(image)
+            try:
+                # Recognize ждёт миллисекунды; 0 — без ограничения
+                if not self._api.Recognize(int(timeout * 1000)):
+                    # Как pytesseract при убитом процессе
+                    raise RuntimeError("Tesseract process timeout")
+                return self._api.GetUTF8Text()
+            finally:
+                self._api.Clear()
+
+    def close(self):
+        self._api.End()
+
+
+BACKENDS = {
+    SubprocessBackend.name: SubprocessBackend,
+    TesserocrBackend.name: TesserocrBackend,
+}
+
+# Движок текущего процесса: в воркерах пула создаётся один раз в init_backend
+_backend = None
+
+
+def create_backend(name: str = OCR_BACKEND):
+    """Создаёт движок по имени. "auto" и недоступный tesserocr — откат на subprocess."""
+    if name == "auto":
+        name = TesserocrBackend.name if tesserocr is not None else SubprocessBackend.name
+    if name == TesserocrBackend.name:
+        if tesserocr is None:
+            logger.warning("tesserocr is not installed, falling back to subprocess OCR")
+            return SubprocessBackend()
+        try:
+            return TesserocrBackend()
+        except RuntimeError as e:
+            # Нет traineddata или библиотеки tesseract — работаем через процесс
+            logger.error(f"tesserocr init failed, falling back to subprocess OCR: {e}")
+            return SubprocessBackend()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    return BACKENDS[name]()
+
+
+def init_backend(name: str = OCR_BACKEND):
+    """initializer для ProcessPoolExecutor: прогревает движок до первого фото."""
+    global _backend
+    _backend = create_backend(name)
+    logger.info(f"OCR backend: {_backend.name}")
+
+
+def get_backend():
+    if _backend is None:
+        init_backend()
+    return _backend
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import logging
+from typing import Awaitable, Callable, Optional, Sequence
+
+from PIL import Image
+
+from config import OCR_CACHE_TTL, OCR_START_SIDE, OCR_MIN_RECOGNISED
+from utils.cache import TieredCache
+from utils.metrics import timed, register_gauge
+from utils.ocr_pool import extract_text_async
+
+logger = logging.getLogger(__name__)
+
+ocr_cache = TieredCache("ocr", ttl=OCR_CACHE_TTL)
+
+# Сколько раз запускали распознавание и сколько раз пришлось брать фото крупнее
+escalation_stats = {"attempts": 0, "escalations": 0}
+for _stat in escalation_stats:
+    register_gauge(f"bot_ocr_{_stat}", "photo", lambda stat=_stat: escalation_stats[stat])
+
+HASH_SIZE = 16  # dHash 16x16 -> 256 бит: у этикеток много похожих белых областей, 64 бит мало для различения
+
+
+def perceptual_hash(photo_bytes: bytes) -> Optional[str]:
+    """dHash: одинаков для пересжатых и пересланных копий одного фото."""
+    try:
+        image = Image.open(io.BytesIO(photo_bytes))
+        # Для JPEG декодируем сразу в уменьшенном масштабе — в разы быстрее полного
+        image.draft("L", (HASH_SIZE * 16, HASH_SIZE * 16))
+        image = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    except Exception as e:
+        logger.error(f"Perceptual hash error: {e}")
+        return None
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+async def extract_text_cached(file_unique_id: str, download: Callable[[], Awaitable[bytes]]) -> str:
+    """Текст с фото через кэш.
+
+    1. По file_unique_id — без скачивания и OCR.
+    2. По перцептивному хэшу — фото скачивается, но OCR не запускается.
+    3. Иначе OCR в пуле; результат запоминается под обоими ключами.
+    Пустой результат (текст не распознан) не кэшируется.
+    """
+    text = await ocr_cache.get(f"uid:{file_unique_id}")
+    if text is not None:
+        return text
+
+    with timed("photo_download"):
+        photo_bytes = await download()
+    with timed("photo_hash"):
+        phash = await asyncio.to_thread(perceptual_hash, photo_bytes)
+    if phash is not None:
+        text = await ocr_cache.get(f"phash:{phash}")
+        if text is not None:
+            await ocr_cache.set(f"uid:{file_unique_id}", text)
+            return text
+
+    with timed("ocr"):
+        text = await extract_text_async(photo_bytes)
+    if text:
+        await ocr_cache.set(f"uid:{file_unique_id}", text)
+        if phash is not None:
+            await ocr_cache.set(f"phash:{phash}", text)
+    return text
+
+
+def pick_photo_sizes(photos: Sequence, start_side: int = OCR_START_SIDE) -> list:
+    """Размеры фото (PhotoSize) для OCR от меньшего к большему, начиная с первого не меньше start_side."""
+    photos = sorted(photos, key=lambda p: p.width * p.height)
+    for i, photo in enumerate(photos):
+        if max(photo.width, photo.height) >= start_side:
+            return photos[i:]
+    return photos[-1:]
+
+
+async def extract_text_adaptive(photos: Sequence, score: Callable[[str], int],
+                                enough: int = OCR_MIN_RECOGNISED) -> str:
+    """OCR с эскалацией разрешения.
+
+    Сначала распознаётся небольшой размер фото; следующий, крупнее, берётся,
+    только если score(text) — число узнанных ингредиентов — меньше enough.
+    У каждого размера свой file_unique_id, поэтому кэш работает для каждого.
+    Возвращает текст с лучшим score.
+    """
+    best_text, best_score = "", -1
+    for attempt, photo in enumerate(pick_photo_sizes(photos)):
+        async def download(photo=photo) -> bytes:
+            file = await photo.get_file()
+            return bytes(await file.download_as_bytearray())
+
+        escalation_stats["attempts"] += 1
+        if attempt:
+            escalation_stats["escalations"] += 1
+        text = await extract_text_cached(photo.file_unique_id, download)
+        text_score = score(text) if text else 0
+        if text_score > best_score:
+            best_text, best_score = text, text_score
+        if best_score >= enough:
+            break
+    return best_text
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from config import OCR_WORKERS, OCR_QUEUE_LIMIT, OCR_TIMEOUT, OCR_BACKEND
+from utils.metrics import register_gauge
+from utils.ocr_backends import init_backend
+from utils.orc import extract_text_from_photo
+
+logger = logging.getLogger(__name__)
+
+
+class OCRQueueFull(Exception):
+    """В очереди на распознавание нет места — фото не принято."""
+
+
+class OCRTimeout(Exception):
+    """Распознавание не уложилось в OCR_TIMEOUT."""
+
+
+class OCRPool:
+    """Пул процессов для tesseract с асинхронным интерфейсом.
+
+    Распознавание идёт вне event loop, поэтому бот продолжает отвечать
+    другим чатам. Очередь ограничена: если занято workers + queue_limit
+    мест, новое фото сразу отклоняется с OCRQueueFull.
+    Каждый воркер при старте поднимает свой движок OCR (backend) и
+    использует его для всех последующих фото.
+
+    Место в очереди освобождается, когда задача закончилась в воркере,
+    а не когда её перестали ждать: фото, не уложившееся в таймаут,
+    занимает воркер до конца, и depth это учитывает.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, queue_limit: int = OCR_QUEUE_LIMIT,
+                 timeout: float = OCR_TIMEOUT, backend: str = OCR_BACKEND):
+        self.workers = workers
+        self.backend = backend
+        self.capacity = workers + queue_limit
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+
+    @property
+    def depth(self) -> int:
+        """Сколько фото сейчас распознаётся или ждёт очереди."""
+        return self._in_flight
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_backend, initargs=(self.backend,)
+            )
+        return self._executor
+
+    async def extract_text(self, photo_bytes: bytes) -> str:
+        if self._in_flight >= self.capacity:
+            raise OCRQueueFull()
+
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        try:
+            # tesseract сам прерывается по timeout, здесь — запас на очередь и декодирование
+            future = self._get_executor().submit(extract_text_from_photo, photo_bytes, self.timeout)
+        except BaseException:
+            self._in_flight -= 1
+            raise
+        # Колбэк зовётся из потока пула — счётчик меняем в потоке event loop
+        future.add_done_callback(lambda _: self._release(loop))
+        try:
+            # Отмена корутины (пользователь ушёл) снимает задачу, если она ещё в очереди
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout * 2)
+        except asyncio.TimeoutError:
+            logger.warning("OCR timeout after %.1fs (depth=%d)", self.timeout * 2, self._in_flight)
+            raise OCRTimeout()
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._done)
+        except RuntimeError:
+            # Loop уже закрыт (остановка бота) — считать больше некому
+            pass
+
+    def _done(self):
+        self._in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+ocr_pool = OCRPool()
+register_gauge("bot_queue_depth", "ocr", lambda: ocr_pool.depth)
+
+
+async def extract_text_async(photo_bytes: bytes) -> str:
+    """Асинхронная обёртка над extract_text_from_photo через общий пул."""
+    return await ocr_pool.extract_text(photo_bytes)
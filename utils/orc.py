@@ -1,20 +1,131 @@
 import io
 import re
-from PIL import Image
-import pytesseract
+from PIL import Image, ImageFilter
 import logging
 
+from config import OCR_MAX_SIDE, OCR_MIN_SIDE
+from utils.ocr_backends import get_backend
+
 logger = logging.getLogger(__name__)
 
-def extract_text_from_photo(photo_bytes: bytes) -> str:
+SKEW_PROBE_SIDE = 400       # на такой копии подбираем угол наклона
+SKEW_ANGLES = [a / 2 for a in range(-10, 11)]  # -5°..+5° с шагом 0.5°
+CROP_CELL = 16              # размер клетки при поиске области текста
+CROP_INK = 24               # доля "чернил" в клетке (из 255), начиная с которой она считается текстом
+CROP_MARGIN = 0.03          # поля вокруг найденной области, доля стороны
+
+
+def otsu_threshold(image: Image.Image) -> int:
+    """Порог Оцу по гистограмме grayscale-изображения."""
+    hist = image.histogram()[:256]
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_bg = weight_bg = 0
+    best, threshold = -1.0, 127
+    for i, h in enumerate(hist):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+
+def binarize(image: Image.Image) -> Image.Image:
+    threshold = otsu_threshold(image)
+    return image.point(lambda v: 255 if v > threshold else 0)
+
+
+def _row_profile_score(image: Image.Image) -> float:
+    # Сжатие до ширины 1 (BOX) даёт среднюю яркость каждой строки.
+    # Ровные строки текста чередуются с белыми промежутками — дисперсия максимальна.
+    rows = list(image.resize((1, image.height), Image.BOX).getdata())
+    mean = sum(rows) / len(rows)
+    return sum((r - mean) ** 2 for r in rows)
+
+
+def estimate_skew(image: Image.Image) -> float:
+    """Угол наклона строк в градусах (проекционный профиль на уменьшенной копии)."""
+    scale = SKEW_PROBE_SIDE / max(image.size)
+    probe = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.BILINEAR)
+    probe = binarize(probe)
+    best_angle, best_score = 0.0, -1.0
+    for angle in SKEW_ANGLES:
+        rotated = probe.rotate(angle, resample=Image.NEAREST, fillcolor=255) if angle else probe
+        score = _row_profile_score(rotated)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def text_bbox(image: Image.Image):
+    """Рамка области с текстом на бинаризованном изображении или None."""
+    cells = image.resize(
+        (max(1, image.width // CROP_CELL), max(1, image.height // CROP_CELL)), Image.BOX
+    )
+    # Клетки, где чернил больше порога; одиночные пятна отсекает медианный фильтр
+    ink = cells.point(lambda v: 255 if 255 - v > CROP_INK else 0).filter(ImageFilter.MedianFilter(3))
+    bbox = ink.getbbox()
+    if bbox is None:
+        return None
+    left, top, right, bottom = (v * CROP_CELL for v in bbox)
+    margin_x = int(image.width * CROP_MARGIN)
+    margin_y = int(image.height * CROP_MARGIN)
+    return (
+        max(0, left - margin_x),
+        max(0, top - margin_y),
+        min(image.width, right + margin_x),
+        min(image.height, bottom + margin_y),
+    )
+
+
+def preprocess_image(image: Image.Image) -> Image.Image:
+    """Подготовка фото этикетки к OCR.
+
+    1. Масштаб: длинная сторона приводится к OCR_MIN_SIDE..OCR_MAX_SIDE —
+       tesseract нужен определённый размер букв, лишние мегапиксели только замедляют.
+    2. Выравнивание наклона по проекционному профилю строк.
+    3. Бинаризация по Оцу.
+    4. Обрезка до области с текстом.
+    """
+    # Для JPEG декодируем сразу в уменьшенном масштабе
+    image.draft("L", (OCR_MAX_SIDE, OCR_MAX_SIDE))
+    image = image.convert("L")
+
+    side = max(image.size)
+    if side > OCR_MAX_SIDE or side < OCR_MIN_SIDE:
+        scale = (OCR_MAX_SIDE if side > OCR_MAX_SIDE else OCR_MIN_SIDE) / side
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS if scale < 1 else Image.BICUBIC)
+
+    angle = estimate_skew(image)
+    if angle:
+        image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    image = binarize(image)
+
+    bbox = text_bbox(image)
+    # Слишком маленькая область — скорее блик или шум, оставляем кадр целиком
+    if bbox and (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) > image.width * image.height * 0.05:
+        image = image.crop(bbox)
+    return image
+
+
+def extract_text_from_photo(photo_bytes: bytes, timeout: float = 0) -> str:
+    """Распознаёт текст на фото. timeout > 0 — прервать tesseract, если он завис."""
     try:
-        image = Image.open(io.BytesIO(photo_bytes))
-        # Конвертируем в grayscale для улучшения OCR
-        image = image.convert('L')
-        text = pytesseract.image_to_string(image, lang='eng', config='--psm 6')
+        image = preprocess_image(Image.open(io.BytesIO(photo_bytes)))
+        text = get_backend().image_to_string(image, timeout=timeout)
         # Очистка: оставляем только латинские буквы, цифры, запятые, точки с запятой, скобки
         cleaned = re.sub(r'[^a-zA-Z0-9\(\),;\-\s]', '', text)
         return cleaned.strip()
     except Exception as e:
         logger.error(f"OCR error: {e}")
-        return ""
\ No newline at end of file
+        return ""
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import SESSION_IDLE_TTL
+from utils.redis_client import get_redis, mark_redis_down
+from utils.session import Session
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ptb"
+
+
+def _encode_conversation_key(key: tuple) -> str:
+    return ":".join(str(part) for part in key)
+
+
+def _decode_conversation_key(raw: str) -> tuple:
+    return tuple(int(part) if part.lstrip("-").isdigit() else part for part in raw.split(":"))
+
+
+class RedisPersistence(BasePersistence):
+    """Хранит сессии пользователей (Session) и состояния диалогов в Redis.
+
+    Каждая сессия и каждое состояние — отдельный ключ с TTL простоя
+    (SESSION_IDLE_TTL), так что брошенные диалоги Redis удаляет сам.
+
+    Запись пакетная и только изменившихся данных: PTB раз в
+    update_interval секунд передаёт сессии пользователей, которые
+    что-то прислали; сессия пишется, только если её содержимое
+    отличается от записанного ранее, и все записи цикла уходят в Redis
+    одним pipeline.
+
+    Сессии загружаются лениво: при первом апдейте пользователя после
+    старта процесса (refresh_user_data), а не все сразу. Апдейты одного
+    чата всегда приходят в один и тот же процесс (см. webhook.py).
+
+    Если Redis недоступен, бот работает с состоянием в памяти.
+    """
+
+    def __init__(self, update_interval: float = 60, ttl: int = SESSION_IDLE_TTL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.ttl = ttl
+        self._written: Dict[int, int] = {}              # user_id -> хэш последней записанной сессии
+        self._pending: Dict[str, Optional[str]] = {}    # ключ Redis -> JSON (None — удалить)
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(*parts) -> str:
+        return ":".join((KEY_PREFIX,) + tuple(str(p) for p in parts))
+
+    # --- пакетная запись ---
+
+    def _queue(self, key: str, value: Optional[str]):
+        self._pending[key] = value
+        # Все update_* одного цикла PTB вызываются подряд; запись — после них, одним pipeline
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        await asyncio.sleep(0)
+        await self._write_pending()
+
+    async def _write_pending(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value in pending.items():
+                    if value is None:
+                        pipe.delete(key)
+                    else:
+                        pipe.set(key, value, ex=self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            mark_redis_down(e)
+            # Хэши сбрасываем: при следующем изменении сессии запишутся заново
+            self._written.clear()
+
+    async def _get(self, key: str) -> Optional[str]:
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(key)
+        except RedisError as e:
+            mark_redis_down(e)
+            return None
+        return raw.decode() if raw is not None else None
+
+    async def _scan(self, pattern: str) -> Dict[str, str]:
+        client = get_redis()
+        if client is None:
+            return {}
+        result = {}
+        try:
+            keys = [key async for key in client.scan_iter(match=pattern, count=1000)]
+            for i in range(0, len(keys), 1000):
+                batch = keys[i:i + 1000]
+                for key, value in zip(batch, await client.mget(batch)):
+                    if value is not None:
+                        result[key.decode()] = value.decode()
+        except RedisError as e:
+            mark_redis_down(e)
+        return result
+
+    # --- сессии пользователей ---
+
+    async def get_user_data(self) -> Dict[int, Session]:
+        # Ничего не загружаем заранее: сессия подтягивается при первом апдейте пользователя
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Session) -> None:
+        user_data.touched = time.time()
+        if user_data.loaded:
+            return
+        user_data.loaded = True
+        raw = await self._get(self._key("session", user_id))
+        if raw is not None:
+            user_data.update_from(json.loads(raw))
+            self._written[user_id] = hash(raw)
+
+    async def update_user_data(self, user_id: int, data: Session) -> None:
+        raw = json.dumps(data.to_dict(), ensure_ascii=False, separators=(",", ":"))
+        digest = hash(raw)
+        if self._written.get(user_id) == digest:
+            return
+        self._written[user_id] = digest
+        self._queue(self._key("session", user_id), raw)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._written.pop(user_id, None)
+        self._queue(self._key("session", user_id), None)
+
+    # --- состояния диалогов ---
+
+    async def get_conversations(self, name: str) -> dict:
+        prefix = self._key("conv", name) + ":"
+        raw = await self._scan(prefix + "*")
+        return {_decode_conversation_key(k[len(prefix):]): json.loads(v) for k, v in raw.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        value = None if new_state is None else json.dumps(new_state)
+        self._queue(self._key("conv", name, _encode_conversation_key(key)), value)
+
+    # chat_data, bot_data и callback_data боту не нужны
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # Последний цикл при остановке: дописываем всё, что ещё не ушло в Redis
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        await self._write_pending()
@@ -0,0 +1,44 @@
+import time
+import logging
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB,
+    REDIS_MAX_CONNECTIONS, REDIS_TIMEOUT, REDIS_RETRY_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Один пул соединений на процесс — все модули ходят в Redis через него
+pool = aioredis.ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    socket_timeout=REDIS_TIMEOUT,
+    socket_connect_timeout=REDIS_TIMEOUT,
+)
+r = aioredis.Redis(connection_pool=pool)
+
+_down_until = 0.0
+
+
+def get_redis() -> Optional[aioredis.Redis]:
+    """Возвращает клиента или None, если Redis недавно падал (не ждём таймаутов на каждом запросе)."""
+    if time.monotonic() < _down_until:
+        return None
+    return r
+
+
+def mark_redis_down(error: Exception):
+    """Отмечает Redis недоступным на REDIS_RETRY_INTERVAL секунд."""
+    global _down_until
+    if time.monotonic() >= _down_until:
+        logger.warning(f"Redis unavailable ({error}), using local fallback for {REDIS_RETRY_INTERVAL}s")
+    _down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+
+
+async def close_redis():
+    await pool.disconnect()
@@ -0,0 +1,42 @@
+# Маркер вместо текста цели: готовый отчёт кэшируется без неё и подставляет цель при отдаче
+GOAL_PLACEHOLDER = "\x00goal\x00"
+# Сколько компонентов раздела помещается в сообщение (лимит Telegram — 4096 символов)
+SECTION_LIMIT = 5
+
+def format_report(report: dict, subtype: str, goal: str = GOAL_PLACEHOLDER) -> str:
+    """Markdown-текст ответа по результату analyze_composition."""
+    lines = [
+        f"🧴 *Анализ состава: {subtype}*\n",
+        f"🎯 *Ваша цель:* {goal}\n",
+    ]
+
+    for section, title in (
+        ("good", "✅ *Подходящие компоненты:*"),
+        ("risky", "\n⚠️ *Спорные / требуют осторожности:*"),
+        ("bad", "\n❌ *Нежелательные для вашей цели:*"),
+        ("unknown", "\n❔ *Неизвестные компоненты:*"),
+    ):
+        # В отчётах из кэша до появления раздела unknown его нет
+        entries = report.get(section, ())
+        if not entries:
+            continue
+        lines.append(title)
+        for key, name, note in entries[:SECTION_LIMIT]:
+            lines.append(f"• *{name}* — {note}")
+        if len(entries) > SECTION_LIMIT:
+            # Полный список — в отчёте файлом (кнопки под ответом)
+            lines.append(f"... и ещё {len(entries) - SECTION_LIMIT} — полный список в отчёте файлом")
+
+    lines.append(f"\n📊 *Общая оценка:* {report['score']}/10")
+    lines.append("\n💡 *Рекомендации:*")
+    for rec in report["recommendations"]:
+        lines.append(f"• {rec}")
+
+    lines.append(
+        "\n⚠️ *Важно:* Бот не заменяет консультацию дерматолога или трихолога.\n\n"
+        "Хотите *персональный разбор ухода за волосами* от профессионалов?"
+    )
+    return "\n".join(lines)
+
+def fill_goal(text: str, goal: str) -> str:
+    return text.replace(GOAL_PLACEHOLDER, goal)
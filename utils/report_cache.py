@@ -0,0 +1,52 @@
+import hashlib
+from typing import Optional
+
+from config import REPORT_CACHE_TTL, REPORT_CACHE_LOCAL_SIZE
+from utils.analysis import INGREDIENTS_DB, resolve_key
+from utils.cache import TieredCache
+from utils.scoring import classify_goal
+
+# Готовые тексты отчётов для повторяющихся составов и данные анализа для отчёта файлом
+report_cache = TieredCache("report", ttl=REPORT_CACHE_TTL, local_size=REPORT_CACHE_LOCAL_SIZE)
+
+
+def composition_fingerprint(ingredients: list, category: str, subtype: str, goal: str) -> str:
+    """Отпечаток состава: ключи БД в порядке состава + тип средства + класс цели + версия БД.
+
+    Разные написания одного ингредиента (OCR-ошибки, синонимы) дают один
+    отпечаток. Неизвестные компоненты входят как есть; когда их найдут во
+    внешнем источнике, отпечаток сменится. Смена версии базы делает все
+    старые записи недостижимыми — они истекут по TTL.
+    """
+    keys = []
+    for ing in ingredients:
+        key = resolve_key(ing)
+        keys.append(key if key is not None else "?" + ing)
+    payload = "\x1f".join([INGREDIENTS_DB.version, category, subtype, str(classify_goal(goal))] + keys)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+async def get_cached_report(fingerprint: str) -> Optional[str]:
+    entry = await report_cache.get(fingerprint)
+    # Записи старого формата (только текст) — промах: без данных анализа нельзя отрисовать файл
+    return entry["text"] if isinstance(entry, dict) else None
+
+
+async def get_report_data(fingerprint: str) -> Optional[dict]:
+    """Данные анализа для отчёта файлом (см. utils/report_render.py)."""
+    entry = await report_cache.get(fingerprint)
+    return entry["data"] if isinstance(entry, dict) else None
+
+
+async def cache_report(fingerprint: str, text: str, report: dict, subtype: str, goal: str):
+    """Текст отчёта и данные для отчёта файлом — одна запись: истекают и вытесняются вместе.
+
+    Файл общий для всех с этим отпечатком, поэтому в нём класс цели, а не её текст.
+    """
+    data = {"subtype": subtype, "goal_mask": classify_goal(goal), "report": report}
+    await report_cache.set(fingerprint, {"text": text, "data": data})
+
+
+def report_cache_stats() -> dict:
+    """Счётчики попаданий для подбора размера кэша."""
+    return dict(report_cache.stats, local_size=len(report_cache.local), hit_ratio=round(report_cache.hit_ratio(), 3))
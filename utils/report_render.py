@@ -0,0 +1,275 @@
+import asyncio
+import base64
+import html
+import io
+import logging
+import string
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from config import REPORT_CACHE_TTL, REPORT_FILE_LOCAL_SIZE, REPORT_FONT_PATH, REPORT_FONT_BOLD_PATH
+from utils.cache import TieredCache
+from utils.metrics import timed
+from utils.report_cache import get_report_data
+from utils.scoring import GOAL_BITS
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PATH = Path(__file__).parent.parent / "templates" / "report_template.html"
+LOGO_PATH = Path(__file__).parent.parent / "static" / "logo_vivi.png"
+
+SECTIONS = (
+    ("good", "Подходящие компоненты", (46, 158, 79)),
+    ("risky", "Спорные / требуют осторожности", (224, 161, 0)),
+    ("bad", "Нежелательные для вашей цели", (214, 69, 69)),
+    ("unknown", "Неизвестные компоненты", (138, 138, 138)),
+)
+
+# Готовые файлы по отпечатку состава; данные для отрисовки — в кэше отчётов (utils/report_cache.py)
+report_files = TieredCache("report_file", ttl=REPORT_CACHE_TTL, local_size=REPORT_FILE_LOCAL_SIZE)
+# Single-flight: "<формат>:<отпечаток>" -> future первой отрисовки
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+class CompiledTemplate:
+    """Шаблон в синтаксисе string.Template, разобранный один раз.
+
+    Текст делится на неизменные куски и имена полей; отрисовка — одна
+    склейка списка без повторного разбора шаблона.
+    """
+
+    def __init__(self, source: str):
+        self.literals: List[str] = []
+        self.fields: List[str] = []
+        literal, pos = [], 0
+        for match in string.Template.pattern.finditer(source):
+            literal.append(source[pos:match.start()])
+            pos = match.end()
+            if match.group("escaped") is not None:
+                literal.append("$")
+                continue
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                raise ValueError(f"Invalid placeholder in template at {match.start()}")
+            self.literals.append("".join(literal))
+            self.fields.append(name)
+            literal = []
+        literal.append(source[pos:])
+        self.literals.append("".join(literal))
+
+    def render(self, values: Dict[str, str]) -> str:
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            out.append(values[field])
+            out.append(literal)
+        return "".join(out)
+
+
+class ReportAssets:
+    """Шаблон, логотип и шрифты: читаются с диска один раз на процесс."""
+
+    def __init__(self):
+        self.template = CompiledTemplate(TEMPLATE_PATH.read_text(encoding="utf-8"))
+        self.logo: Optional[Image.Image] = None
+        self.logo_html = ""
+        try:
+            raw = LOGO_PATH.read_bytes()
+            logo = Image.open(io.BytesIO(raw))
+            logo.load()
+            self.logo = logo.convert("RGBA")
+            self.logo_html = f'<img src="data:image/png;base64,{base64.b64encode(raw).decode()}" alt="logo">'
+        except (OSError, ValueError) as e:
+            logger.warning(f"Report logo unavailable ({LOGO_PATH.name}): {e}")
+        self._fonts: Dict[Tuple[int, bool], ImageFont.FreeTypeFont] = {}
+
+    def font(self, size: int, bold: bool = False):
+        font = self._fonts.get((size, bold))
+        if font is None:
+            try:
+                font = ImageFont.truetype(REPORT_FONT_BOLD_PATH if bold else REPORT_FONT_PATH, size)
+            except OSError:
+                font = ImageFont.load_default(size)
+            self._fonts[(size, bold)] = font
+        return font
+
+
+_assets: Optional[ReportAssets] = None
+
+
+def get_assets() -> ReportAssets:
+    global _assets
+    if _assets is None:
+        _assets = ReportAssets()
+    return _assets
+
+
+def describe_goal(goal_mask: int) -> str:
+    """Цель в отчёте-файле — только её класс: файл общий для всех с тем же отпечатком."""
+    triggers = [trigger for trigger, bit in GOAL_BITS.items() if goal_mask & bit]
+    if triggers:
+        return "С учётом особенностей: " + ", ".join(triggers)
+    return "Общий анализ без особых ограничений"
+
+
+def score_class(score: int) -> str:
+    return "score-high" if score >= 8 else "score-mid" if score >= 5 else "score-low"
+
+
+# --- HTML ---
+
+def render_html(data: dict) -> bytes:
+    assets = get_assets()
+    report = data["report"]
+    sections = []
+    for name, title, _ in SECTIONS:
+        # Данные из кэша до появления раздела unknown его не содержат
+        entries = report.get(name, ())
+        if not entries:
+            continue
+        items = "\n".join(
+            f'<li><b>{html.escape(label)}</b> <span class="inci">{html.escape(key)}</span> — {html.escape(note)}</li>'
+            for key, label, note in entries
+        )
+        sections.append(f'<section class="{name}">\n<h2>{title} ({len(entries)})</h2>\n<ul>\n{items}\n</ul>\n</section>')
+    return assets.template.render({
+        "logo": assets.logo_html,
+        "subtype": html.escape(data["subtype"]),
+        "goal": html.escape(describe_goal(data["goal_mask"])),
+        "score": str(report["score"]),
+        "score_class": score_class(report["score"]),
+        "sections": "\n".join(sections),
+        "recommendations": "\n".join(f"<li>{html.escape(rec)}</li>" for rec in report["recommendations"]),
+    }).encode("utf-8")
+
+
+# --- PNG ---
+
+PNG_WIDTH = 1080
+PNG_MARGIN = 64
+PNG_BACKGROUND = (246, 243, 239)
+PNG_TEXT = (43, 43, 43)
+PNG_MUTED = (107, 107, 107)
+
+
+def _wrap(text: str, font, width: int) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if line and font.getlength(candidate) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines or [""]
+
+
+def render_png(data: dict) -> bytes:
+    assets = get_assets()
+    report = data["report"]
+    title, heading, body, small = assets.font(44, True), assets.font(32, True), assets.font(26), assets.font(22)
+    text_width = PNG_WIDTH - 2 * PNG_MARGIN
+
+    # Сначала раскладка (строки и отступы), потом размер холста и отрисовка
+    ops = []    # (текст, шрифт, цвет, отступ слева, высота строки)
+
+    def paragraph(text: str, font, color=PNG_TEXT, gap: int = 0):
+        for line in _wrap(text, font, text_width):
+            ops.append((line, font, color, 0, int(font.size * 1.35)))
+        if gap:
+            ops.append(("", font, color, 0, gap))
+
+    def bullet(text: str, font=body):
+        # Перенесённые строки — с отступом под текст, а не под маркер
+        hang = int(font.getlength("• "))
+        for i, line in enumerate(_wrap(text, font, text_width - 8 - hang)):
+            ops.append((f"• {line}" if i == 0 else line, font, PNG_TEXT, 8 if i == 0 else 8 + hang, int(font.size * 1.35)))
+
+    paragraph(f"Анализ состава: {data['subtype']}", title)
+    paragraph(describe_goal(data["goal_mask"]), body, PNG_MUTED, gap=16)
+    paragraph(f"Общая оценка: {report['score']}/10", heading, gap=24)
+    for name, section_title, color in SECTIONS:
+        entries = report.get(name, ())
+        if entries:
+            paragraph(f"{section_title} ({len(entries)})", heading, color, gap=8)
+            for key, label, note in entries:
+                bullet(f"{label} — {note}")
+            ops.append(("", body, PNG_TEXT, 0, 24))
+    paragraph("Рекомендации", heading, gap=8)
+    for rec in report["recommendations"]:
+        bullet(rec)
+    ops.append(("", body, PNG_TEXT, 0, 24))
+    paragraph("Отчёт не заменяет консультацию дерматолога или трихолога.", small, PNG_MUTED)
+
+    logo = assets.logo
+    logo_height = 0
+    if logo is not None:
+        logo = logo.resize((max(1, logo.width * 80 // logo.height), 80))
+        logo_height = logo.height + 24
+    height = PNG_MARGIN * 2 + logo_height + sum(op[4] for op in ops)
+
+    image = Image.new("RGB", (PNG_WIDTH, height), PNG_BACKGROUND)
+    if logo is not None:
+        image.paste(logo, (PNG_MARGIN, PNG_MARGIN), logo)
+    draw = ImageDraw.Draw(image)
+    y = PNG_MARGIN + logo_height
+    for text, font, color, indent, line_height in ops:
+        if text:
+            draw.text((PNG_MARGIN + indent, y), text, font=font, fill=color)
+        y += line_height
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+RENDERERS: Dict[str, Callable[[dict], bytes]] = {"html": render_html, "png": render_png}
+
+
+# --- кэш ---
+
+async def _render(fmt: str, fingerprint: str) -> Optional[bytes]:
+    data = await get_report_data(fingerprint)
+    if data is None:
+        return None
+    # Pillow и склейка больших строк — вне event loop
+    with timed(f"render_{fmt}"):
+        content = await asyncio.to_thread(RENDERERS[fmt], data)
+    await report_files.set(f"{fmt}:{fingerprint}", base64.b64encode(content).decode() if fmt == "png" else content.decode())
+    return content
+
+
+async def get_report_file(fingerprint: str, fmt: str) -> Optional[bytes]:
+    """Готовый отчёт-файл (HTML или PNG); None — данных анализа уже нет (истёк TTL).
+
+    Отрисовка — один раз на отпечаток и формат: готовый файл берётся из
+    кэша, одновременные запросы одного файла ждут одну отрисовку.
+    """
+    key = f"{fmt}:{fingerprint}"
+    cached = await report_files.get(key)
+    if cached is not None:
+        return base64.b64decode(cached) if fmt == "png" else cached.encode("utf-8")
+
+    future = _inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        content = await _render(fmt, fingerprint)
+        future.set_result(content)
+        return content
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Исключение уже получил вызывающий; ждущие получат его сами
+        future.exception()
+        raise
+    finally:
+        del _inflight[key]
@@ -0,0 +1,212 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from utils.ingredients_store import INGREDIENTS_DB
+
+ALIASES_PATH = Path(__file__).parent.parent / "data" / "aliases.json"
+
+MIN_CONFIDENCE = 0.8   # ниже — считаем ингредиент неизвестным
+MAX_DISTANCE = 2       # максимум опечаток (Дамерау–Левенштейн)
+PREFIX_LENGTH = 7      # SymSpell: ключи индекса — по префиксу, индекс не растёт с длиной названий
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+# Цифра между двумя буквами — почти всегда ошибка OCR: GLYCER1N, S0DIUM
+_OCR_DIGIT = re.compile(r"(?<=[A-Z])[01568](?=[A-Z])")
+_OCR_FIXES = {"0": "O", "1": "I", "5": "S", "6": "G", "8": "B"}
+# Британское написание и частые варианты
+_SPELLING = [(re.compile(p), r) for p, r in [
+    (r"SULPHATE", "SULFATE"),
+    (r"SULPHONATE", "SULFONATE"),
+    (r"ALUMINIUM", "ALUMINUM"),
+]]
+
+
+class Match(NamedTuple):
+    key: str
+    confidence: float
+
+
+def compact(name: str) -> str:
+    """AQUA (Water) -> AQUAWATER: регистр, пробелы и знаки не важны."""
+    return _NON_ALNUM.sub("", name.upper())
+
+
+def _deletes(word: str, max_distance: int) -> set:
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def _distance(a: str, b: str, max_distance: int) -> int:
+    """Расстояние Дамерау–Левенштейна (OSA) в полосе |i - j| <= max_distance.
+
+    Общие префикс и суффикс отбрасываются заранее, так что для длинных
+    INCI-названий с одной опечаткой считается лишь маленькая матрица.
+    Если расстояние больше max_distance, возвращает max_distance + 1.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a or not b:
+        return len(a) or len(b)
+
+    big = max_distance + 1
+    prev2 = None
+    prev = [j if j <= max_distance else big for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        cur = [big] * (len(b) + 1)
+        if i <= max_distance:
+            cur[0] = i
+        row_min = big
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > max_distance:
+            return big
+        prev2, prev = prev, cur
+    return min(prev[-1], big)
+
+
+class IngredientResolver:
+    """Индекс для нечёткого поиска ингредиента по названию из OCR/ручного ввода.
+
+    Порядок: точное совпадение (с учётом синонимов) -> исправление
+    типичных ошибок OCR -> SymSpell-поиск с опечатками -> разбор
+    «AQUA WATER»-склеек. Все названия сравниваются в компактной форме
+    без пробелов и знаков, поэтому «Sodium Laureth-Sulfate» и
+    «SODIUMLAURETHSULFATE» дают один ключ.
+    """
+
+    def __init__(self, keys, aliases: Optional[dict] = None,
+                 max_distance: int = MAX_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.exact = {}    # компактная форма -> ключ БД
+        self.deletes = {}  # ключ префикса (см. _prefix_keys) -> компактные формы
+        for key in keys:
+            self._add(compact(key), key)
+        for alias, key in (aliases or {}).items():
+            self._add(compact(alias), key)
+
+    def _add(self, term: str, key: str):
+        if not term or term in self.exact:
+            return
+        self.exact[term] = key
+        for d in self._prefix_keys(term, self.max_distance):
+            self.deletes.setdefault(d, []).append(term)
+
+    def _prefix_keys(self, term: str, max_distance: int) -> set:
+        """Ключи индекса: удаления из окна prefix_length + max_distance, обрезанные до prefix_length.
+
+        Удаления из самого префикса давали ключ SODIUM для любого SODIUMx...:
+        в эту корзину попадали все названия на SODIUM, и запрос с опечаткой
+        сверялся с каждым. Обрезанные ключи длинных названий всегда длиной
+        prefix_length, а общий ключ у названий на расстоянии не больше
+        max_distance по-прежнему гарантирован.
+        """
+        window = term[:self.prefix_length + max_distance]
+        return {d[:self.prefix_length] for d in _deletes(window, max_distance)}
+
+    def __len__(self):
+        return len(self.exact)
+
+    def _fix_spelling(self, term: str) -> str:
+        term = _OCR_DIGIT.sub(lambda m: _OCR_FIXES[m.group()], term)
+        for pattern, repl in _SPELLING:
+            term = pattern.sub(repl, term)
+        return term
+
+    def _fuzzy(self, term: str) -> Optional[Match]:
+        # Короткие названия с опечаткой слишком легко спутать с другими
+        max_distance = min(self.max_distance, max(0, (len(term) - 3) // 3))
+        if max_distance == 0:
+            return None
+        best, best_distance = None, max_distance + 1
+        seen = set()
+        for d in self._prefix_keys(term, max_distance):
+            for candidate in self.deletes.get(d, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                dist = _distance(term, candidate, max_distance)
+                if dist < best_distance or (dist == best_distance and best is not None and len(candidate) > len(best)):
+                    best, best_distance = candidate, dist
+        if best is None:
+            return None
+        return Match(self.exact[best], 1 - best_distance / max(len(term), len(best)))
+
+    def _split(self, name: str) -> Optional[Match]:
+        """AQUA WATER, GLYCERIN GLYCEROL: первая часть — известный ингредиент, хвост — тоже."""
+        words = [w for w in _NON_ALNUM.split(name.upper()) if w]
+        for i in range(len(words) - 1, 0, -1):
+            head, tail = "".join(words[:i]), "".join(words[i:])
+            if head in self.exact and tail in self.exact:
+                return Match(self.exact[head], 0.9)
+        return None
+
+    def resolve(self, name: str) -> Optional[Match]:
+        term = compact(name)
+        if not term:
+            return None
+        if term in self.exact:
+            return Match(self.exact[term], 1.0)
+
+        fixed = self._fix_spelling(term)
+        if fixed in self.exact:
+            return Match(self.exact[fixed], 0.95)
+
+        match = self._fuzzy(fixed) or self._split(name)
+        if match is None or match.confidence < MIN_CONFIDENCE:
+            return None
+        return match
+
+
+def load_aliases() -> dict:
+    if not ALIASES_PATH.exists():
+        return {}
+    with open(ALIASES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_resolver: Optional[IngredientResolver] = None
+
+
+def get_resolver() -> IngredientResolver:
+    """Индекс строится один раз на версию INGREDIENTS_DB по её ключам и синонимам."""
+    global _resolver
+    if _resolver is None:
+        _resolver = IngredientResolver(INGREDIENTS_DB.snapshot.keys(), load_aliases())
+    return _resolver
+
+
+def _reset_resolver():
+    global _resolver
+    _resolver = None
+    resolve_ingredient.cache_clear()
+
+
+@lru_cache(maxsize=8192)
+def resolve_ingredient(name: str) -> Optional[Match]:
+    """Лучшее совпадение в БД и уверенность 0..1, либо None."""
+    return get_resolver().resolve(name)
+
+
+INGREDIENTS_DB.on_reload(_reset_resolver)
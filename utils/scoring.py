@@ -0,0 +1,118 @@
+from typing import Optional
+
+from .ingredients_store import INGREDIENTS_DB
+
+# Слова в цели пользователя, при которых ингредиенты high-риска проверяются строже
+GOAL_TRIGGERS = ["чувствительная", "аллергия", "атопичная", "сухая", "повреждённая"]
+# Значения bad_for, при которых такой ингредиент попадает в «нежелательные»
+BAD_FOR_TRIGGERS = ["чувствительная кожа", "сухие волосы", "повреждённые волосы"]
+
+RISK_BITS = {"low": 1 << 0, "medium": 1 << 1, "high": 1 << 2}
+RISK_LOW, RISK_MEDIUM, RISK_HIGH = RISK_BITS["low"], RISK_BITS["medium"], RISK_BITS["high"]
+_BAD_FOR_SHIFT = 3
+BAD_FOR_BITS = {t: 1 << (_BAD_FOR_SHIFT + i) for i, t in enumerate(BAD_FOR_TRIGGERS)}
+BAD_FOR_MASK = sum(BAD_FOR_BITS.values())
+
+GOAL_BITS = {t: 1 << i for i, t in enumerate(GOAL_TRIGGERS)}
+
+# Классы ингредиента в отчёте; UNKNOWN — нет в базе
+GOOD, RISKY, BAD, UNKNOWN = 0, 1, 2, 3
+
+RECOMMENDATIONS = [
+    "Обращайте внимание на первые 5 компонентов — они составляют основу средства.",
+    "Для вашей цели важнее функциональные ингредиенты (увлажнители, кератин, церамиды), а не наполнители.",
+    "Если в составе есть спирты (Alcohol Denat., Ethanol) — проверяйте их позицию: после 5-го места — обычно безопасно."
+]
+
+
+def classify_goal(goal: str) -> int:
+    """Битовая маска слов-триггеров в цели. Считается один раз на анализ."""
+    goal_lower = goal.lower()
+    mask = 0
+    for trigger, bit in GOAL_BITS.items():
+        if trigger in goal_lower:
+            mask |= bit
+    return mask
+
+
+class ScoringEngine:
+    """Оценка состава по признакам, заранее упакованным в битовые маски.
+
+    При загрузке базы каждый ингредиент получает маску признаков
+    (уровень риска и совпадения bad_for с триггерами), готовый кортеж
+    для отчёта и класс (good/risky/bad) для обеих веток цели — с
+    триггером и без. Оценка состава сводится к выборке из таблиц без
+    повторного разбора записей.
+    """
+
+    def __init__(self, db=INGREDIENTS_DB):
+        self.db = db
+        self.version = db.version
+        self.features = {}
+        self.entries = {}
+        # classes[0] — цель без триггеров, classes[1] — с триггером
+        self.classes = ({}, {})
+        for key in db:
+            self._add(key)
+
+    def _add(self, key: str):
+        data = self.db[key]
+        features = RISK_BITS.get(data["risk_level"], 0)
+        for item in data.get("bad_for", ()):
+            features |= BAD_FOR_BITS.get(item, 0)
+        self.features[key] = features
+        self.entries[key] = (key, data["name_ru"], data["notes"])
+
+        if features & RISK_LOW:
+            self.classes[0][key] = self.classes[1][key] = GOOD
+        else:
+            self.classes[0][key] = RISKY
+            bad = features & RISK_HIGH and features & BAD_FOR_MASK
+            self.classes[1][key] = BAD if bad else RISKY
+
+    def _ensure(self, key: str) -> bool:
+        """Ингредиенты, добавленные в базу после сборки таблиц (внешний поиск)."""
+        if key in self.features:
+            return True
+        if key in self.db:
+            self._add(key)
+            return True
+        return False
+
+    def score(self, keys: list, goal_mask: int) -> dict:
+        """keys — пары (название из состава, ключ в БД или None)."""
+        classes = self.classes[1 if goal_mask else 0]
+        buckets = ([], [], [], [])
+        for ing, key in keys:
+            if key is not None and self._ensure(key):
+                buckets[classes[key]].append(self.entries[key])
+            else:
+                buckets[UNKNOWN].append((ing, ing, "Нет данных в базе"))
+
+        good, risky, bad, unknown = buckets
+        # Неизвестные снижают оценку так же, как спорные
+        score = max(3, 10 - len(bad) * 2 - (len(risky) + len(unknown)) // 2)
+        score = min(10, score)
+        return {
+            "good": good,
+            "risky": risky,
+            "bad": bad,
+            "unknown": unknown,
+            "score": score,
+            "recommendations": list(RECOMMENDATIONS),
+        }
+
+    def score_batch(self, compositions: list, goal_mask: int) -> list:
+        """Несколько составов с одной целью: обычный цикл по score(), таблицы и маска цели — общие."""
+        return [self.score(keys, goal_mask) for keys in compositions]
+
+
+_engine: Optional[ScoringEngine] = None
+
+
+def get_engine() -> ScoringEngine:
+    """Таблицы строятся один раз на версию базы."""
+    global _engine
+    if _engine is None or _engine.version != INGREDIENTS_DB.version:
+        _engine = ScoringEngine()
+    return _engine
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from config import SESSION_IDLE_TTL, SESSION_EVICT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """Состояние диалога пользователя (context.user_data).
+
+    __slots__ вместо словаря: фиксированный набор полей без словаря
+    атрибутов на каждого пользователя. touched — время последнего апдейта, по
+    нему простаивающие сессии вытесняются из памяти (и истекают в Redis).
+    """
+
+    __slots__ = ("category", "subtype", "goal", "ingredients_raw", "ingredients_parsed", "touched", "loaded")
+
+    # Поля, которые сохраняются в Redis
+    FIELDS = ("category", "subtype", "goal", "ingredients_raw", "ingredients_parsed")
+
+    def __init__(self):
+        self.category: Optional[str] = None
+        self.subtype: Optional[str] = None
+        self.goal: Optional[str] = None
+        self.ingredients_raw: Optional[str] = None
+        self.ingredients_parsed: Optional[list] = None
+        self.touched = time.time()
+        self.loaded = False    # сессия уже сверена с Redis после старта процесса
+
+    def is_complete(self) -> bool:
+        """Выбраны категория, тип и цель — можно анализировать состав."""
+        return bool(self.category and self.subtype and self.goal)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+    def update_from(self, data: dict):
+        for field in self.FIELDS:
+            if field in data:
+                setattr(self, field, data[field])
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        session = cls()
+        session.update_from(data)
+        session.loaded = True
+        return session
+
+    def __deepcopy__(self, memo) -> "Session":
+        # PTB копирует user_data перед записью в persistence; копия нужна только для сериализации
+        copy = Session.from_dict(self.to_dict())
+        if self.ingredients_parsed is not None:
+            copy.ingredients_parsed = list(self.ingredients_parsed)
+        copy.touched = self.touched
+        return copy
+
+    def __repr__(self):
+        return f"Session({self.to_dict()!r})"
+
+
+def evict_idle(application, ttl: float = SESSION_IDLE_TTL) -> int:
+    """Удаляет сессии без апдейтов дольше ttl. Возвращает число удалённых."""
+    deadline = time.time() - ttl
+    idle = [user_id for user_id, session in application.user_data.items() if session.touched < deadline]
+    for user_id in idle:
+        application.drop_user_data(user_id)
+    return len(idle)
+
+
+async def evict_idle_sessions(application, interval: float = SESSION_EVICT_INTERVAL):
+    """Фоновая задача: периодически вытесняет простаивающие сессии."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            evicted = evict_idle(application)
+            if evicted:
+                logger.info(f"Evicted {evicted} idle sessions")
+        except Exception as e:
+            logger.error(f"Session eviction failed: {e}")
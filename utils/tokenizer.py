@@ -0,0 +1,311 @@
+import re
+from collections import deque
+from typing import Iterable, Iterator, List, Optional
+
+from utils.ingredients_store import INGREDIENTS_DB
+from utils.resolver import compact, get_resolver, load_aliases, resolve_ingredient
+
+# Весь разбор — один проход finditer по одному скомпилированному выражению.
+# Порядок альтернатив важен: заголовок и «May contain» раньше обычных слов.
+_TOKEN = re.compile(r"""
+    (?P<header>\b(?:ingr[eé]dients?|ingredientes|inci|ing|состав|composition)\b\s*[:.\-]?)
+  | (?P<may>\bmay\s+contain\b\s*(?:[\[(]\s*\+\s*/\s*-\s*[\])])?\s*:?
+      | [\[(]\s*\+\s*/\s*-\s*[\])]\s*:?
+      | \+\s*/\s*-\s*:?)
+  | (?P<open>[(\[{])
+  | (?P<close>[)\]}])
+  | (?P<sep>[,;•·|])
+  | (?P<glue>-[ \t]*\r?\n\s*)
+  | (?P<word>(?:\d+(?:,\d+)+|[^\W_]+)(?:[-'’/.+&][^\W_]+)*)
+""", re.IGNORECASE | re.VERBOSE)
+
+_NON_WORD = re.compile(r"\W+")
+_SUBWORD = re.compile(r"[^\W_]+")
+
+MAX_NOTE_PARTS = 3      # больше частей в скобках — скорее всего OCR потерял закрывающую скобку
+MAX_CARRY = 4096        # без разделителей дольше — режем поток по пробелу
+MIN_FREE_MATCH = 6      # короче — совпадение в слитном тексте должно стоять на границе слова
+MIN_COVERAGE = 0.6      # доля текста, которую должны покрыть найденные названия
+
+
+class IngredientMatcher:
+    """Автомат Ахо–Корасик по компактным названиям из БД и синонимам.
+
+    Находит все известные ингредиенты в слитном OCR-тексте («AQUA GLYCERIN
+    PANTHENOL» без запятых, «SODIUMLAURETHSULFATEGLYCERIN») за один проход.
+    """
+
+    def __init__(self, terms: dict):
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Optional[tuple]] = [None]   # (длина, ключ) названия, кончающегося в узле
+        self._link: List[int] = [0]                 # ближайший по fail-цепочке узел с названием
+        for term, key in terms.items():
+            self._add(term, key)
+        self._build()
+
+    def _add(self, term: str, key: str):
+        node = 0
+        for ch in term:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+                self._link.append(0)
+            node = nxt
+        if self._out[node] is None:
+            self._out[node] = (len(term), key)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[child] = fail
+                self._link[child] = fail if self._out[fail] is not None else self._link[fail]
+                queue.append(child)
+
+    def __len__(self):
+        return len(self._goto)
+
+    def iter_matches(self, text: str) -> Iterator[tuple]:
+        """(начало, конец, ключ) всех вхождений, по возрастанию конца."""
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] is not None else link[node]
+            while hit:
+                length, key = out[hit]
+                yield i + 1 - length, i + 1, key
+                hit = link[hit]
+
+    def find(self, words: List[str]) -> List[str]:
+        """Ключи названий, найденных подряд в словах, или [] если они покрывают мало текста."""
+        parts = [p.upper() for w in words for p in _SUBWORD.findall(w)]
+        text = "".join(parts)
+        if not text:
+            return []
+        bounds = {0}
+        pos = 0
+        for p in parts:
+            pos += len(p)
+            bounds.add(pos)
+
+        # Самое левое, затем самое длинное; без перекрытий
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        found, covered, last_end = [], 0, 0
+        for start, end, key in matches:
+            if start < last_end:
+                continue
+            if start not in bounds and start != last_end:
+                continue
+            if end not in bounds and end - start < MIN_FREE_MATCH:
+                continue
+            if not found or found[-1] != key:
+                found.append(key)
+            covered += end - start
+            last_end = end
+        if covered < MIN_COVERAGE * len(text):
+            return []
+        return found
+
+
+_matcher: Optional[IngredientMatcher] = None
+
+
+def get_matcher() -> IngredientMatcher:
+    """Автомат строится один раз на версию INGREDIENTS_DB."""
+    global _matcher
+    if _matcher is None:
+        terms = {}
+        for key in INGREDIENTS_DB.snapshot.keys():
+            terms.setdefault(compact(key), key)
+        for alias, key in load_aliases().items():
+            terms.setdefault(compact(alias), key)
+        # Совсем короткие названия (EAU, SLS) ловятся только целым словом — см. find
+        _matcher = IngredientMatcher({t: k for t, k in terms.items() if len(t) >= 3})
+    return _matcher
+
+
+def _reset_matcher():
+    global _matcher
+    _matcher = None
+
+
+def _exact(name: str) -> bool:
+    return name in INGREDIENTS_DB or compact(name) in get_resolver().exact
+
+
+def _known(name: str) -> bool:
+    return name in INGREDIENTS_DB or resolve_ingredient(name) is not None
+
+
+def _normalize(words: List[str]) -> str:
+    """Те же ключи, что давал normalize_ingredient: SODIUM_LAURETH_SULFATE."""
+    return "_".join(w for w in (_NON_WORD.sub("", w).upper() for w in words) if w)
+
+
+def _last_separator(text: str) -> int:
+    """Позиция последнего «,» или «;», по которой поток можно резать, или -1.
+
+    Запятая между цифрами — часть слова (локант «1,2-Hexanediol»), а
+    запятая после цифры в конце текста может оказаться такой, когда
+    придёт следующий кусок: по ним не режем.
+    """
+    end = len(text)
+    while True:
+        i = max(text.rfind(",", 0, end), text.rfind(";", 0, end))
+        if i < 0:
+            return -1
+        if text[i] == ";" or not text[i - 1:i].isdecimal() or (i + 1 < len(text) and not text[i + 1].isdecimal()):
+            return i
+        end = i
+
+
+class INCITokenizer:
+    """Потоковый разбор списка INCI.
+
+    feed() принимает текст кусками любой длины и отдаёт готовые
+    компоненты по мере появления разделителей; close() дочитывает хвост.
+
+    * «Ingredients:»/«Состав:» сбрасывают всё, что было до заголовка;
+    * «Aqua (Water)» — содержимое скобок считается пояснением и
+      используется, только если основное название неизвестно;
+    * «May contain (+/-):» — разделитель, компоненты после него остаются;
+    * перенос строки — пробел, перенос со знаком «-» склеивает слово;
+    * компонент без запятых, в котором основное название неизвестно,
+      проверяется автоматом: из слитного текста вынимаются известные
+      ингредиенты.
+    """
+
+    def __init__(self, matcher: Optional[IngredientMatcher] = None):
+        self._matcher = matcher
+        self._carry = ""
+        self._words: List[str] = []
+        self._notes: List[List[str]] = []
+        self._depth = 0
+        self._glue = False
+
+    @property
+    def matcher(self) -> IngredientMatcher:
+        if self._matcher is None:
+            self._matcher = get_matcher()
+        return self._matcher
+
+    def feed(self, chunk: str) -> Iterator[str]:
+        text = self._carry + chunk
+        # Токен не должен разорваться на границе кусков: режем по последнему разделителю
+        cut = _last_separator(text)
+        if cut < 0 and len(text) > MAX_CARRY:
+            cut = text.rfind(" ")
+        if cut < 0:
+            self._carry = text
+            return iter(())
+        self._carry = text[cut + 1:]
+        return self._scan(text[:cut + 1])
+
+    def close(self) -> Iterator[str]:
+        text, self._carry = self._carry, ""
+        yield from self._scan(text)
+        if self._depth:
+            yield from self._flush_unclosed()
+        yield from self._emit()
+
+    def _scan(self, text: str) -> Iterator[str]:
+        for m in _TOKEN.finditer(text):
+            kind = m.lastgroup
+            if kind == "word":
+                target = self._notes[-1] if self._depth else self._words
+                if self._glue and target:
+                    target[-1] += m.group()
+                else:
+                    target.append(m.group())
+                self._glue = False
+            elif kind == "glue":
+                self._glue = True
+            elif kind == "sep":
+                if self._depth:
+                    self._notes.append([])
+                    if len(self._notes) > MAX_NOTE_PARTS:
+                        yield from self._flush_unclosed()
+                else:
+                    yield from self._emit()
+            elif kind == "open":
+                if not self._depth:
+                    self._notes.append([])
+                self._depth += 1
+            elif kind == "close":
+                if self._depth:
+                    self._depth -= 1
+            elif kind == "may":
+                if not self._depth:
+                    yield from self._emit()
+            elif kind == "header":
+                self._words.clear()
+                self._notes.clear()
+                self._depth = 0
+
+    def _flush_unclosed(self) -> Iterator[str]:
+        # Скобка так и не закрылась: первая часть — пояснение к названию, остальные — обычные компоненты
+        notes = self._notes
+        self._notes = notes[:1]
+        self._depth = 0
+        yield from self._emit()
+        for part in notes[1:]:
+            self._words = part
+            yield from self._emit()
+
+    def _emit(self) -> Iterator[str]:
+        words, notes = self._words, self._notes
+        self._words, self._notes = [], []
+        self._glue = False
+        name = _normalize(words)
+        if name and _exact(name):
+            yield name
+            return
+        # Несколько известных названий подряд без запятых — слитный текст OCR.
+        # Проверяем до нечёткого поиска: тот принял бы «AQUA GLYCERIN» за AQUA.
+        found = []
+        if len(words) > 1 or len(name) >= MIN_FREE_MATCH * 2:
+            found = self.matcher.find(words)
+            if len(found) > 1:
+                yield from found
+                return
+        if name and _known(name):
+            yield name
+            return
+        note_names = [n for n in (_normalize(part) for part in notes) if n]
+        known_notes = [n for n in note_names if _known(n)]
+        if known_notes:
+            yield from known_notes
+        elif found:
+            yield from found
+        elif name:
+            yield name
+        else:
+            yield from note_names
+
+
+def iter_ingredients(chunks: Iterable[str], matcher: Optional[IngredientMatcher] = None) -> Iterator[str]:
+    """Компоненты из потока текста (например, построчного чтения большого файла)."""
+    tokenizer = INCITokenizer(matcher)
+    for chunk in chunks:
+        yield from tokenizer.feed(chunk)
+    yield from tokenizer.close()
+
+
+def tokenize(raw: str) -> List[str]:
+    return list(iter_ingredients((raw,)))
+
+
+INGREDIENTS_DB.on_reload(_reset_matcher)
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Разные чаты обрабатываются параллельно, апдейты одного чата — по очереди.
+
+    С обычным concurrent_updates ConversationHandler сохраняет новое
+    состояние только после выхода из обработчика: если следующий апдейт
+    того же чата (нажатие кнопки сразу после ответа бота) успел начаться
+    раньше, он не находит состояния и теряется.
+
+    on_busy(update) вызывается, если чат занят предыдущим апдейтом, до
+    ожидания очереди: так «Заново» может отменить долгий анализ, а не
+    ждать его окончания, а фото альбома — присоединиться к уже
+    собираемому альбому.
+    """
+
+    def __init__(self, max_concurrent_updates: int, on_busy: Optional[Callable[[object], None]] = None):
+        super().__init__(max_concurrent_updates)
+        self.on_busy = on_busy
+        # ключ чата -> [блокировка, сколько апдейтов её держат или ждут]
+        self._locks: Dict[int, List[Any]] = {}
+
+    @staticmethod
+    def _key(update: object):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._key(update)
+        if key is None:
+            await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        elif self.on_busy is not None and entry[0].locked():
+            try:
+                self.on_busy(update)
+            except Exception as e:
+                logger.error(f"Busy-chat hook failed: {e}")
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,140 @@
+"""Webhook-режим: приём апдейтов по HTTP и раскладка по процессам-воркерам.
+
+Процесс-приёмник (aiohttp) получает апдейты от Telegram, определяет
+шард по chat_id (или user_id) и кладёт апдейт в очередь нужного воркера.
+Каждый воркер — отдельный процесс со своим event loop и полным
+приложением из main.build_application(), поэтому обработка
+масштабируется на несколько ядер. Апдейты одного чата всегда попадают в
+один воркер и обрабатываются по порядку; лимиты и состояние диалогов
+лежат в Redis и переживают перезапуск или смену числа воркеров.
+
+Запуск: python main.py --webhook
+Локальная проверка без Telegram: scripts/fake_bot_api.py
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import signal
+
+from aiohttp import web
+from telegram import Bot, Update
+
+from config import (
+    BOT_TOKEN, BOT_API_URL, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN,
+    WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Поля апдейта, в которых может лежать чат/пользователь
+UPDATE_FIELDS = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def shard_key(data: dict) -> int:
+    """chat_id апдейта, иначе user_id, иначе update_id."""
+    for field in UPDATE_FIELDS:
+        obj = data.get(field)
+        if not obj:
+            continue
+        chat = obj.get("chat") or (obj.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = obj.get("from")
+        if user:
+            return user["id"]
+    return data.get("update_id", 0)
+
+
+def shard_for(data: dict, workers: int) -> int:
+    return shard_key(data) % workers
+
+
+async def _worker_main(queue: mp.Queue, index: int):
+    import main
+    from main import build_application
+
+    main.metrics_port_offset = index
+    application = build_application(with_updater=False)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def _worker(queue: mp.Queue, index: int):
+    # Ctrl+C получает вся группа процессов; останавливает воркеры приёмник через очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        format="%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    )
+    asyncio.run(_worker_main(queue, index))
+
+
+def create_app(queues: list, secret: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH) -> web.Application:
+    """HTTP-приёмник: проверка секрета, шардирование, ответ 200 без ожидания обработки."""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        queues[shard_for(data, len(queues))].put_nowait(data)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    return app
+
+
+async def _set_webhook(app: web.Application):
+    if not WEBHOOK_URL:
+        logger.info("WEBHOOK_URL is empty, skipping setWebhook")
+        return
+    async with Bot(BOT_TOKEN, base_url=BOT_API_URL) as bot:
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    logger.info(f"Webhook set to {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+
+def run(workers: int = WEBHOOK_WORKERS, host: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT):
+    ctx = mp.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(workers)]
+    processes = [
+        ctx.Process(target=_worker, args=(queue, i), name=f"worker-{i}", daemon=False)
+        for i, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+
+    async def stop_workers(app: web.Application):
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            await asyncio.to_thread(process.join, 30)
+
+    app = create_app(queues)
+    app.on_startup.append(_set_webhook)
+    app.on_cleanup.append(stop_workers)
+    print(f"Бот запущен (webhook, {workers} воркеров, порт {port})!")
+    web.run_app(app, host=host, port=port, print=None)